@@ -0,0 +1,128 @@
+"""Database size and query times before and after archiving old runs.
+
+A year of runs (``--runs`` spread evenly, ``--kpis`` KPIs each) is inserted
+with timestamps up to now. ``csv-report archive --older-than 90d`` is then
+applied through ``DatabaseService.archive_runs`` and ``retention.vacuum``.
+Timed queries are those whose cost grows with the tables: the unindexed
+status filter of ``/runs``, the run count of the Django app and a full KPI
+history, which after archival unions the Parquet partitions with run.db.
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from sqlalchemy import insert, text
+from sqlmodel import Session
+
+from csv_report.database import DatabaseService
+from csv_report.models import Kpi, Run, utcnow
+from csv_report.retention import vacuum
+
+BATCH_RUNS = 10_000
+
+
+def populate(db_service: DatabaseService, runs: int, kpis: int) -> None:
+    """Insert ``runs`` runs over the last 365 days, one in 50 failed."""
+    step = timedelta(days=365) / runs
+    origin = utcnow() - timedelta(days=365)
+    with Session(db_service.engine) as session:
+        for first in range(0, runs, BATCH_RUNS):
+            ids = range(first, min(first + BATCH_RUNS, runs))
+            times = {i: origin + step * i for i in ids}
+            session.execute(
+                insert(Run),
+                [
+                    {
+                        "id": i + 1,
+                        "timestamp": times[i],
+                        "csv_file": f"data/sp500_{i}.csv",
+                        "output_format": "html",
+                        "status": "failed" if i % 50 == 0 else "completed",
+                    }
+                    for i in ids
+                ],
+            )
+            session.execute(
+                insert(Kpi),
+                [
+                    {
+                        "run_id": i + 1,
+                        "name": f"kpi_{k}",
+                        "value": float(i % 97 + k),
+                        "unit": "USD",
+                        "calculated_at": times[i],
+                    }
+                    for i in ids
+                    for k in range(kpis)
+                ],
+            )
+        session.commit()
+
+
+def timed(func) -> float:
+    """Best of three in ms."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(db_service: DatabaseService, archive_dir: Path) -> dict:
+    """Query times in ms of the size-dependent reads."""
+
+    def count_runs() -> None:
+        with db_service.engine.connect() as connection:
+            connection.execute(text("SELECT count(*) FROM run")).scalar()
+
+    return {
+        "failed runs page": timed(lambda: db_service.list_runs(10, status="failed")),
+        "run count": timed(count_runs),
+        "full KPI history": timed(
+            lambda: db_service.get_kpi_values("kpi_0", archive_dir=archive_dir),
+        ),
+    }
+
+
+def main() -> None:
+    """Archive a year of runs down to 90 days and print the effect."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50_000)
+    parser.add_argument("--kpis", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / "run.db"
+        archive_dir = Path(tmp) / "archive"
+        db_service = DatabaseService(f"sqlite:///{database}")
+        populate(db_service, args.runs, args.kpis)
+        vacuum(db_service.engine)
+        before = measure(db_service, archive_dir)
+        size_before = database.stat().st_size
+
+        start = time.perf_counter()
+        summary = db_service.archive_runs(timedelta(days=90), archive_dir)
+        archived = time.perf_counter() - start
+        start = time.perf_counter()
+        freed = vacuum(db_service.engine)
+        vacuumed = time.perf_counter() - start
+        after = measure(db_service, archive_dir)
+        archive_bytes = sum(path.stat().st_size for path in archive_dir.rglob("*"))
+
+    print(f"runs x KPIs:        {args.runs:,} x {args.kpis}")
+    print(f"archived:           {summary['runs']:,} runs, {summary['kpis']:,} KPIs")
+    print(f"archive time:       {archived * 1000:9.0f} ms")
+    print(f"vacuum time:        {vacuumed * 1000:9.0f} ms")
+    print(f"run.db:             {size_before / 2**20:9.1f} MiB before")
+    print(f"                    {(size_before - freed) / 2**20:9.1f} MiB after")
+    print(f"Parquet archive:    {archive_bytes / 2**20:9.1f} MiB")
+    for name in before:
+        print(f"{name + ':':19} {before[name]:9.1f} ms -> {after[name]:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
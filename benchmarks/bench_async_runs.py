@@ -0,0 +1,88 @@
+"""Latency of ``/healthz`` while ``/runs`` is hammered, blocking vs. async DB.
+
+The blocking app reproduces the previous route: an ``async def`` handler
+calling the synchronous ``DatabaseService``, which stalls the event loop for
+every query. The async app is ``kpi_service.app`` on ``AsyncDatabaseService``.
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from common import synthetic_companies
+from fastapi import FastAPI
+
+from csv_report import db_init
+from csv_report.database import DatabaseService, kpi_records
+from kpi_service.app import app as async_app
+from kpi_service.kpi import compute_all_kpis
+
+blocking_app = FastAPI()
+
+
+@blocking_app.get("/healthz")
+async def health_check():
+    return {"status": "healthy"}
+
+
+@blocking_app.get("/runs")
+async def get_runs(limit: int = 10):
+    runs = DatabaseService().get_recent_runs(limit)
+    return {"runs": [run.model_dump(mode="json") for run in runs]}
+
+
+async def measure(app: FastAPI, requests: int) -> list:
+    """Health check latencies in ms while ``requests`` /runs are in flight."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://b") as client:
+        load = asyncio.gather(
+            *(client.get("/runs", params={"limit": 200}) for _ in range(requests)),
+        )
+        latencies = []
+        while not load.done():
+            # A health check issued every millisecond; the wait to get
+            # scheduled counts, as that is where a blocked loop stalls it
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            await client.get("/healthz")
+            latencies.append((time.perf_counter() - start) * 1000 - 1)
+        await load
+    return latencies
+
+
+def main() -> None:
+    """Run the load against both apps and print health check latencies."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        db_init.get_database_url = lambda: database_url
+        db_service = DatabaseService()
+        records = kpi_records(compute_all_kpis(synthetic_companies(1_000)))
+        for i in range(500):
+            run = db_service.create_run(csv_file=f"file_{i}.csv", output_format="md")
+            db_service.add_kpis(run.id, records)
+
+        print(f"/runs in flight:       {args.requests}")
+        for label, app in [
+            ("blocking DB calls", blocking_app),
+            ("async DB", async_app),
+        ]:
+            start = time.perf_counter()
+            latencies = asyncio.run(measure(app, args.requests))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label + ':':<22} /healthz p50 {statistics.median(latencies):.1f}"
+                f" ms, max {max(latencies):.1f} ms ({len(latencies)} checks"
+                f" in {elapsed:.1f} s)",
+            )
+
+
+if __name__ == "__main__":
+    main()
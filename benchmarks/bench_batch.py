@@ -0,0 +1,57 @@
+"""Benchmark batch report generation with one and with several workers.
+
+Writes ``--files`` synthetic CSV files and runs ``run_batch`` (the engine of
+``csv-report generate-batch``) sequentially and across ``--workers``
+processes, printing files/s and rows/s for both.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from common import synthetic_companies
+
+from csv_report.batch import resolve_csv_files, run_batch
+
+
+def measure(csv_files: list, output_dir: Path, workers: int) -> tuple:
+    """Return (seconds, rows, failures) for one batch run."""
+    start = time.perf_counter()
+    results = list(run_batch(csv_files, "markdown", output_dir, workers))
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if result["error"]]
+    return elapsed, sum(result["rows"] for result in results), failures
+
+
+def main() -> None:
+    """Run the benchmark and print the throughput of both runs."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "data"
+        source.mkdir()
+        for i in range(args.files):
+            synthetic_companies(args.rows, seed=i).to_csv(
+                source / f"region_{i:03d}.csv",
+                index=False,
+            )
+        csv_files = resolve_csv_files(source)
+
+        print(f"files:         {args.files:,} x {args.rows:,} rows")
+        for workers in sorted({1, args.workers}):
+            elapsed, rows, failures = measure(csv_files, Path(tmp) / "out", workers)
+            assert not failures, failures
+            print(
+                f"{workers:>2} worker(s):  {elapsed:.2f}s, "
+                f"{len(csv_files) / elapsed:.1f} files/s, {rows / elapsed:,.0f} rows/s",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Stress ``run.db`` with concurrent writer processes, default vs. tuned SQLite.
+
+Writer processes repeatedly record a run with its KPIs and read recent runs
+back, like the CLI, the API and the upload app do at the same time, while
+reader processes hold long read transactions (as a large export does). The
+default profile is SQLite's rollback journal with Python's 5 s lock wait;
+the tuned profile is ``db_init.SQLITE_PRAGMAS`` (WAL, busy_timeout, ...).
+"""
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from common import synthetic_companies
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from csv_report import db_init
+from csv_report.database import DatabaseService, kpi_records
+from kpi_service.kpi import compute_all_kpis
+
+DEFAULT_PRAGMAS = {"journal_mode": "DELETE"}
+
+
+def record_run(db_service: DatabaseService, i: int, records: list) -> int:
+    """Record one run and read it back; 1 if the database was locked, else 0."""
+    try:
+        run = db_service.create_run(csv_file=f"w{i}.csv", output_format="md")
+        db_service.add_kpis(run.id, records)
+        db_service.get_recent_runs(10)
+        db_service.get_kpis_for_run(run.id)
+    except OperationalError as e:
+        if "database is locked" not in str(e):
+            raise
+        return 1
+    return 0
+
+
+def writer(database_url: str, iterations: int, records: list, *, tuned: bool) -> dict:
+    """Record runs in a loop and count the ``database is locked`` errors."""
+    if not tuned:
+        db_init.SQLITE_PRAGMAS = DEFAULT_PRAGMAS
+    db_service = DatabaseService(database_url)
+    locked = sum(record_run(db_service, i, records) for i in range(iterations))
+    return {"locked": locked}
+
+
+def reader(database_url: str, hold: float, repeats: int, *, tuned: bool) -> dict:
+    """Hold read transactions over the KPI table for ``hold`` seconds each."""
+    if not tuned:
+        db_init.SQLITE_PRAGMAS = DEFAULT_PRAGMAS
+    engine = db_init.get_engine(database_url)
+    locked = 0
+    for _ in range(repeats):
+        with engine.connect() as connection:
+            try:
+                connection.exec_driver_sql("BEGIN")
+                connection.execute(text("SELECT count(*) FROM kpi")).scalar()
+                time.sleep(hold)
+                connection.commit()
+            except OperationalError as e:
+                if "database is locked" not in str(e):
+                    raise
+                locked += 1
+    return {"locked": locked}
+
+
+def main() -> None:
+    """Run both profiles and print lock errors and throughput."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--hold", type=float, default=6.0)
+    args = parser.parse_args()
+
+    records = kpi_records(compute_all_kpis(synthetic_companies(5_000)))
+    print(f"writers x iterations:  {args.writers} x {args.iterations}")
+    print(f"readers x hold:        {args.readers} x {args.hold:.0f} s")
+    for label, tuned in [("default profile", False), ("tuned profile", True)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+            # Create the schema up front with the profile under test
+            pragmas = db_init.SQLITE_PRAGMAS
+            if not tuned:
+                db_init.SQLITE_PRAGMAS = DEFAULT_PRAGMAS
+            db_init.get_engine(database_url)
+            db_init.dispose_engines()
+            db_init.SQLITE_PRAGMAS = pragmas
+            workers = args.writers + args.readers
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                start = time.perf_counter()
+                futures = [
+                    executor.submit(
+                        writer,
+                        database_url,
+                        args.iterations,
+                        records,
+                        tuned=tuned,
+                    )
+                    for _ in range(args.writers)
+                ]
+                futures += [
+                    executor.submit(reader, database_url, args.hold, 2, tuned=tuned)
+                    for _ in range(args.readers)
+                ]
+                results = [future.result() for future in futures]
+                elapsed = time.perf_counter() - start
+            locked = sum(result["locked"] for result in results)
+            total = args.writers * args.iterations
+            print(
+                f"{label + ':':<22} {locked} locked errors, "
+                f"{total / elapsed:.0f} runs/s",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark cold vs. warm ``load_csv`` through the columnar parse cache.
+
+Cold loads parse the CSV text with ``pd.read_csv``; warm loads memory-map
+the Arrow IPC file written by ``csv_report.csv_cache`` on the first load.
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from common import best_of, synthetic_companies
+
+from csv_report.csv_cache import CsvCache
+
+
+def main() -> None:
+    """Run the benchmark and print cold and warm load times."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = Path(tmp) / "companies.csv"
+        synthetic_companies(args.rows).to_csv(csv_file, index=False)
+        cache = CsvCache(Path(tmp) / "cache")
+
+        cold = best_of(lambda: pd.read_csv(csv_file))
+        first = best_of(lambda: cache.load(csv_file, pd.read_csv), repeat=1)
+        warm = best_of(lambda: cache.load(csv_file, pd.read_csv))
+        pd.testing.assert_frame_equal(
+            cache.load(csv_file, pd.read_csv),
+            pd.read_csv(csv_file),
+        )
+
+        mib = 1024 * 1024
+        print(f"rows:          {args.rows:,}")
+        print(f"csv size:      {csv_file.stat().st_size / mib:,.1f} MiB")
+        print(f"cache size:    {cache.size() / mib:,.1f} MiB")
+        print(f"cold (parse):  {cold:.3f}s")
+        print(f"first (fill):  {first:.3f}s")
+        print(f"warm (mmap):   {warm:.3f}s ({cold / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Time to a response: synchronous POST /upload vs. POST /jobs.
+
+Posts a synthetic CSV of growing size through ``httpx.ASGITransport``.
+``upload`` is answered once the KPIs are computed; ``jobs`` is answered
+once the upload is saved and the job recorded; its completion is timed by
+waiting for the app's job manager and then reading ``/jobs/{id}``. The
+response time of ``/upload`` is what a proxy timeout is measured against.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from common import synthetic_companies
+
+from kpi_service.app import app
+
+
+async def measure(csv: bytes) -> tuple:
+    """Return /upload seconds, /jobs accept seconds and job completion seconds."""
+    transport = httpx.ASGITransport(app=app)
+    files = {"file": ("upload.csv", csv, "text/csv")}
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+        start = time.perf_counter()
+        (await ac.post("/upload", files=files, timeout=None)).raise_for_status()
+        upload = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await ac.post("/jobs", files=files, timeout=None)
+        response.raise_for_status()
+        accepted = time.perf_counter() - start
+        status_url = response.json()["status_url"]
+        await app.state.jobs.join()
+        status = (await ac.get(status_url)).json()["status"]
+        completed = time.perf_counter() - start
+        if status != "completed":
+            msg = f"Job ended {status}"
+            raise RuntimeError(msg)
+    return upload, accepted, completed
+
+
+def main() -> None:
+    """Print response times per upload size."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100000,500000,2000000")
+    args = parser.parse_args()
+
+    header = ["rows", "MiB", "upload s", "jobs accept s", "job done s"]
+    print("{:>10} {:>7} {:>9} {:>14} {:>11}".format(*header))
+    for rows in (int(size) for size in args.sizes.split(",")):
+        csv = synthetic_companies(rows).to_csv(index=False).encode()
+        app.state.max_upload_bytes = 2 * len(csv)
+        upload, accepted, completed = asyncio.run(measure(csv))
+        print(
+            f"{rows:>10,} {len(csv) / 2**20:>7.1f} {upload:>9.2f} "
+            f"{accepted:>14.3f} {completed:>11.2f}",
+        )
+    asyncio.run(app.state.jobs.shutdown())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Serialization time of an /upload response with 10,000 sectors.
+
+Builds the KPIs of a synthetic dataset with ``--sectors`` distinct sectors
+(so ``sector_kpis`` holds that many entries) and times turning the /upload
+response into bytes: FastAPI's default path (``jsonable_encoder``, then
+Starlette's ``JSONResponse``), ``KpiJSONResponse`` behind
+``jsonable_encoder`` (endpoints returning dicts) and ``KpiJSONResponse``
+returned directly (``/upload``), with orjson and with the standard library
+fallback.
+"""
+
+import argparse
+import json
+
+from common import best_of, synthetic_companies
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from kpi_service import responses
+from kpi_service.kpi import compute_all_kpis
+from kpi_service.responses import KpiJSONResponse
+from kpi_service.streaming import summarize_chunks
+
+
+def main() -> None:
+    """Print serialization time per path."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sectors", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = synthetic_companies(args.rows)
+    frame["Sector"] = [f"Sector {i % args.sectors}" for i in range(args.rows)]
+    basic_kpis, aggregates = summarize_chunks([frame])
+    content = {
+        "filename": "upload.csv",
+        "basic_kpis": basic_kpis,
+        "enhanced_kpis": compute_all_kpis(aggregates=aggregates),
+    }
+    body = KpiJSONResponse(content).body
+    assert json.loads(JSONResponse(jsonable_encoder(content)).body) == json.loads(body)
+
+    timings = {
+        "default": lambda: JSONResponse(jsonable_encoder(content)),
+        "encoder + orjson": lambda: KpiJSONResponse(jsonable_encoder(content)),
+        "orjson": lambda: KpiJSONResponse(content),
+    }
+    results = {name: best_of(func, args.repeat) for name, func in timings.items()}
+    responses.ORJSON_AVAILABLE = False
+    results["stdlib"] = best_of(lambda: KpiJSONResponse(content), args.repeat)
+
+    sectors = len(content["enhanced_kpis"]["sector_kpis"]["sectors"])
+    print(f"sectors:           {sectors:,}")
+    print(f"response:          {len(body) / 2**20:.1f} MiB")
+    for name, seconds in results.items():
+        speed_up = results["default"] / seconds
+        print(f"{name + ':':18} {seconds * 1000:8.1f} ms  {speed_up:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark the fused KPI engine against the previous multi-groupby path.
+
+The previous ``csv-report generate`` pipeline ran ``calculate_base_kpis`` and
+``calculate_enhanced_kpis`` for the report, a third ``groupby("Sector")`` for
+the legacy sector table and then ``compute_all_kpis`` again for the database.
+"""
+
+import argparse
+
+from common import best_of, synthetic_companies
+
+from kpi_service.kpi import build_kpi_aggregates, compute_all_kpis
+
+
+def legacy_pipeline(df) -> None:
+    """Replay the aggregations the previous generate pipeline performed."""
+    marketcap = df["Marketcap"]
+    for _ in range(2):  # generate_report + compute_all_kpis
+        # calculate_base_kpis
+        marketcap.mean()
+        marketcap.median()
+        # calculate_enhanced_kpis
+        df.nlargest(10, "Marketcap")
+        marketcap.quantile([0.25, 0.5, 0.75, 0.9, 0.95, 0.99])
+        df.groupby("Sector").agg({"Marketcap": ["mean", "median", "count", "sum"]})
+        tech = df["Sector"].isin(["Technology", "Communication Services"])
+        df[tech]["Marketcap"].sum()
+        df[~tech]["Marketcap"].sum()
+    # calculate_sector_kpis (compute_all_kpis only)
+    df.groupby("Sector").agg({"Marketcap": ["mean", "median", "count"]})
+    # legacy sector table in generate_report
+    df.groupby("Sector").agg({"Shortname": "count", "Marketcap": ["mean", "median"]})
+
+
+def fused_pipeline(df) -> None:
+    """Build the aggregates once and derive every KPI dictionary from them."""
+    aggregates = build_kpi_aggregates(df)
+    compute_all_kpis(aggregates=aggregates)
+
+
+def main() -> None:
+    """Run the benchmark and print both timings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_companies(args.rows)
+    legacy = best_of(lambda: legacy_pipeline(df), args.repeat)
+    fused = best_of(lambda: fused_pipeline(df), args.repeat)
+
+    print(f"rows:            {args.rows:,}")
+    print(f"previous path:   {legacy:.3f}s")
+    print(f"fused engine:    {fused:.3f}s")
+    print(f"speed-up:        {legacy / fused:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
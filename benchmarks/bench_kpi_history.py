@@ -0,0 +1,109 @@
+"""Daily KPI history from the rollups vs. aggregating raw KPI rows.
+
+Runs are spread ten minutes apart, each with ``--kpis`` KPIs. The raw path
+selects every value of one KPI and downsamples it per day; the rollup path
+is ``DatabaseService.get_kpi_history``, which reads one row per day.
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from csv_report.database import DatabaseService
+from csv_report.models import Kpi, Run
+from csv_report.rollups import rollup_rows, rollup_upsert_statement
+
+BATCH_RUNS = 10_000
+
+# run.db stores naive UTC timestamps
+ORIGIN = datetime(2020, 1, 1)  # noqa: DTZ001
+
+
+def populate(db_service: DatabaseService, start: int, stop: int, kpis: int) -> None:
+    """Insert runs ``start..stop`` with their KPIs and rollups."""
+    upsert = rollup_upsert_statement("sqlite")
+    with Session(db_service.engine) as session:
+        for first in range(start, stop, BATCH_RUNS):
+            ids = range(first, min(first + BATCH_RUNS, stop))
+            times = {i: ORIGIN + timedelta(minutes=10 * i) for i in ids}
+            session.execute(
+                insert(Run),
+                [
+                    {
+                        "id": i + 1,
+                        "timestamp": times[i],
+                        "csv_file": "f.csv",
+                        "output_format": "html",
+                    }
+                    for i in ids
+                ],
+            )
+            rows = [
+                {
+                    "run_id": i + 1,
+                    "name": f"kpi_{k}",
+                    "value": float(i % 97 + k),
+                    "calculated_at": times[i],
+                }
+                for i in ids
+                for k in range(kpis)
+            ]
+            session.execute(insert(Kpi), rows)
+            session.execute(upsert, rollup_rows(rows))
+        session.commit()
+
+
+def from_raw_rows(db_service: DatabaseService) -> pd.DataFrame:
+    """Downsample every stored value of ``kpi_0`` per day."""
+    statement = select(Kpi.calculated_at, Kpi.value).where(Kpi.name == "kpi_0")
+    with Session(db_service.engine) as session:
+        frame = pd.DataFrame(session.exec(statement).all(), columns=["at", "value"])
+    return frame.resample("D", on="at")["value"].agg(["min", "max", "mean", "last"])
+
+
+def timed(func) -> float:
+    """Best of three in ms."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    """Grow the history and print the query time of both paths."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,300000")
+    parser.add_argument("--kpis", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_service = DatabaseService(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        stored = 0
+        for size in (int(size) for size in args.sizes.split(",")):
+            populate(db_service, stored, size, args.kpis)
+            stored = size
+            raw_ms = timed(lambda: from_raw_rows(db_service))
+            rollup_ms = timed(lambda: db_service.get_kpi_history("kpi_0", "day"))
+            days = len(db_service.get_kpi_history("kpi_0", "day"))
+            # The most recent 30 days, as a dashboard would chart them
+            since = ORIGIN + timedelta(days=days - 30)
+            window_ms = timed(
+                partial(db_service.get_kpi_history, "kpi_0", "day", since),
+            )
+            print(
+                f"{size:>8} runs ({days:>4} days): raw rows {raw_ms:8.1f} ms, "
+                f"rollups {rollup_ms:6.1f} ms, last 30 days {window_ms:4.1f} ms",
+            )
+
+
+if __name__ == "__main__":
+    main()
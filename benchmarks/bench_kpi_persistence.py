@@ -0,0 +1,56 @@
+"""Benchmark per-row vs. bulk KPI persistence on a SQLite file database.
+
+The per-row path calls ``DatabaseService.add_kpi`` for every KPI (one
+session, commit and refresh each); the bulk path stores the same KPIs with a
+single ``add_kpis`` transaction.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from common import synthetic_companies
+
+from csv_report.database import DatabaseService, kpi_records
+from kpi_service.kpi import compute_all_kpis
+
+
+def per_row(db_service: DatabaseService, run_id: int, records: list) -> None:
+    """Store KPIs the way generate previously did."""
+    for record in records:
+        db_service.add_kpi(run_id=run_id, **record)
+
+
+def bulk(db_service: DatabaseService, run_id: int, records: list) -> None:
+    """Store KPIs in one transaction."""
+    db_service.add_kpis(run_id, records)
+
+
+def main() -> None:
+    """Run the benchmark and print the time per run for both paths."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    records = kpi_records(compute_all_kpis(synthetic_companies(5_000)))
+    headline = records[:9]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_service = DatabaseService(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        print(f"runs:                  {args.runs}")
+        for label, store, kpis in [
+            ("per-row, 9 KPIs", per_row, headline),
+            ("bulk, 9 KPIs", bulk, headline),
+            (f"per-row, {len(records)} KPIs", per_row, records),
+            (f"bulk, {len(records)} KPIs", bulk, records),
+        ]:
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                run = db_service.create_run(csv_file="bench.csv", output_format="md")
+                store(db_service, run.id, kpis)
+            per_run = (time.perf_counter() - start) / args.runs
+            print(f"{label + ':':<22} {per_run * 1000:.2f} ms/run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Saved KPI state and ``csv-report update`` vs. a full recompute.
+
+For each dataset size the in-memory aggregation of ``generate`` is timed,
+then packing its accumulator state for the ``kpi_state`` table, and a
+10-row update (restore, remove 10 rows, re-add them, aggregate and pack the
+new state) next to ``build_kpi_aggregates`` over the whole frame.
+"""
+
+import argparse
+import json
+import time
+import zlib
+from functools import partial
+
+from common import best_of, synthetic_companies
+
+from csv_report.database import pack_kpi_state
+from kpi_service.kpi import build_kpi_aggregates
+from kpi_service.streaming import KpiAccumulator
+
+
+def aggregate(df) -> KpiAccumulator:
+    """Aggregate the frame like ``generate`` does."""
+    accumulator = KpiAccumulator.from_frame(df)
+    accumulator.to_aggregates()
+    return accumulator
+
+
+def update(blob: bytes, delta) -> None:
+    """Apply a delta to a saved state like ``csv-report update`` does."""
+    accumulator = KpiAccumulator.from_state(json.loads(zlib.decompress(blob)))
+    accumulator.remove(delta)
+    accumulator.update(delta)
+    accumulator.to_aggregates()
+    pack_kpi_state(accumulator.to_state())
+
+
+def main() -> None:
+    """Print state size and timings per dataset size."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100000,1000000,3000000")
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>10} {'aggregate s':>12} {'pack s':>7} {'state MiB':>10} "
+        f"{'update s':>9} {'recompute s':>12}",
+    )
+    for rows in (int(size) for size in args.sizes.split(",")):
+        df = synthetic_companies(rows)
+        start = time.perf_counter()
+        accumulator = aggregate(df)
+        aggregated = time.perf_counter() - start
+        start = time.perf_counter()
+        blob = pack_kpi_state(accumulator.to_state())
+        packed = time.perf_counter() - start
+        updated = best_of(partial(update, blob, df[:10]))
+        recomputed = best_of(partial(build_kpi_aggregates, df))
+        print(
+            f"{rows:>10,} {aggregated:>12.2f} {packed:>7.2f} "
+            f"{len(blob) / 2**20:>10.2f} {updated:>9.3f} {recomputed:>12.2f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark peak memory and time of market cap bucketing.
+
+Compares the previous approach (four boolean-mask copies of the whole
+DataFrame, one per band) with the single-pass ``searchsorted`` bucketing used
+by ``build_kpi_aggregates``.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from common import SECTORS
+
+from kpi_service.kpi import count_market_cap_bands
+
+
+def mask_copies(df: pd.DataFrame) -> dict:
+    """Count the bands the way calculate_enhanced_kpis previously did."""
+    small_cap = df[df["Marketcap"] < 2e9]
+    mid_cap = df[(df["Marketcap"] >= 2e9) & (df["Marketcap"] < 10e9)]
+    large_cap = df[df["Marketcap"] >= 10e9]
+    mega_cap = df[df["Marketcap"] >= 100e9]
+    return {
+        "small": len(small_cap),
+        "mid": len(mid_cap),
+        "large": len(large_cap),
+        "mega": len(mega_cap),
+    }
+
+
+def single_pass(df: pd.DataFrame) -> dict:
+    """Count the bands with one vectorized pass over the Marketcap column."""
+    return count_market_cap_bands(df["Marketcap"])
+
+
+def measure(func, df: pd.DataFrame) -> tuple:
+    """Return (result, seconds, peak traced bytes) for one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    """Run the benchmark and print time and peak memory of both approaches."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(
+        {
+            "Marketcap": rng.lognormal(mean=23.5, sigma=1.6, size=args.rows),
+            "Currentprice": rng.uniform(1, 1000, size=args.rows),
+            "Ebitda": rng.normal(1e9, 1e8, size=args.rows),
+            "Fulltimeemployees": rng.integers(10, 500_000, size=args.rows),
+            "Sector": pd.Categorical(rng.choice(SECTORS, size=args.rows)),
+        },
+    )
+
+    old, old_time, old_peak = measure(mask_copies, df)
+    new, new_time, new_peak = measure(single_pass, df)
+    assert old == new, (old, new)
+
+    mib = 1024 * 1024
+    print(f"rows:          {args.rows:,}")
+    print(f"mask copies:   {old_time:.3f}s, peak {old_peak / mib:,.1f} MiB")
+    print(f"single pass:   {new_time:.3f}s, peak {new_peak / mib:,.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
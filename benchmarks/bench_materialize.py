@@ -0,0 +1,50 @@
+"""Benchmark KPI list materialization: iterrows() loop vs frame_to_records."""
+
+import argparse
+
+from common import best_of, synthetic_companies
+
+from kpi_service.kpi import COMPANY_FIELDS, frame_to_records
+
+
+def iterrows_records(frame) -> list:
+    """Build the records the way the KPI functions previously did."""
+    records = []
+    for _, row in frame.iterrows():
+        records.append(
+            {
+                "symbol": str(row["Symbol"]),
+                "shortname": str(row["Shortname"]),
+                "marketcap": float(row["Marketcap"]),
+                "marketcap_b": float(row["Marketcap_B"]),
+                "sector": str(row["Sector"]),
+            },
+        )
+    return records
+
+
+def main() -> None:
+    """Run the benchmark and print both timings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frame = synthetic_companies(args.rows)
+    frame["Marketcap_B"] = frame["Marketcap"] / 1e9
+    assert iterrows_records(frame.head(100)) == frame_to_records(
+        frame.head(100),
+        COMPANY_FIELDS,
+    )
+
+    loop = best_of(lambda: iterrows_records(frame), args.repeat)
+    bulk = best_of(lambda: frame_to_records(frame, COMPANY_FIELDS), args.repeat)
+
+    print(f"rows:              {args.rows:,}")
+    print(f"iterrows():        {loop:.3f}s")
+    print(f"frame_to_records:  {bulk:.3f}s")
+    print(f"speed-up:          {loop / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
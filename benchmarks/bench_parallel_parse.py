@@ -0,0 +1,65 @@
+"""Benchmark parsing one large CSV file on 1..N cores.
+
+Times ``parallel_read_csv`` (partitions concatenated into one frame) and
+``parallel_aggregate_csv`` (partitions folded into KPI accumulators) for
+each worker count, next to the serial ``read_csv``.
+"""
+
+import argparse
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from common import best_of, synthetic_companies
+
+from csv_report.load import read_csv
+from csv_report.parallel import parallel_aggregate_csv, parallel_read_csv
+
+
+def main() -> None:
+    """Run the benchmark and print one line per worker count."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=4_000_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--partition-mib", type=int, default=16)
+    args = parser.parse_args()
+    partition_bytes = args.partition_mib * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = Path(tmp) / "companies.csv"
+        synthetic_companies(args.rows).to_csv(csv_file, index=False)
+        size = csv_file.stat().st_size / (1024 * 1024)
+
+        serial = best_of(lambda: read_csv(csv_file), repeat=2)
+        print(f"rows:         {args.rows:,} ({size:,.0f} MiB)")
+        print(f"serial:       {serial:.2f}s")
+        workers = 1
+        while workers <= args.max_workers:
+            read = best_of(
+                partial(
+                    parallel_read_csv,
+                    csv_file,
+                    workers,
+                    partition_bytes=partition_bytes,
+                ),
+                repeat=2,
+            )
+            aggregate = best_of(
+                partial(
+                    parallel_aggregate_csv,
+                    csv_file,
+                    workers,
+                    partition_bytes=partition_bytes,
+                ),
+                repeat=2,
+            )
+            print(
+                f"{workers:>2} worker(s):  read {read:.2f}s ({serial / read:.1f}x), "
+                f"aggregate {aggregate:.2f}s ({serial / aggregate:.1f}x)",
+            )
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Re-rendering a past run from its stored KPI payload vs. from its CSV.
+
+Without the payload, a report of a past run in another format means loading
+the source CSV again (if it still exists) and recomputing every KPI. With
+it, ``csv-report render`` reads one compressed row and only renders the
+template. Both paths are timed end to end, best of three, on a file-backed
+run.db and an uncached CSV parse.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from common import synthetic_companies
+
+from csv_report.database import DatabaseService, pack_kpi_payload
+from csv_report.load import load_csv
+from csv_report.report.generate import render_report, report_payload
+from kpi_service.kpi import build_kpi_aggregates
+
+
+def timed(func) -> float:
+    """Best of three in ms."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    """Store one run's payload and time both ways of rendering it as HTML."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = Path(tmp) / "companies.csv"
+        synthetic_companies(args.rows).to_csv(csv_file, index=False)
+        db_service = DatabaseService(f"sqlite:///{Path(tmp) / 'run.db'}")
+        run = db_service.create_run(csv_file=str(csv_file), output_format="md")
+        payload = report_payload(build_kpi_aggregates(load_csv(csv_file)))
+        db_service.save_kpi_payload(run.id, payload)
+
+        def from_csv() -> None:
+            df = load_csv(csv_file, use_cache=False)
+            render_report(report_payload(build_kpi_aggregates(df)), "html")
+
+        def from_payload() -> None:
+            render_report(db_service.get_kpi_payload(run.id), "html")
+
+        recompute = timed(from_csv)
+        rerender = timed(from_payload)
+        csv_bytes = csv_file.stat().st_size
+
+    print(f"rows:               {args.rows:,}")
+    print(f"source CSV:         {csv_bytes / 2**20:9.1f} MiB")
+    print(f"stored payload:     {len(pack_kpi_payload(payload)) / 2**10:9.1f} KiB")
+    print(f"reload + recompute: {recompute:9.1f} ms")
+    print(f"render payload:     {rerender:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Page latency and query count of run listings deep into a large history.
+
+Compares ``LIMIT/OFFSET`` pages with keyset pages (``list_runs`` cursors) at
+increasing depth, and counts the queries needed for one page with its KPIs:
+one ``get_kpis_for_run`` per run vs. a single ``get_kpis_for_runs``.
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+
+from sqlalchemy import event, insert
+from sqlmodel import Session, select
+
+from csv_report.database import DatabaseService
+from csv_report.models import Kpi, Run
+from csv_report.pagination import encode_cursor
+
+PAGE_SIZE = 50
+
+
+def populate(db_service: DatabaseService, runs: int) -> None:
+    """Insert ``runs`` runs with three KPIs each."""
+    # run.db stores naive UTC timestamps
+    start = datetime(2020, 1, 1)  # noqa: DTZ001
+    with Session(db_service.engine) as session:
+        session.execute(
+            insert(Run),
+            [
+                {
+                    "id": i + 1,
+                    "timestamp": start + timedelta(minutes=i),
+                    "csv_file": f"file_{i}.csv",
+                    "output_format": "html",
+                    "status": "completed",
+                }
+                for i in range(runs)
+            ],
+        )
+        session.execute(
+            insert(Kpi),
+            [
+                {"run_id": i + 1, "name": name, "value": float(i)}
+                for i in range(runs)
+                for name in ("total_companies", "avg_market_cap", "sector_count")
+            ],
+        )
+        session.commit()
+
+
+def offset_page(db_service: DatabaseService, depth: int) -> list:
+    """One page at ``depth`` with LIMIT/OFFSET."""
+    statement = (
+        select(Run)
+        .order_by(Run.timestamp.desc(), Run.id.desc())
+        .offset(depth)
+        .limit(PAGE_SIZE)
+    )
+    with Session(db_service.engine) as session:
+        return session.exec(statement).all()
+
+
+def timed(func, repeats: int = 5) -> float:
+    """Best time of ``func`` in ms."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    """Run the benchmark and print page latencies and query counts."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_service = DatabaseService(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        populate(db_service, args.runs)
+
+        print(f"runs: {args.runs}, page size: {PAGE_SIZE}")
+        for depth in (0, args.runs // 10, args.runs // 2, args.runs - PAGE_SIZE - 1):
+            # Cursor of the run just before the page, as the previous page ends
+            before = offset_page(db_service, depth - 1)[0] if depth else None
+            cursor = encode_cursor(before) if before else None
+            offset_ms = timed(partial(offset_page, db_service, depth))
+            keyset_ms = timed(partial(db_service.list_runs, PAGE_SIZE, cursor=cursor))
+            print(
+                f"depth {depth:>9}:       OFFSET {offset_ms:7.2f} ms, "
+                f"cursor {keyset_ms:6.2f} ms",
+            )
+
+        queries = []
+        event.listen(
+            db_service.engine,
+            "before_cursor_execute",
+            lambda *_: queries.append(1),
+        )
+        runs, _ = db_service.list_runs(PAGE_SIZE)
+        for run in runs:
+            db_service.get_kpis_for_run(run.id)
+        per_run = len(queries)
+        queries.clear()
+        runs, _ = db_service.list_runs(PAGE_SIZE)
+        db_service.get_kpis_for_runs([run.id for run in runs])
+        print(f"queries per page:      {per_run} per-run, {len(queries)} batched")
+
+
+if __name__ == "__main__":
+    main()
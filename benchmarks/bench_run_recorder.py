@@ -0,0 +1,132 @@
+"""Record runs with one transaction per call vs. the write-behind recorder.
+
+Every run is created, gets its KPIs and is marked completed, like
+``generate`` does. Directly, each call is its own transaction and the
+pipeline waits for each commit; through ``RunRecorder`` the calls only
+enqueue and the writer thread coalesces them. Writer processes record
+their own runs at the same time to add lock contention.
+"""
+
+import argparse
+import functools
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from common import synthetic_companies
+from sqlalchemy import event
+
+from csv_report.database import DatabaseService, kpi_records
+from csv_report.main import _complete_run
+from csv_report.recorder import DEFAULT_MAX_BATCH, RunRecorder
+from kpi_service.kpi import compute_all_kpis
+
+
+def count_commit(commits: list, _connection: object) -> None:
+    """Engine ``commit`` listener counting transactions."""
+    commits.append(1)
+
+
+def competing_writer(database_url: str, runs: int, records: list) -> float:
+    """Record ``runs`` runs directly; returns the seconds it took."""
+    db_service = DatabaseService(database_url)
+    start = time.perf_counter()
+    for i in range(runs):
+        run = db_service.create_run(csv_file=f"other{i}.csv", output_format="md")
+        db_service.add_kpis(run.id, records)
+    return time.perf_counter() - start
+
+
+def record_direct(db_service: DatabaseService, runs: int, records: list) -> float:
+    """Seconds the pipeline blocks on the previous direct database calls."""
+    start = time.perf_counter()
+    for i in range(runs):
+        run = db_service.create_run(
+            csv_file=f"{i}.csv",
+            output_format="md",
+            status="processing",
+        )
+        db_service.add_kpis(run.id, records)
+        _complete_run(db_service, run, time.time())
+    return time.perf_counter() - start
+
+
+def record_behind(
+    db_service: DatabaseService,
+    runs: int,
+    records: list,
+    max_batch: int,
+) -> tuple:
+    """Seconds the pipeline blocks on enqueueing, and until the final flush."""
+    start = time.perf_counter()
+    with RunRecorder(db_service, max_batch=max_batch) as recorder:
+        for i in range(runs):
+            run = recorder.create_run(
+                csv_file=f"{i}.csv",
+                output_format="md",
+                status="processing",
+            )
+            recorder.add_kpis(run, records)
+            recorder.complete_run(run, 0.0)
+        enqueued = time.perf_counter() - start
+        recorder.flush()
+    return enqueued, time.perf_counter() - start
+
+
+def main() -> None:
+    """Run both modes and print blocking time and transactions."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--writer-runs", type=int, default=100)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    args = parser.parse_args()
+
+    records = kpi_records(compute_all_kpis(synthetic_companies(5_000)))
+    print(f"runs x KPIs:       {args.runs} x {len(records)}")
+    print(f"competing writers: {args.writers} x {args.writer_runs} runs")
+    print(f"max batch:         {args.max_batch}")
+    for label in ["direct calls", "write-behind"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+            db_service = DatabaseService(database_url)
+            commits = []
+            event.listen(
+                db_service.engine,
+                "commit",
+                functools.partial(count_commit, commits),
+            )
+            with ProcessPoolExecutor(max(args.writers, 1)) as pool:
+                # Start the worker processes before anything is timed
+                warmup = [pool.submit(time.sleep, 0.5) for _ in range(args.writers)]
+                for future in warmup:
+                    future.result()
+                others = [
+                    pool.submit(
+                        competing_writer,
+                        database_url,
+                        args.writer_runs,
+                        records,
+                    )
+                    for _ in range(args.writers)
+                ]
+                if label == "direct calls":
+                    blocked = total = record_direct(db_service, args.runs, records)
+                else:
+                    blocked, total = record_behind(
+                        db_service,
+                        args.runs,
+                        records,
+                        args.max_batch,
+                    )
+                slowest = max((future.result() for future in others), default=0.0)
+            print(f"\n{label}")
+            print(f"  pipeline blocked:  {blocked * 1000:9.1f} ms")
+            print(f"  durable after:     {total * 1000:9.1f} ms")
+            print(f"  transactions:      {len(commits):9d}")
+            print(f"  competing writers: {slowest * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
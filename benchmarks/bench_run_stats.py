@@ -0,0 +1,128 @@
+"""Run statistics in SQL vs. fetching the runs of the window into Python.
+
+``--runs`` runs are spread over the last year across ``--files`` input files
+and two output formats, one in 47 failed. The statistics of the last
+``--days`` days are computed three ways: ``DatabaseService.get_run_stats``
+locating the window through the ``run.timestamp`` index, the same statement
+without the index, and loading the window's ``Run`` objects and aggregating
+them in Python as ``generate`` did for its average.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+from pathlib import Path
+
+from sqlalchemy import insert, text
+from sqlmodel import Session, select
+
+from csv_report.database import DatabaseService
+from csv_report.models import Run, utcnow
+from csv_report.run_stats import stats_window
+
+BATCH_RUNS = 50_000
+
+
+def populate(db_service: DatabaseService, runs: int, files: int) -> None:
+    """Insert ``runs`` runs over the last 365 days."""
+    step = timedelta(days=365) / runs
+    origin = utcnow() - timedelta(days=365)
+    with Session(db_service.engine) as session:
+        for first in range(0, runs, BATCH_RUNS):
+            session.execute(
+                insert(Run),
+                [
+                    {
+                        "timestamp": origin + step * i,
+                        "csv_file": f"data/sp500_{i % files}.csv",
+                        "output_format": "html" if i % 3 else "markdown",
+                        "status": "failed" if i % 47 == 0 else "completed",
+                        "rows_processed": 500 + i % 1000,
+                        "duration": 0.2 + (i % 997) / 100,
+                    }
+                    for i in range(first, min(first + BATCH_RUNS, runs))
+                ],
+            )
+        session.commit()
+
+
+def python_stats(db_service: DatabaseService, group_by: str, since, until) -> dict:
+    """Per-group percentiles and throughput computed from loaded runs."""
+    groups = defaultdict(list)
+    with Session(db_service.engine) as session:
+        statement = select(Run).where(Run.timestamp >= since, Run.timestamp < until)
+        for run in session.exec(statement):
+            groups[getattr(run, group_by)].append(run)
+    result = {}
+    for key, runs in groups.items():
+        completed = [r for r in runs if r.status == "completed"]
+        durations = statistics.quantiles([r.duration for r in completed], n=100)
+        result[key] = {
+            "failure_rate": sum(r.status == "failed" for r in runs) / len(runs),
+            "p50": durations[49],
+            "p90": durations[89],
+            "p99": durations[98],
+            "rows_per_second": sum(r.rows_processed for r in completed)
+            / sum(r.duration for r in completed),
+        }
+    return result
+
+
+def timed(func) -> float:
+    """Best of three in ms."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    """Time the three ways for both groupings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=2_000_000)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_service = DatabaseService(f"sqlite:///{Path(tmp) / 'run.db'}")
+        populate(db_service, args.runs, args.files)
+        with db_service.engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+        since, until = stats_window(utcnow() - timedelta(days=args.days))
+        with Session(db_service.engine) as session:
+            in_window = session.exec(
+                select(Run.id).where(Run.timestamp >= since),
+            ).all()
+
+        results = {}
+        for group_by in ("output_format", "csv_file"):
+            results[group_by] = [
+                timed(partial(db_service.get_run_stats, group_by, since, until)),
+                timed(partial(python_stats, db_service, group_by, since, until)),
+            ]
+        with db_service.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_run_timestamp"))
+        for group_by in ("output_format", "csv_file"):
+            results[group_by].append(
+                timed(partial(db_service.get_run_stats, group_by, since, until)),
+            )
+
+    print(f"runs:               {args.runs:,} over 365 days")
+    print(f"window:             {args.days} days, {len(in_window):,} runs")
+    print(f"{'':19} {'SQL':>9} {'Python':>10} {'SQL, no index':>14}")
+    for group_by, (sql, python, unindexed) in results.items():
+        print(
+            f"{group_by + ':':19} {sql:6.1f} ms {python:7.0f} ms "
+            f"{unindexed:11.1f} ms",
+        )
+
+
+if __name__ == "__main__":
+    main()
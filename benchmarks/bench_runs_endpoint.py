@@ -0,0 +1,62 @@
+"""Load test of ``GET /runs`` with a per-request vs. a shared pooled engine.
+
+"Per-request engine" disposes the engine registry before every request,
+which reproduces the previous behaviour of ``DatabaseService`` building a
+new engine (and connection pool) each time it was constructed.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from csv_report import db_init
+from csv_report.database import DatabaseService
+from kpi_service.app import app
+
+
+def measure(client: TestClient, requests: int, *, fresh_engine: bool) -> list:
+    """Return the latency of every request in milliseconds."""
+    latencies = []
+    for _ in range(requests):
+        if fresh_engine:
+            db_init.dispose_engines()
+        start = time.perf_counter()
+        response = client.get("/runs", params={"limit": 10})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return latencies
+
+
+def main() -> None:
+    """Run the load test and print p50/p99 latency for both modes."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        db_init.get_database_url = lambda: database_url
+        db_service = DatabaseService()
+        for i in range(100):
+            db_service.create_run(csv_file=f"file_{i}.csv", output_format="html")
+
+        with TestClient(app) as client:
+            measure(client, 50, fresh_engine=False)
+            for label, fresh_engine in [
+                ("per-request engine", True),
+                ("shared pooled engine", False),
+            ]:
+                latencies = measure(client, args.requests, fresh_engine=fresh_engine)
+                quantiles = statistics.quantiles(latencies, n=100)
+                print(
+                    f"{label + ':':<22} p50 {quantiles[49]:.2f} ms, "
+                    f"p99 {quantiles[98]:.2f} ms",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark schema-projected CSV loading on a wide vendor-style file.
+
+Compares a plain ``pd.read_csv`` of every column with ``read_csv`` from
+``csv_report.load``, which parses only the ``INPUT_SCHEMA`` columns with
+their declared dtypes (C and, when installed, pyarrow engine).
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from common import best_of, synthetic_companies
+
+from csv_report.csv_cache import PYARROW_AVAILABLE
+from csv_report.load import read_csv
+
+
+def wide_companies(rows: int, extra_columns: int) -> pd.DataFrame:
+    """KPI columns plus free-text and numeric vendor columns."""
+    rng = np.random.default_rng(7)
+    df = synthetic_companies(rows)
+    for i in range(extra_columns):
+        if i % 2:
+            df[f"Metric{i}"] = rng.normal(1e9, 1e8, size=rows)
+        else:
+            df[f"Text{i}"] = [f"Lorem ipsum {j % 9973} dolor sit" for j in range(rows)]
+    return df
+
+
+def main() -> None:
+    """Run the benchmark and print time and frame memory per loader."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--extra-columns", type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = Path(tmp) / "wide.csv"
+        wide_companies(args.rows, args.extra_columns).to_csv(csv_file, index=False)
+
+        loaders = {"all columns": lambda: pd.read_csv(csv_file)}
+        loaders["schema (c)"] = lambda: read_csv(csv_file, engine="c")
+        if PYARROW_AVAILABLE:
+            loaders["schema (pyarrow)"] = lambda: read_csv(csv_file)
+
+        mib = 1024 * 1024
+        print(f"rows:              {args.rows:,} x {4 + args.extra_columns} columns")
+        print(f"csv size:          {csv_file.stat().st_size / mib:,.1f} MiB")
+        for name, load in loaders.items():
+            seconds = best_of(load)
+            memory = load().memory_usage(deep=True).sum()
+            print(f"{name + ':':<18} {seconds:.3f}s, frame {memory / mib:,.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark peak memory of full loading vs. --stream aggregation.
+
+Writes synthetic CSV files of growing size and, for each one, computes the
+KPIs in a fresh subprocess either from a fully loaded DataFrame or chunk by
+chunk, reporting the child's peak RSS. In streaming mode the peak should stay
+flat as the file grows.
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import synthetic_companies
+
+
+def write_csv(csv_path: Path, rows: int, block: int = 100_000) -> None:
+    """Write a synthetic CSV in blocks so this process stays small."""
+    for start in range(0, rows, block):
+        frame = synthetic_companies(min(block, rows - start), seed=start)
+        frame.to_csv(csv_path, mode="a", header=start == 0, index=False)
+
+
+def measure(mode: str, csv_path: str, chunksize: int) -> None:
+    """Compute the KPIs in this process and print seconds and peak RSS (KiB)."""
+    from csv_report.load import iter_csv_chunks, load_csv
+    from kpi_service.kpi import compute_all_kpis
+    from kpi_service.streaming import aggregate_chunks
+
+    start = time.perf_counter()
+    if mode == "stream":
+        aggregates = aggregate_chunks(iter_csv_chunks(csv_path, chunksize=chunksize))
+        compute_all_kpis(aggregates=aggregates)
+    else:
+        compute_all_kpis(load_csv(csv_path))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed} {peak}")
+
+
+def main() -> None:
+    """Run every (size, mode) combination in a subprocess and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="250000,1000000,2000000")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "CSV"))
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure[0], args.measure[1], args.chunksize)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        header = ["rows", "file MiB", "mode", "seconds", "peak MiB"]
+        print("{:>10} {:>9} {:>7} {:>8} {:>9}".format(*header))
+        for rows in (int(size) for size in args.sizes.split(",")):
+            csv_path = Path(tmp) / f"companies_{rows}.csv"
+            write_csv(csv_path, rows)
+            file_mib = csv_path.stat().st_size / 2**20
+            for mode in ["full", "stream"]:
+                output = subprocess.run(  # noqa: S603
+                    [
+                        sys.executable,
+                        __file__,
+                        "--measure",
+                        mode,
+                        str(csv_path),
+                        "--chunksize",
+                        str(args.chunksize),
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.split()
+                seconds, peak_kib = float(output[0]), int(output[1])
+                print(
+                    f"{rows:>10,} {file_mib:>9.1f} {mode:>7} "
+                    f"{seconds:>8.2f} {peak_kib / 1024:>9.1f}",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""POST /upload latency: cache miss vs. memory hit vs. disk hit.
+
+Posts a synthetic CSV of growing size through ``httpx.ASGITransport``.
+``miss`` parses the upload and computes its KPIs; ``memory`` is the same
+upload again; ``disk`` is the same upload seen by a fresh cache sharing the
+first one's directory, as another uvicorn worker would. A hit still hashes
+the upload, shown as ``hash``.
+"""
+
+import argparse
+import asyncio
+import io
+import tempfile
+import time
+
+import httpx
+from common import synthetic_companies
+
+from kpi_service.app import app
+from kpi_service.upload_cache import UploadCache, upload_cache_key
+
+
+async def post(csv: bytes) -> float:
+    """Post the upload once and return the seconds it took."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+        start = time.perf_counter()
+        response = await ac.post(
+            "/upload",
+            files={"file": ("upload.csv", csv, "text/csv")},
+            timeout=None,
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Print upload latency per size and cache state."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    args = parser.parse_args()
+
+    header = ["rows", "MiB", "miss s", "memory s", "disk s", "hash s"]
+    print("{:>10} {:>7} {:>8} {:>9} {:>8} {:>8}".format(*header))
+    for rows in (int(size) for size in args.sizes.split(",")):
+        csv = synthetic_companies(rows).to_csv(index=False).encode()
+        app.state.max_upload_bytes = 2 * len(csv)
+        with tempfile.TemporaryDirectory() as tmp:
+            app.state.upload_cache = UploadCache(directory=tmp)
+            miss = asyncio.run(post(csv))
+            memory = asyncio.run(post(csv))
+            app.state.upload_cache = UploadCache(directory=tmp)
+            disk = asyncio.run(post(csv))
+        start = time.perf_counter()
+        upload_cache_key(io.BytesIO(csv))
+        hashed = time.perf_counter() - start
+        print(
+            f"{rows:>10,} {len(csv) / 2**20:>7.1f} {miss:>8.3f} {memory:>9.3f} "
+            f"{disk:>8.3f} {hashed:>8.3f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""/healthz latency while parallel uploads are computed, per executor.
+
+``--uploads`` copies of a synthetic CSV are posted at once through
+``httpx.ASGITransport`` while ``/healthz`` is probed every 20 ms. The delay
+of each probe past its tick includes any time the event loop was blocked.
+``inline`` computes the KPIs inside the handler as before; ``thread`` and
+``process`` use ``KpiWorkerPool`` (process workers are started first, as
+the lifespan does).
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from common import synthetic_companies
+
+from kpi_service.app import app
+from kpi_service.workers import KpiWorkerPool, upload_kpis
+
+
+class InlinePool:
+    """Stand-in for ``KpiWorkerPool`` computing on the event loop."""
+
+    async def upload_kpis(self, upload) -> dict:
+        """Compute the KPIs without leaving the handler."""
+        return upload_kpis(upload)
+
+
+async def probe(csv: bytes, uploads: int) -> tuple:
+    """Post the uploads, probe /healthz; return delays (ms) and total seconds."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+        start = time.perf_counter()
+        posts = [
+            asyncio.create_task(
+                ac.post(
+                    "/upload",
+                    files={"file": ("upload.csv", csv, "text/csv")},
+                    timeout=None,
+                ),
+            )
+            for _ in range(uploads)
+        ]
+        delays = []
+        while not all(post.done() for post in posts):
+            tick = time.perf_counter() + 0.02
+            await asyncio.sleep(0.02)
+            await ac.get("/healthz")
+            delays.append((time.perf_counter() - tick) * 1000)
+        for response in await asyncio.gather(*posts):
+            response.raise_for_status()
+    return delays, time.perf_counter() - start
+
+
+async def run(mode: str, csv: bytes, uploads: int, workers: int) -> tuple:
+    """Probe with the given executor installed on the app."""
+    if mode == "inline":
+        app.state.upload_pool = InlinePool()
+        return await probe(csv, uploads)
+    pool = KpiWorkerPool(mode, workers=workers, queue_depth=uploads)
+    app.state.upload_pool = pool
+    await pool.start()
+    try:
+        return await probe(csv, uploads)
+    finally:
+        pool.shutdown()
+
+
+def main() -> None:
+    """Print health check delays and upload time per executor."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    csv = synthetic_companies(args.rows).to_csv(index=False).encode()
+    print(f"uploads:  {args.uploads} x {len(csv) / 2**20:.1f} MiB")
+    print(f"workers:  {args.workers}")
+    print(f"{'':9} {'probes':>6} {'p50 ms':>8} {'max ms':>8} {'uploads s':>10}")
+    for mode in ["inline", "thread", "process"]:
+        delays, total = asyncio.run(run(mode, csv, args.uploads, args.workers))
+        print(
+            f"{mode + ':':9} {len(delays):>6} {statistics.median(delays):>8.1f} "
+            f"{max(delays):>8.1f} {total:>10.2f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Peak memory of POST /upload: reading the whole body vs. streaming it.
+
+Writes synthetic CSV files of growing size and posts each one to the
+FastAPI app in a fresh subprocess, through ``httpx.ASGITransport`` so the
+request body is streamed from disk like a real client's. ``legacy`` is the
+previous handler (``await file.read()``, ``.decode()``, ``StringIO``,
+``pd.read_csv``); ``stream`` is ``/upload`` parsing the spooled upload
+chunk by chunk. The child's peak RSS is reported next to its RSS after the
+imports, which the upload itself does not cause.
+"""
+
+import argparse
+import asyncio
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from typing import IO
+
+from bench_streaming import write_csv
+
+
+def measure(mode: str, csv_path: str) -> None:
+    """Post the file in this process; print seconds, base and peak RSS (KiB)."""
+    import httpx
+    import pandas as pd
+    from fastapi import File, UploadFile
+
+    from kpi_service.app import app
+    from kpi_service.kpi import compute_all_kpis, compute_kpis
+
+    async def legacy_upload(file: UploadFile = File(...)) -> dict:
+        df = pd.read_csv(StringIO((await file.read()).decode()))
+        return {"basic_kpis": compute_kpis(df), "enhanced_kpis": compute_all_kpis(df)}
+
+    app.post("/legacy-upload")(legacy_upload)
+    app.state.max_upload_bytes = 2**40
+    path = "/legacy-upload" if mode == "legacy" else "/upload"
+
+    async def post(upload: IO[bytes]) -> int:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+            files = {"file": ("upload.csv", upload, "text/csv")}
+            response = await ac.post(path, files=files, timeout=None)
+        return response.status_code
+
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with Path(csv_path).open("rb") as upload:
+        start = time.perf_counter()
+        status = asyncio.run(post(upload))
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{status} {elapsed} {base} {peak}")
+
+
+def main() -> None:
+    """Run every (size, mode) combination in a subprocess and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="250000,1250000,2500000")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "CSV"))
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        header = ["rows", "file MiB", "mode", "status", "seconds"]
+        header += ["base MiB", "peak MiB"]
+        print("{:>10} {:>9} {:>7} {:>7} {:>8} {:>9} {:>9}".format(*header))
+        for rows in (int(size) for size in args.sizes.split(",")):
+            csv_path = Path(tmp) / f"companies_{rows}.csv"
+            write_csv(csv_path, rows)
+            file_mib = csv_path.stat().st_size / 2**20
+            for mode in ["legacy", "stream"]:
+                output = subprocess.run(  # noqa: S603
+                    [sys.executable, __file__, "--measure", mode, str(csv_path)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.split()
+                status, seconds = output[0], float(output[1])
+                base_kib, peak_kib = int(output[2]), int(output[3])
+                print(
+                    f"{rows:>10,} {file_mib:>9.1f} {mode:>7} {status:>7} "
+                    f"{seconds:>8.2f} {base_kib / 1024:>9.1f} {peak_kib / 1024:>9.1f}",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+Run any benchmark from the project root, e.g.::
+
+    python benchmarks/bench_kpi_engine.py --rows 2000000
+"""
+
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Make the src/ packages importable without installing the project
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+SECTORS = [
+    "Technology",
+    "Communication Services",
+    "Consumer Cyclical",
+    "Consumer Defensive",
+    "Financial Services",
+    "Healthcare",
+    "Industrials",
+    "Energy",
+    "Utilities",
+    "Real Estate",
+    "Basic Materials",
+]
+
+
+def synthetic_companies(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Build a constituent-history-like frame with the columns the KPIs use."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(rows)],
+            "Shortname": [f"Company {i}" for i in range(rows)],
+            "Marketcap": rng.lognormal(mean=23.5, sigma=1.6, size=rows).round(),
+            "Sector": rng.choice(SECTORS, size=rows),
+        },
+    )
+
+
+def best_of(func: Callable[[], object], repeat: int = 3) -> float:
+    """Return the fastest wall-clock time in seconds over ``repeat`` calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
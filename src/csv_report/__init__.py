@@ -1,29 +1,64 @@
 """CSV Report Generator package."""
 
+from .async_database import AsyncDatabaseService
 from .database import DatabaseService
 from .db_init import create_database, get_database_url, test_database_connection
-from .load import load_csv
-from .main import app, generate, init_db, show_runs
-from .models import Kpi, Run
+from .load import CsvSchemaError, load_csv
+from .main import (
+    app,
+    archive,
+    generate,
+    generate_batch,
+    init_db,
+    kpi_history,
+    render,
+    show_runs,
+    stats,
+    update,
+)
+from .models import (
+    CachedRun,
+    Job,
+    Kpi,
+    KpiPayload,
+    KpiRollup,
+    KpiState,
+    ResultCache,
+    Run,
+)
 from .report.email import send_report
 
 # KPI functions now available from kpi_service module
 from .report.generate import generate_report, save_report
 
 __all__ = [
+    "AsyncDatabaseService",
+    "CachedRun",
+    "CsvSchemaError",
     "DatabaseService",
+    "Job",
     "Kpi",
+    "KpiPayload",
+    "KpiRollup",
+    "KpiState",
+    "ResultCache",
     "Run",
     "app",
+    "archive",
     "create_database",
     "generate",
+    "generate_batch",
     # KPI functions moved to kpi_service module
     "generate_report",
     "get_database_url",
     "init_db",
+    "kpi_history",
     "load_csv",
+    "render",
     "save_report",
     "send_report",
     "show_runs",
+    "stats",
     "test_database_connection",
+    "update",
 ]
@@ -0,0 +1,352 @@
+"""Asyncio database service for the FastAPI application."""
+
+import asyncio
+import json
+import zlib
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlmodel import insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import kpi_rows, unpack_kpi_payload
+from .db_init import get_async_engine
+from .models import CachedRun, Job, Kpi, KpiPayload, KpiState, Run, utcnow
+from .pagination import (
+    cached_sources_statement,
+    group_kpis,
+    kpis_statement,
+    runs_page_statement,
+    split_page,
+)
+from .retention import archived_records, archived_runs_page, default_archive_dir
+from .rollups import (
+    history_point,
+    history_statement,
+    rollup_rows,
+    rollup_upsert_statement,
+)
+from .run_stats import stats_row, stats_statement, stats_window
+
+
+class AsyncDatabaseService:
+    """Asyncio counterpart of ``DatabaseService`` for run and KPI records.
+
+    Queries run on an ``aiosqlite`` connection pool, so request handlers
+    await them instead of blocking the event loop. The result cache is only
+    used by the CLI and stays on ``DatabaseService``; jobs of ``POST /jobs``
+    are only used by the API and live here.
+    """
+
+    def __init__(self, database_url: Optional[str] = None) -> None:
+        # Shared per process; see ``db_init.get_async_engine``
+        self.engine = get_async_engine(database_url)
+
+    def _session(self) -> AsyncSession:
+        # Loaded attributes stay usable after commit without lazy-load I/O
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    def _archive_dir(self, archive_dir: Optional[Path]) -> Path:
+        return archive_dir or default_archive_dir(self.engine)
+
+    async def _archived(
+        self,
+        archive_dir: Optional[Path],
+        table_name: str,
+        **filters: object,
+    ) -> list[dict[str, Any]]:
+        """Archived rows matching ``filters``, read off the event loop."""
+        return await asyncio.to_thread(
+            archived_records,
+            self._archive_dir(archive_dir),
+            table_name,
+            filters=filters,
+        )
+
+    async def _source_run(
+        self,
+        session: AsyncSession,
+        run_id: int,
+        archive_dir: Optional[Path],
+    ) -> tuple[int, bool]:
+        """Run whose KPIs ``run_id`` has (its source if cached), and if it is live."""
+        cached = await session.get(CachedRun, run_id)
+        if cached is not None:
+            run_id = cached.source_run_id
+        elif await session.get(Run, run_id) is None:
+            links = await self._archived(archive_dir, "cached_run", run_id=run_id)
+            if links:
+                run_id = links[-1]["source_run_id"]
+        return run_id, await session.get(Run, run_id) is not None
+
+    async def create_run(
+        self,
+        csv_file: str,
+        output_format: str,
+        rows_processed: Optional[int] = None,
+        status: str = "completed",
+        error_message: Optional[str] = None,
+        duration: Optional[float] = None,
+    ) -> Run:
+        """Create a new run record in the database."""
+        async with self._session() as session:
+            run = Run(
+                csv_file=csv_file,
+                output_format=output_format,
+                rows_processed=rows_processed,
+                status=status,
+                error_message=error_message,
+                duration=duration,
+            )
+            session.add(run)
+            await session.commit()
+            await session.refresh(run)
+            return run
+
+    async def add_kpi(
+        self,
+        run_id: int,
+        name: str,
+        value: float,
+        unit: Optional[str] = None,
+        description: Optional[str] = None,
+    ) -> Kpi:
+        """Add a KPI record linked to a run."""
+        async with self._session() as session:
+            kpi = Kpi(
+                run_id=run_id,
+                name=name,
+                value=value,
+                unit=unit,
+                description=description,
+            )
+            session.add(kpi)
+            await self._update_rollups(session, [kpi.model_dump()])
+            await session.commit()
+            await session.refresh(kpi)
+            return kpi
+
+    async def add_kpis(self, run_id: int, kpis: Iterable[dict[str, Any]]) -> int:
+        """Add many KPI records linked to a run in one transaction.
+
+        Returns:
+            Number of KPIs inserted
+
+        """
+        rows = kpi_rows(run_id, kpis)
+        if not rows:
+            return 0
+        async with self._session() as session:
+            await session.execute(insert(Kpi), rows)
+            await self._update_rollups(session, rows)
+            await session.commit()
+        return len(rows)
+
+    async def _update_rollups(
+        self,
+        session: AsyncSession,
+        kpis: list[dict[str, Any]],
+    ) -> None:
+        """Fold inserted KPIs into ``kpi_rollup`` within the same transaction."""
+        rows = rollup_rows(kpis)
+        if rows:
+            statement = rollup_upsert_statement(self.engine.dialect.name)
+            await session.execute(statement, rows)
+
+    async def get_kpi_history(
+        self,
+        name: str,
+        granularity: str = "day",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list[dict[str, Any]]:
+        """Get the downsampled history of a KPI; see ``DatabaseService``."""
+        statement = history_statement(name, granularity, since, until)
+        async with self._session() as session:
+            rollups = (await session.exec(statement)).all()
+            return [history_point(rollup) for rollup in rollups]
+
+    async def get_all_runs(self) -> list[Run]:
+        """Get all runs from the database."""
+        async with self._session() as session:
+            statement = select(Run).order_by(Run.timestamp.desc())
+            return (await session.exec(statement)).all()
+
+    async def get_run_by_id(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> Optional[Run]:
+        """Get a specific run by ID, from the archive if it was archived."""
+        async with self._session() as session:
+            run = await session.get(Run, run_id)
+        if run is None:
+            records = await self._archived(archive_dir, "run", id=run_id)
+            run = Run(**records[-1]) if records else None
+        return run
+
+    async def get_kpis_for_run(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> list[Kpi]:
+        """Get all KPIs for a specific run, archived runs included.
+
+        Runs served from the result cache return the KPIs of their source run.
+        """
+        async with self._session() as session:
+            run_id, live = await self._source_run(session, run_id, archive_dir)
+            if live:
+                statement = select(Kpi).where(Kpi.run_id == run_id)
+                return (await session.exec(statement)).all()
+        records = await self._archived(archive_dir, "kpi", run_id=run_id)
+        return [Kpi(**record) for record in records]
+
+    async def get_recent_runs(self, limit: int = 10) -> list[Run]:
+        """Get the most recent runs."""
+        async with self._session() as session:
+            statement = select(Run).order_by(Run.timestamp.desc()).limit(limit)
+            return (await session.exec(statement)).all()
+
+    async def get_run_stats(
+        self,
+        group_by: str = "output_format",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list[dict[str, Any]]:
+        """Get run statistics per group; see ``DatabaseService``."""
+        statement = stats_statement(group_by, *stats_window(since, until))
+        async with self._session() as session:
+            return [stats_row(row) for row in await session.exec(statement)]
+
+    async def list_runs(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        output_format: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        archive_dir: Optional[Path] = None,
+    ) -> tuple[list[Run], Optional[str]]:
+        """Get one page of runs, newest first; see ``DatabaseService.list_runs``."""
+        statement = runs_page_statement(
+            limit,
+            cursor,
+            status,
+            output_format,
+            since,
+            until,
+        )
+        async with self._session() as session:
+            runs = (await session.exec(statement)).all()
+        runs = await asyncio.to_thread(
+            archived_runs_page,
+            self._archive_dir(archive_dir),
+            runs,
+            limit,
+            cursor,
+            status,
+            output_format,
+            since,
+            until,
+        )
+        return split_page(runs, limit)
+
+    async def get_kpis_for_runs(
+        self,
+        run_ids: list[int],
+        archive_dir: Optional[Path] = None,
+    ) -> dict[int, list[Kpi]]:
+        """Get the KPIs of many runs with a fixed number of queries.
+
+        Archived runs included; see ``DatabaseService.get_kpis_for_runs``.
+        """
+        if not run_ids:
+            return {}
+        async with self._session() as session:
+            statement = cached_sources_statement(run_ids)
+            sources = list((await session.exec(statement)).all())
+            statement = select(Run.id).where(Run.id.in_(run_ids))
+            live = set(await session.exec(statement))
+            archived = [run_id for run_id in run_ids if run_id not in live]
+            if archived:
+                links = await self._archived(archive_dir, "cached_run", run_id=archived)
+                sources += [CachedRun(**link) for link in links]
+            ids = set(run_ids) | {cached.source_run_id for cached in sources}
+            kpis = list((await session.exec(kpis_statement(sorted(ids)))).all())
+            live = set(await session.exec(select(Run.id).where(Run.id.in_(ids))))
+        if ids - live:
+            archived = sorted(ids - live)
+            records = await self._archived(archive_dir, "kpi", run_id=archived)
+            kpis += [Kpi(**record) for record in records]
+        return group_kpis(run_ids, sources, kpis)
+
+    async def get_kpi_state(self, run_id: int) -> Optional[dict[str, Any]]:
+        """Get the KPI aggregate state of a run, if one was stored."""
+        async with self._session() as session:
+            record = await session.get(KpiState, run_id)
+            if record is None:
+                return None
+            return json.loads(zlib.decompress(record.state))
+
+    async def get_kpi_payload(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Get the full KPI structure of a run; see ``DatabaseService``."""
+        async with self._session() as session:
+            run_id, live = await self._source_run(session, run_id, archive_dir)
+            if live:
+                record = await session.get(KpiPayload, run_id)
+                return None if record is None else unpack_kpi_payload(record)
+        records = await self._archived(archive_dir, "kpi_payload", run_id=run_id)
+        return unpack_kpi_payload(KpiPayload(**records[-1])) if records else None
+
+    async def create_job(self, job_id: str, filename: str, owner: str) -> Job:
+        """Record a queued job of ``POST /jobs``."""
+        async with self._session() as session:
+            job = Job(id=job_id, filename=filename, owner=owner)
+            session.add(job)
+            await session.commit()
+            return job
+
+    async def get_job(self, job_id: str) -> Optional[Job]:
+        """Get a job by its identifier."""
+        async with self._session() as session:
+            return await session.get(Job, job_id)
+
+    async def update_job(self, job_id: str, **fields: object) -> None:
+        """Set fields of a job, e.g. its status and result."""
+        async with self._session() as session:
+            await session.execute(update(Job).where(Job.id == job_id).values(fields))
+            await session.commit()
+
+    async def get_unfinished_jobs(self) -> list[Job]:
+        """Get the queued and running jobs of every process."""
+        async with self._session() as session:
+            statement = select(Job).where(Job.status.in_(["queued", "running"]))
+            return (await session.exec(statement)).all()
+
+    async def expire_jobs(self, now: Optional[datetime] = None) -> int:
+        """Drop the results of finished jobs whose expiry time has passed.
+
+        Returns:
+            Number of jobs expired
+
+        """
+        statement = (
+            update(Job)
+            .where(
+                Job.status.in_(["completed", "failed"]),
+                Job.expires_at <= (now or utcnow()),
+            )
+            .values(status="expired", result=None)
+        )
+        async with self._session() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            return result.rowcount
@@ -0,0 +1,224 @@
+"""Generate reports for many CSV files in parallel.
+
+Loading, KPI computation and rendering of each file run in a worker process.
+Workers never touch the database: they return their results to the calling
+process, which is the single writer for ``Run``/``Kpi`` records, so SQLite is
+never contended.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .load import load_csv
+from .report.generate import render_report, report_payload, save_report
+
+# Add kpi_service to path and import
+sys.path.append(str(Path(__file__).parent.parent))
+from kpi_service.kpi import compute_all_kpis
+from kpi_service.streaming import KpiAccumulator
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+__all__ = [
+    "DEFAULT_PATTERN",
+    "process_csv_file",
+    "report_paths",
+    "resolve_csv_files",
+    "run_batch",
+    "split_source",
+]
+
+# Files picked up when the batch source is a directory
+DEFAULT_PATTERN = "*.csv"
+
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+
+def split_source(
+    source: str | Path,
+    pattern: str = DEFAULT_PATTERN,
+) -> tuple[Path, str]:
+    """Split a batch source into its root directory and a glob relative to it.
+
+    A directory is its own root, searched with ``pattern``; the root of a
+    glob such as ``data/**/*.csv`` is the part before its first wildcard.
+    """
+    source_path = Path(source)
+    if source_path.is_dir():
+        return source_path, pattern
+    parts = source_path.parts
+    magic = next(
+        (i for i, part in enumerate(parts) if _GLOB_MAGIC.search(part)),
+        len(parts) - 1,
+    )
+    return Path(*parts[:magic]), "/".join(parts[magic:])
+
+
+def resolve_csv_files(source: str | Path, pattern: str = DEFAULT_PATTERN) -> list[Path]:
+    """List the CSV files of a directory or a glob, sorted by path.
+
+    Args:
+        source: Directory (searched with ``pattern``) or glob such as
+            ``data/**/*.csv``
+        pattern: Glob applied inside ``source`` when it is a directory
+
+    Returns:
+        Matching files in sorted order
+
+    """
+    root, glob = split_source(source, pattern)
+    return sorted(path for path in root.glob(glob) if path.is_file())
+
+
+def report_paths(
+    csv_files: list[Path],
+    output_dir: str | Path,
+    output_format: str,
+    root: str | Path | None = None,
+) -> dict[Path, Path]:
+    """Report path of each CSV file, keeping its subdirectories below ``root``.
+
+    ``data/2024/q1.csv`` of ``data/**/*.csv`` is reported to
+    ``<output_dir>/2024/q1.<format>``, so files of the same name in different
+    directories never overwrite each other's reports. Without ``root``,
+    reports are named after the files alone.
+
+    Raises:
+        ValueError: If two files would still share a report, e.g. ``a.csv``
+            and ``a.CSV``
+
+    """
+    paths: dict[Path, Path] = {}
+    sources: dict[Path, Path] = {}
+    for csv_file in csv_files:
+        relative = csv_file.relative_to(root) if root is not None else csv_file.name
+        path = (Path(output_dir) / relative).with_suffix(f".{output_format}")
+        if path in sources:
+            msg = f"{sources[path]} and {csv_file} would both be reported to {path}"
+            raise ValueError(msg)
+        sources[path] = csv_file
+        paths[csv_file] = path
+    return paths
+
+
+def process_csv_file(
+    csv_file: str | Path,
+    output_format: str,
+    output_file: str | Path,
+    *,
+    use_cache: bool = True,
+) -> dict[str, Any]:
+    """Load one CSV file, compute its KPIs and save its report.
+
+    Runs in a worker process, so errors are returned instead of raised and
+    the batch carries on with the other files.
+
+    Args:
+        csv_file: CSV file with the S&P 500 companies columns
+        output_format: Report format (markdown or html)
+        output_file: Path the report is saved to (see ``report_paths``)
+        use_cache: Whether the parsed frame may come from the CSV cache
+
+    Returns:
+        Dictionary with csv_file, rows, duration, error and, on success,
+        output_file, all_kpis, the KPI payload and the mergeable KPI state
+
+    """
+    start_time = time.time()
+    result: dict[str, Any] = {"csv_file": str(csv_file), "rows": 0, "error": None}
+    try:
+        df = load_csv(csv_file=csv_file, use_cache=use_cache)
+        result["rows"] = len(df)
+        accumulator = KpiAccumulator.from_frame(df)
+        aggregates = accumulator.to_aggregates()
+        result["all_kpis"] = compute_all_kpis(aggregates=aggregates)
+        result["payload"] = report_payload(aggregates, result["all_kpis"])
+        report = render_report(result["payload"], output_format=output_format)
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        result["output_file"] = str(save_report(report, output_path))
+        result["state"] = accumulator.to_state()
+    except Exception as e:  # reported per file
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["duration"] = time.time() - start_time
+    return result
+
+
+def run_batch(
+    csv_files: list[Path],
+    output_format: str,
+    output_dir: str | Path,
+    workers: int,
+    *,
+    root: str | Path | None = None,
+    use_cache: bool = True,
+) -> Iterator[dict[str, Any]]:
+    """Process CSV files across ``workers`` processes.
+
+    Args:
+        csv_files: Files to process
+        output_format: Report format (markdown or html)
+        output_dir: Directory for the reports
+        workers: Number of worker processes (1 runs in-process)
+        root: Directory the files were found in (see ``report_paths``);
+            reports are named after the files alone without it
+        use_cache: Whether parsed frames may come from the CSV cache
+
+    Returns:
+        Iterator over the results of ``process_csv_file`` in completion order
+
+    Raises:
+        ValueError: If two files would share a report; raised before any
+            file is processed
+
+    """
+    paths = report_paths(csv_files, output_dir, output_format, root)
+    if workers <= 1:
+        return (
+            process_csv_file(csv_file, output_format, path, use_cache=use_cache)
+            for csv_file, path in paths.items()
+        )
+    return _run_in_pool(paths, output_format, workers, use_cache=use_cache)
+
+
+def _run_in_pool(
+    paths: dict[Path, Path],
+    output_format: str,
+    workers: int,
+    *,
+    use_cache: bool,
+) -> Iterator[dict[str, Any]]:
+    """Process CSV files on a process pool, yielding results as they finish."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                process_csv_file,
+                csv_file,
+                output_format,
+                path,
+                use_cache=use_cache,
+            ): csv_file
+            for csv_file, path in paths.items()
+        }
+        for future in as_completed(futures):
+            yield _future_result(future, futures[future])
+
+
+def _future_result(future: Future, csv_file: Path) -> dict[str, Any]:
+    """Result of a worker, or an error result if the worker itself failed."""
+    try:
+        return future.result()
+    except Exception as e:  # e.g. a killed worker
+        return {
+            "csv_file": str(csv_file),
+            "rows": 0,
+            "duration": 0.0,
+            "error": f"{type(e).__name__}: {e}",
+        }
@@ -0,0 +1,254 @@
+"""On-disk columnar cache of parsed CSV files.
+
+Parsed DataFrames are stored as uncompressed Arrow IPC (Feather v2) files,
+keyed by the content hash of the CSV file. Size and mtime of each source file
+are remembered, so an unchanged file is recognised without hashing it again.
+Later loads memory-map the cached file instead of re-parsing the text.
+
+The cache is bounded in size: entries are touched on every hit and the least
+recently used ones are evicted once ``max_bytes`` is exceeded. The file index
+is shared by every process using the directory; its read-modify-write cycles
+are serialized with an exclusive ``flock`` where the platform has one.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+import pandas as pd
+
+# Optional import for the Arrow IPC cache files
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# POSIX only; elsewhere index updates are not serialized between processes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+__all__ = [
+    "DEFAULT_CACHE_DIR",
+    "DEFAULT_MAX_BYTES",
+    "PYARROW_AVAILABLE",
+    "CsvCache",
+    "file_digest",
+    "get_default_cache",
+]
+
+DEFAULT_CACHE_DIR = Path(
+    os.getenv("CSV_REPORT_CACHE_DIR", Path.home() / ".cache" / "csv_report"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("CSV_REPORT_CACHE_MAX_BYTES", str(1 << 30)))
+
+# Bump when the layout of cached frames changes to invalidate old entries
+CACHE_VERSION = 1
+ENTRY_SUFFIX = ".arrow"
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path: str | Path) -> str:
+    """SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CsvCache:
+    """Size-bounded LRU cache of parsed CSV files."""
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        if not PYARROW_AVAILABLE:
+            msg = (
+                "pyarrow is required for the CSV cache. "
+                "Install with: pip install pyarrow"
+            )
+            raise ImportError(msg)
+        self.directory = Path(directory) if directory is not None else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+
+    def _read_index(self) -> dict[str, list]:
+        """Source path -> [size, mtime_ns, content digest]."""
+        try:
+            return json.loads((self.directory / INDEX_FILE).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _index_lock(self) -> Iterator[None]:
+        """Hold the exclusive lock of the file index (see module docstring)."""
+        if fcntl is None:
+            yield
+            return
+        with (self.directory / INDEX_LOCK_FILE).open("a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _write_atomic(self, path: Path, write: Callable[[Path], None]) -> None:
+        """Write ``path`` through a temporary file so readers never see half."""
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            write(tmp_path)
+            tmp_path.replace(path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            raise
+
+    def content_digest(self, csv_file: str | Path) -> str:
+        """SHA-256 of the file, reused while its size and mtime are unchanged."""
+        path = Path(csv_file).resolve()
+        stat = path.stat()
+        cached = self._read_index().get(str(path))
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = file_digest(path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Re-read under the lock so entries added meanwhile are kept
+        with self._index_lock():
+            index = self._read_index()
+            index[str(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._write_atomic(
+                self.directory / INDEX_FILE,
+                lambda tmp: tmp.write_text(json.dumps(index)),
+            )
+        return digest
+
+    def key(self, csv_file: str | Path, variant: str = "") -> str:
+        """Cache key of a file; ``variant`` separates differently parsed frames."""
+        parts = f"{CACHE_VERSION}:{pd.__version__}:{variant}:"
+        parts += self.content_digest(csv_file)
+        return hashlib.sha256(parts.encode()).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / f"{key}{ENTRY_SUFFIX}"
+
+    def get(self, csv_file: str | Path, variant: str = "") -> pd.DataFrame | None:
+        """Return the cached frame of ``csv_file``, or None on a miss.
+
+        The memory-mapped columns are converted one by one into their own
+        pandas blocks (``split_blocks``) and released as they are converted
+        (``self_destruct``), so a hit never holds the frame twice, as
+        consolidating the columns into 2-D blocks would.
+        """
+        entry = self._entry(self.key(csv_file, variant))
+        try:
+            table = feather.read_table(entry, memory_map=True)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        # Mark as recently used for the LRU eviction
+        with contextlib.suppress(OSError):
+            os.utime(entry)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def put(self, csv_file: str | Path, df: pd.DataFrame, variant: str = "") -> bool:
+        """Store the parsed frame of ``csv_file``.
+
+        Returns:
+            False if the frame has no Arrow representation (e.g. an object
+            column mixing numbers and strings) and was not cached
+
+        """
+        entry = self._entry(self.key(csv_file, variant))
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return False
+        self._write_atomic(
+            entry,
+            lambda tmp: feather.write_feather(table, tmp, compression="uncompressed"),
+        )
+        self.evict()
+        return True
+
+    def load(
+        self,
+        csv_file: str | Path,
+        parse: Callable[[str | Path], pd.DataFrame],
+        variant: str = "",
+    ) -> pd.DataFrame:
+        """Return the cached frame of ``csv_file``, parsing and caching on a miss.
+
+        An unusable cache directory never fails the load; the file is parsed.
+        """
+        try:
+            df = self.get(csv_file, variant)
+        except OSError:
+            return parse(csv_file)
+        if df is None:
+            df = parse(csv_file)
+            with contextlib.suppress(OSError):
+                self.put(csv_file, df, variant)
+        return df
+
+    def _entries(self) -> list[tuple[int, int, Path]]:
+        """(mtime_ns, size, path) of every cached frame, oldest first."""
+        entries = []
+        for entry in self.directory.glob(f"*{ENTRY_SUFFIX}"):
+            with contextlib.suppress(OSError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        return sorted(entries)
+
+    def entries(self) -> list[Path]:
+        """Cached frames, least recently used first."""
+        return [entry for _, _, entry in self._entries()]
+
+    def size(self) -> int:
+        """Total bytes held by cached frames."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until ``max_bytes`` is respected."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                entry.unlink()
+            total -= size
+
+    def clear(self) -> None:
+        """Remove every cached frame and the file index."""
+        for entry in self.entries():
+            with contextlib.suppress(OSError):
+                entry.unlink()
+        if not self.directory.is_dir():
+            return
+        with self._index_lock(), contextlib.suppress(OSError):
+            (self.directory / INDEX_FILE).unlink()
+
+
+@lru_cache(maxsize=1)
+def get_default_cache() -> CsvCache | None:
+    """Shared cache in ``DEFAULT_CACHE_DIR``, or None without pyarrow."""
+    return CsvCache() if PYARROW_AVAILABLE else None
@@ -1,18 +1,249 @@
 """Database service for CSV report application."""
 
-from typing import Optional
+import json
+import math
+import zlib
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
 
-from sqlmodel import Session, create_engine, select
+import pandas as pd
+from sqlmodel import Session, delete, func, insert, select
 
-from .db_init import get_database_url
-from .models import Kpi, Run
+from .db_init import get_engine
+from .models import CachedRun, Kpi, KpiPayload, KpiState, ResultCache, Run, utcnow
+from .pagination import (
+    cached_sources_statement,
+    group_kpis,
+    kpis_statement,
+    runs_page_statement,
+    split_page,
+)
+from .retention import (
+    DEFAULT_ARCHIVE_BATCH_SIZE,
+    archive_runs,
+    archived_records,
+    archived_runs_page,
+    default_archive_dir,
+    read_history,
+)
+from .rollups import (
+    history_point,
+    history_statement,
+    rollup_rows,
+    rollup_upsert_statement,
+)
+from .run_stats import stats_row, stats_statement, stats_window
+
+# Bump when the layout of ``report_payload`` changes incompatibly
+KPI_PAYLOAD_VERSION = 1
+
+# Headline KPIs: (name, section of compute_all_kpis, key, unit, description)
+HEADLINE_KPIS = [
+    (
+        "total_companies",
+        "base_kpis",
+        "total_companies",
+        "companies",
+        "Total number of companies in the dataset",
+    ),
+    (
+        "avg_market_cap",
+        "base_kpis",
+        "avg_market_cap",
+        "USD",
+        "Average market capitalization across all companies",
+    ),
+    (
+        "median_market_cap",
+        "base_kpis",
+        "median_market_cap",
+        "USD",
+        "Median market capitalization across all companies",
+    ),
+    (
+        "small_cap_count",
+        "market_cap_distribution",
+        "small_cap_count",
+        "companies",
+        "Number of small cap companies (<$2B market cap)",
+    ),
+    (
+        "mid_cap_count",
+        "market_cap_distribution",
+        "mid_cap_count",
+        "companies",
+        "Number of mid cap companies ($2B-$10B market cap)",
+    ),
+    (
+        "large_cap_count",
+        "market_cap_distribution",
+        "large_cap_count",
+        "companies",
+        "Number of large cap companies ($10B-$100B market cap)",
+    ),
+    (
+        "mega_cap_count",
+        "market_cap_distribution",
+        "mega_cap_count",
+        "companies",
+        "Number of mega cap companies (>$100B market cap)",
+    ),
+    (
+        "tech_companies",
+        "tech_vs_traditional",
+        "tech_companies",
+        "companies",
+        "Number of technology sector companies",
+    ),
+    (
+        "tech_market_cap",
+        "tech_vs_traditional",
+        "tech_market_cap",
+        "USD",
+        "Total market cap of technology sector companies",
+    ),
+]
+
+# Per-sector KPIs: (name prefix, key, unit, description)
+SECTOR_KPIS = [
+    ("sector_company_count", "company_count", "companies", "Companies in sector"),
+    ("sector_avg_market_cap", "avg_market_cap", "USD", "Average market cap of sector"),
+    (
+        "sector_median_market_cap",
+        "median_market_cap",
+        "USD",
+        "Median market cap of sector",
+    ),
+    (
+        "sector_total_market_cap",
+        "total_market_cap",
+        "USD",
+        "Total market cap of sector",
+    ),
+]
+
+
+def kpi_records(all_kpis: dict[str, Any]) -> list[dict[str, Any]]:
+    """Flatten ``compute_all_kpis`` output into rows for the KPI table.
+
+    Besides the headline KPIs this covers the market cap percentiles
+    (``market_cap_p25`` ...) and per-sector KPIs named
+    ``<kpi>:<sector>`` (e.g. ``sector_avg_market_cap:Technology``). KPIs
+    without a value (NaN on empty data) are skipped.
+    """
+    enhanced = all_kpis["enhanced_kpis"]
+    sections = {"base_kpis": all_kpis["base_kpis"], **enhanced}
+    records = [
+        (name, sections[section][key], unit, description)
+        for name, section, key, unit, description in HEADLINE_KPIS
+    ]
+    records.extend(
+        (
+            f"market_cap_{percentile}",
+            value,
+            "USD",
+            f"{percentile[1:]}th percentile of market capitalization",
+        )
+        for percentile, value in enhanced["percentiles"].items()
+    )
+    totals = {
+        row["sector"]: row["total_market_cap"] for row in enhanced["sector_rankings"]
+    }
+    for row in all_kpis["sector_kpis"]["sectors"]:
+        sector = {**row, "total_market_cap": totals.get(row["sector"], math.nan)}
+        records.extend(
+            (
+                f"{prefix}:{row['sector']}",
+                sector[key],
+                unit,
+                f"{description} {row['sector']}",
+            )
+            for prefix, key, unit, description in SECTOR_KPIS
+        )
+    return [
+        {"name": name, "value": float(value), "unit": unit, "description": text}
+        for name, value, unit, text in records
+        if not math.isnan(float(value))
+    ]
+
+
+def kpi_rows(run_id: int, kpis: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Rows for a bulk insert into the KPI table, stamped with the same time."""
+    calculated_at = utcnow()
+    return [
+        {
+            "run_id": run_id,
+            "name": kpi["name"],
+            "value": kpi["value"],
+            "unit": kpi.get("unit"),
+            "description": kpi.get("description"),
+            "calculated_at": calculated_at,
+        }
+        for kpi in kpis
+    ]
+
+
+def pack_kpi_state(state: dict[str, Any]) -> bytes:
+    """Compress a ``KpiAccumulator.to_state()`` for the ``kpi_state`` table.
+
+    Most of the state is base64 sketch data that barely compresses, so the
+    fastest level is used.
+    """
+    return zlib.compress(json.dumps(state).encode(), 1)
+
+
+def pack_kpi_payload(payload: dict[str, Any]) -> bytes:
+    """Compress a ``report_payload()`` for the ``kpi_payload`` table."""
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), 9)
+
+
+def unpack_kpi_payload(record: KpiPayload) -> dict[str, Any]:
+    """Decompress a stored KPI payload.
+
+    Raises:
+        ValueError: If the payload was stored in a layout this code cannot read
+
+    """
+    if record.version != KPI_PAYLOAD_VERSION:
+        msg = (
+            f"KPI payload of run {record.run_id} has layout version "
+            f"{record.version}, expected {KPI_PAYLOAD_VERSION}"
+        )
+        raise ValueError(msg)
+    return json.loads(zlib.decompress(record.payload))
 
 
 class DatabaseService:
     """Service class for database operations."""
 
-    def __init__(self) -> None:
-        self.engine = create_engine(get_database_url(), echo=False)
+    def __init__(self, database_url: Optional[str] = None) -> None:
+        # Shared per process; see ``db_init.get_engine``
+        self.engine = get_engine(database_url)
+
+    def _archive_dir(self, archive_dir: Optional[Path]) -> Path:
+        return archive_dir or default_archive_dir(self.engine)
+
+    def _source_run(
+        self,
+        session: Session,
+        run_id: int,
+        archive_dir: Optional[Path],
+    ) -> tuple[int, bool]:
+        """Run whose KPIs ``run_id`` has (its source if cached), and if it is live."""
+        cached = session.get(CachedRun, run_id)
+        if cached is not None:
+            run_id = cached.source_run_id
+        elif session.get(Run, run_id) is None:
+            links = archived_records(
+                self._archive_dir(archive_dir),
+                "cached_run",
+                filters={"run_id": run_id},
+            )
+            if links:
+                run_id = links[-1]["source_run_id"]
+        return run_id, session.get(Run, run_id) is not None
 
     def create_run(
         self,
@@ -21,6 +252,7 @@ class DatabaseService:
         rows_processed: Optional[int] = None,
         status: str = "completed",
         error_message: Optional[str] = None,
+        duration: Optional[float] = None,
     ) -> Run:
         """Create a new run record in the database."""
         with Session(self.engine) as session:
@@ -30,8 +262,51 @@ class DatabaseService:
                 rows_processed=rows_processed,
                 status=status,
                 error_message=error_message,
+                duration=duration,
+            )
+            session.add(run)
+            session.commit()
+            session.refresh(run)
+            return run
+
+    def record_run(
+        self,
+        csv_file: str,
+        output_format: str,
+        kpis: Iterable[dict[str, Any]],
+        payload: dict[str, Any],
+        state: dict[str, Any],
+        rows_processed: Optional[int] = None,
+        duration: Optional[float] = None,
+    ) -> Run:
+        """Create a completed run with its KPIs, payload and state at once.
+
+        Everything is written in one transaction, so a failure leaves no
+        completed run with only part of its KPIs behind.
+        """
+        with Session(self.engine) as session:
+            run = Run(
+                csv_file=csv_file,
+                output_format=output_format,
+                rows_processed=rows_processed,
+                status="completed",
+                duration=duration,
             )
             session.add(run)
+            # Assigns the run ID the other records refer to
+            session.flush()
+            rows = kpi_rows(run.id, kpis)
+            if rows:
+                session.execute(insert(Kpi), rows)
+                self._update_rollups(session, rows)
+            session.merge(
+                KpiPayload(
+                    run_id=run.id,
+                    version=KPI_PAYLOAD_VERSION,
+                    payload=pack_kpi_payload(payload),
+                ),
+            )
+            session.merge(KpiState(run_id=run.id, state=pack_kpi_state(state)))
             session.commit()
             session.refresh(run)
             return run
@@ -54,30 +329,430 @@ class DatabaseService:
                 description=description,
             )
             session.add(kpi)
+            self._update_rollups(session, [kpi.model_dump()])
             session.commit()
             session.refresh(kpi)
             return kpi
 
+    def add_kpis(self, run_id: int, kpis: Iterable[dict[str, Any]]) -> int:
+        """Add many KPI records linked to a run in one transaction.
+
+        Args:
+            run_id: Run the KPIs belong to
+            kpis: Mappings with name, value and optionally unit and
+                description (e.g. from ``kpi_records``)
+
+        Returns:
+            Number of KPIs inserted
+
+        """
+        rows = kpi_rows(run_id, kpis)
+        if not rows:
+            return 0
+        with Session(self.engine) as session:
+            # A list of parameter sets runs as a single executemany
+            session.execute(insert(Kpi), rows)
+            self._update_rollups(session, rows)
+            session.commit()
+        return len(rows)
+
+    def _update_rollups(self, session: Session, kpis: list[dict[str, Any]]) -> None:
+        """Fold inserted KPIs into ``kpi_rollup`` within the same transaction."""
+        rows = rollup_rows(kpis)
+        if rows:
+            session.execute(rollup_upsert_statement(self.engine.dialect.name), rows)
+
+    def get_kpi_history(
+        self,
+        name: str,
+        granularity: str = "day",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list[dict[str, Any]]:
+        """Get the downsampled history of a KPI from its rollups.
+
+        Args:
+            name: KPI name, e.g. ``avg_market_cap``
+            granularity: Bucket size: hour, day or week
+            since: Start of the range (its bucket is included)
+            until: End of the range (exclusive)
+
+        Returns:
+            One dictionary per bucket in time order with bucket (ISO start),
+            count, min, max, avg and last
+
+        Raises:
+            ValueError: If ``granularity`` is unknown
+
+        """
+        statement = history_statement(name, granularity, since, until)
+        with Session(self.engine) as session:
+            return [history_point(rollup) for rollup in session.exec(statement)]
+
+    def get_run_history(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        archive_dir: Optional[Path] = None,
+    ) -> pd.DataFrame:
+        """Get the runs in ``[since, until)``, archived ones included.
+
+        Args:
+            since: Earliest run timestamp to include
+            until: Run timestamp to stop before
+            archive_dir: Archive root (default: ``retention.default_archive_dir``)
+
+        Returns:
+            One row per run with the ``run`` columns, oldest first
+
+        """
+        return read_history(self.engine, "run", since, until, directory=archive_dir)
+
+    def get_kpi_values(
+        self,
+        name: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        archive_dir: Optional[Path] = None,
+    ) -> pd.DataFrame:
+        """Get every recorded value of a KPI, archived runs included.
+
+        Unlike ``get_kpi_history`` this reads the individual values; arguments
+        are those of ``get_run_history``, applied to ``calculated_at``.
+
+        Returns:
+            One row per value with the ``kpi`` columns, oldest first
+
+        """
+        return read_history(
+            self.engine,
+            "kpi",
+            since,
+            until,
+            filters={"name": name},
+            directory=archive_dir,
+        )
+
+    def archive_runs(
+        self,
+        older_than: timedelta,
+        archive_dir: Optional[Path] = None,
+        batch_size: int = DEFAULT_ARCHIVE_BATCH_SIZE,
+    ) -> dict[str, int]:
+        """Move runs older than ``older_than`` to Parquet; see ``retention``.
+
+        Returns:
+            Numbers of archived runs and KPIs and of written files
+
+        """
+        cutoff = utcnow() - older_than
+        return archive_runs(self.engine, cutoff, archive_dir, batch_size)
+
     def get_all_runs(self) -> list[Run]:
         """Get all runs from the database."""
         with Session(self.engine) as session:
             statement = select(Run).order_by(Run.timestamp.desc())
             return session.exec(statement).all()
 
-    def get_run_by_id(self, run_id: int) -> Optional[Run]:
-        """Get a specific run by ID."""
+    def get_run_by_id(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> Optional[Run]:
+        """Get a specific run by ID, from the archive if it was archived.
+
+        ``archive_dir`` defaults to ``retention.default_archive_dir``, as in
+        every lookup below.
+        """
         with Session(self.engine) as session:
             statement = select(Run).where(Run.id == run_id)
-            return session.exec(statement).first()
+            run = session.exec(statement).first()
+        if run is None:
+            records = archived_records(
+                self._archive_dir(archive_dir),
+                "run",
+                filters={"id": run_id},
+            )
+            run = Run(**records[-1]) if records else None
+        return run
 
-    def get_kpis_for_run(self, run_id: int) -> list[Kpi]:
-        """Get all KPIs for a specific run."""
+    def get_kpis_for_run(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> list[Kpi]:
+        """Get all KPIs for a specific run, archived runs included.
+
+        Runs served from the result cache return the KPIs of their source run.
+        """
         with Session(self.engine) as session:
-            statement = select(Kpi).where(Kpi.run_id == run_id)
-            return session.exec(statement).all()
+            run_id, live = self._source_run(session, run_id, archive_dir)
+            if live:
+                statement = select(Kpi).where(Kpi.run_id == run_id)
+                return session.exec(statement).all()
+        records = archived_records(
+            self._archive_dir(archive_dir),
+            "kpi",
+            filters={"run_id": run_id},
+        )
+        return [Kpi(**record) for record in records]
 
     def get_recent_runs(self, limit: int = 10) -> list[Run]:
         """Get the most recent runs."""
         with Session(self.engine) as session:
             statement = select(Run).order_by(Run.timestamp.desc()).limit(limit)
             return session.exec(statement).all()
+
+    def get_recent_average_duration(self, limit: int = 5) -> Optional[float]:
+        """Average duration in seconds of the most recent runs that have one."""
+        recent = (
+            select(Run.duration).order_by(Run.timestamp.desc()).limit(limit).subquery()
+        )
+        with Session(self.engine) as session:
+            return session.exec(select(func.avg(recent.c.duration))).one()
+
+    def get_run_stats(
+        self,
+        group_by: str = "output_format",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> list[dict[str, Any]]:
+        """Get duration, throughput and failure statistics of runs per group.
+
+        Aggregated in SQL (see ``csv_report.run_stats``).
+
+        Args:
+            group_by: Group runs by ``output_format`` or ``csv_file``
+            since: Start of the window (default: 7 days before ``until``)
+            until: End of the window, exclusive (default: now)
+
+        Returns:
+            One dictionary per group, most runs first, with key, runs,
+            failed, failure_rate, completed, avg_duration, p50_duration,
+            p90_duration, p99_duration, rows_processed and rows_per_second
+
+        Raises:
+            ValueError: If ``group_by`` is unknown
+
+        """
+        statement = stats_statement(group_by, *stats_window(since, until))
+        with Session(self.engine) as session:
+            return [stats_row(row) for row in session.exec(statement)]
+
+    def list_runs(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        output_format: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        archive_dir: Optional[Path] = None,
+    ) -> tuple[list[Run], Optional[str]]:
+        """Get one page of runs, newest first, with keyset pagination.
+
+        Archived runs are listed too (see ``retention.archived_runs_page``).
+
+        Args:
+            limit: Runs per page (at most ``pagination.MAX_PAGE_SIZE``)
+            cursor: ``next_cursor`` of the previous page
+            status: Only runs with this status
+            output_format: Only runs with this output format
+            since: Only runs at or after this time
+            until: Only runs before this time
+            archive_dir: Archive root (default: ``retention.default_archive_dir``)
+
+        Returns:
+            The runs of the page and the cursor of the next page (None on the
+            last page)
+
+        Raises:
+            InvalidCursorError: If ``cursor`` cannot be decoded
+
+        """
+        statement = runs_page_statement(
+            limit,
+            cursor,
+            status,
+            output_format,
+            since,
+            until,
+        )
+        with Session(self.engine) as session:
+            runs = session.exec(statement).all()
+        runs = archived_runs_page(
+            self._archive_dir(archive_dir),
+            runs,
+            limit,
+            cursor,
+            status,
+            output_format,
+            since,
+            until,
+        )
+        return split_page(runs, limit)
+
+    def get_kpis_for_runs(
+        self,
+        run_ids: list[int],
+        archive_dir: Optional[Path] = None,
+    ) -> dict[int, list[Kpi]]:
+        """Get the KPIs of many runs with a fixed number of queries.
+
+        Runs served from the result cache get the KPIs of their source run;
+        the KPIs of archived runs are read from the archive.
+        """
+        if not run_ids:
+            return {}
+        directory = self._archive_dir(archive_dir)
+        with Session(self.engine) as session:
+            sources = list(session.exec(cached_sources_statement(run_ids)).all())
+            live = set(session.exec(select(Run.id).where(Run.id.in_(run_ids))))
+            archived = [run_id for run_id in run_ids if run_id not in live]
+            if archived:
+                links = archived_records(
+                    directory,
+                    "cached_run",
+                    filters={"run_id": archived},
+                )
+                sources += [CachedRun(**link) for link in links]
+            ids = set(run_ids) | {cached.source_run_id for cached in sources}
+            kpis = list(session.exec(kpis_statement(sorted(ids))).all())
+            live = set(session.exec(select(Run.id).where(Run.id.in_(ids))))
+        if ids - live:
+            records = archived_records(
+                directory,
+                "kpi",
+                filters={"run_id": sorted(ids - live)},
+            )
+            kpis += [Kpi(**record) for record in records]
+        return group_kpis(run_ids, sources, kpis)
+
+    def save_kpi_state(self, run_id: int, state: dict[str, Any]) -> None:
+        """Store the mergeable KPI aggregate state of a run."""
+        with Session(self.engine) as session:
+            session.merge(KpiState(run_id=run_id, state=pack_kpi_state(state)))
+            session.commit()
+
+    def get_kpi_state(self, run_id: int) -> Optional[dict[str, Any]]:
+        """Get the KPI aggregate state of a run, if one was stored."""
+        with Session(self.engine) as session:
+            record = session.get(KpiState, run_id)
+            if record is None:
+                return None
+            return json.loads(zlib.decompress(record.state))
+
+    def save_kpi_payload(self, run_id: int, payload: dict[str, Any]) -> None:
+        """Store the full KPI structure of a run (see ``report_payload``)."""
+        record = KpiPayload(
+            run_id=run_id,
+            version=KPI_PAYLOAD_VERSION,
+            payload=pack_kpi_payload(payload),
+        )
+        with Session(self.engine) as session:
+            session.merge(record)
+            session.commit()
+
+    def get_kpi_payload(
+        self,
+        run_id: int,
+        archive_dir: Optional[Path] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Get the full KPI structure of a run, if one was stored.
+
+        Runs served from the result cache return the payload of their source
+        run; payloads of archived runs are read from the archive.
+
+        Raises:
+            ValueError: If the payload layout is no longer supported
+
+        """
+        with Session(self.engine) as session:
+            run_id, live = self._source_run(session, run_id, archive_dir)
+            if live:
+                record = session.get(KpiPayload, run_id)
+                return None if record is None else unpack_kpi_payload(record)
+        records = archived_records(
+            self._archive_dir(archive_dir),
+            "kpi_payload",
+            filters={"run_id": run_id},
+        )
+        return unpack_kpi_payload(KpiPayload(**records[-1])) if records else None
+
+    def get_cached_result(
+        self,
+        key: str,
+        ttl: timedelta,
+    ) -> Optional[ResultCache]:
+        """Get an unexpired result cache entry and mark it as used."""
+        with Session(self.engine) as session:
+            entry = session.get(ResultCache, key)
+            if entry is None:
+                return None
+            if entry.created_at < utcnow() - ttl:
+                session.delete(entry)
+                session.commit()
+                return None
+            entry.last_used_at = utcnow()
+            entry.hits += 1
+            session.add(entry)
+            session.commit()
+            session.refresh(entry)
+            return entry
+
+    def save_cached_result(
+        self,
+        key: str,
+        run_id: int,
+        output_format: str,
+        report_path: str,
+        report_digest: str,
+    ) -> None:
+        """Store (or replace) the result cache entry for ``key``."""
+        with Session(self.engine) as session:
+            session.merge(
+                ResultCache(
+                    key=key,
+                    run_id=run_id,
+                    output_format=output_format,
+                    report_path=report_path,
+                    report_digest=report_digest,
+                ),
+            )
+            session.commit()
+
+    def delete_cached_result(self, key: str) -> None:
+        """Drop a result cache entry, e.g. when its report file is gone."""
+        with Session(self.engine) as session:
+            session.execute(delete(ResultCache).where(ResultCache.key == key))
+            session.commit()
+
+    def evict_result_cache(self, ttl: timedelta, max_entries: int) -> int:
+        """Drop expired entries and all but the ``max_entries`` most recently used.
+
+        Returns:
+            Number of entries removed
+
+        """
+        with Session(self.engine) as session:
+            expired = session.execute(
+                delete(ResultCache).where(
+                    ResultCache.created_at < utcnow() - ttl,
+                ),
+            ).rowcount
+            keep = (
+                select(ResultCache.key)
+                .order_by(ResultCache.last_used_at.desc())
+                .limit(max_entries)
+            )
+            overflow = session.execute(
+                delete(ResultCache).where(ResultCache.key.not_in(keep)),
+            ).rowcount
+            session.commit()
+            return expired + overflow
+
+    def record_cached_run(self, run_id: int, source_run_id: int) -> None:
+        """Link a run served from the result cache to its source run."""
+        with Session(self.engine) as session:
+            session.add(CachedRun(run_id=run_id, source_run_id=source_run_id))
+            session.commit()
@@ -1,10 +1,42 @@
 """Database initialization script for CSV report application."""
 
+import atexit
+import os
+import threading
 from pathlib import Path
+from typing import Optional
 
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
 
-from .models import Kpi, Run
+from .models import Kpi, KpiRollup, Run
+from .rollups import backfill_rollups
+
+# Connection pool settings of the shared engines
+DB_POOL_SIZE = int(os.getenv("CSV_REPORT_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("CSV_REPORT_DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("CSV_REPORT_DB_POOL_PRE_PING", "1") != "0"
+
+# Connection profile of SQLite databases. run.db is written by the CLI, the
+# API and the Django app at once: WAL lets readers and one writer proceed
+# concurrently and busy_timeout makes writers wait instead of failing.
+SQLITE_PRAGMAS = {
+    # Only takes effect before the first table is created; lets
+    # ``retention.vacuum`` release pages freed by archival incrementally
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,  # KiB, i.e. 64 MiB
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": int(os.getenv("CSV_REPORT_DB_BUSY_TIMEOUT", "30000")),  # ms
+}
+
+# Database URL -> process-wide engine, created on first use
+_engines: dict[str, Engine] = {}
+_async_engines: dict[str, AsyncEngine] = {}
+_engines_lock = threading.Lock()
 
 
 def get_database_url() -> str:
@@ -17,20 +49,146 @@ def get_database_url() -> str:
     return f"sqlite:///{db_path}"
 
 
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    """Apply ``SQLITE_PRAGMAS`` to every new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _schema_is_current(connection) -> bool:
+    """Whether every table and index declared on the models exists."""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in tables:
+            return False
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        if any(index.name not in indexes for index in table.indexes):
+            return False
+    return True
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Apply the SQLite connection profile and bring the schema up to date.
+
+    Missing tables are created, and indexes declared on the models are added
+    to existing tables; both steps are idempotent.
+    """
+    is_sqlite = engine.dialect.name == "sqlite"
+    if is_sqlite:
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    with engine.connect() as connection:
+        if _schema_is_current(connection):
+            return engine
+        if is_sqlite:
+            # Take the write lock first so processes starting together do
+            # not race between checking for and creating a table
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        had_rollups = inspect(connection).has_table(KpiRollup.__tablename__)
+        SQLModel.metadata.create_all(connection)
+        if not had_rollups:
+            # Databases from before the rollups: fold the existing KPIs in
+            backfill_rollups(connection)
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        connection.commit()
+    return engine
+
+
+def get_engine(database_url: Optional[str] = None) -> Engine:
+    """Return the shared engine of ``database_url`` (default: ``run.db``).
+
+    Engines and their connection pools are created once per process and
+    reused by every ``DatabaseService``; the database is brought up to date
+    by ``configure_engine`` when the engine is first built.
+    """
+    url = database_url or get_database_url()
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            options = {"echo": False, "pool_pre_ping": DB_POOL_PRE_PING}
+            if ":memory:" not in url:
+                options["pool_size"] = DB_POOL_SIZE
+                options["max_overflow"] = DB_MAX_OVERFLOW
+            if url.startswith("sqlite"):
+                # Pooled connections are handed to whichever thread needs one
+                options["connect_args"] = {"check_same_thread": False}
+            engine = configure_engine(create_engine(url, **options))
+            _engines[url] = engine
+    return engine
+
+
+def get_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """Return the shared asyncio engine of ``database_url`` (default: ``run.db``).
+
+    SQLite URLs are served through the ``aiosqlite`` driver with the same
+    connection profile as ``get_engine``; the schema is brought up to date
+    through the synchronous engine first.
+    """
+    url = database_url or get_database_url()
+    engine = _async_engines.get(url)
+    if engine is not None:
+        return engine
+    get_engine(url)
+    with _engines_lock:
+        engine = _async_engines.get(url)
+        if engine is None:
+            async_url = make_url(url)
+            if async_url.drivername == "sqlite":
+                async_url = async_url.set(drivername="sqlite+aiosqlite")
+            options = {"echo": False, "pool_pre_ping": DB_POOL_PRE_PING}
+            if ":memory:" not in url:
+                options["pool_size"] = DB_POOL_SIZE
+                options["max_overflow"] = DB_MAX_OVERFLOW
+            engine = create_async_engine(async_url, **options)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+            _async_engines[url] = engine
+    return engine
+
+
+async def dispose_async_engines() -> None:
+    """Close the pooled connections of every shared asyncio engine."""
+    with _engines_lock:
+        engines = list(_async_engines.values())
+        _async_engines.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+def dispose_engines() -> None:
+    """Close the pooled connections of every shared engine."""
+    with _engines_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+# Return pooled connections cleanly when the process exits
+atexit.register(dispose_engines)
+
+
 def create_database():
-    """Create the database and all tables."""
+    """Create the database and all tables with the tuned connection profile."""
     database_url = get_database_url()
     engine = create_engine(database_url, echo=True)
 
-    # Create all tables
-    SQLModel.metadata.create_all(engine)
-
-    return engine
+    # Create all tables and indexes, switch SQLite to WAL
+    return configure_engine(engine)
 
 
 def test_database_connection() -> None:
     """Test the database connection and create a sample record."""
-    engine = create_engine(get_database_url())
+    engine = get_engine()
 
     with Session(engine) as session:
         # Create a test run
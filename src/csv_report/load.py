@@ -3,15 +3,25 @@
 
 This module provides functions to load S&P 500 companies data from either
 a local CSV file or a remote URL.
+
+Only the columns declared in ``INPUT_SCHEMA`` are parsed, with their declared
+dtypes, so wide vendor files cost little more than the four KPI columns.
 """
 
 from __future__ import annotations
 
+import json
 from io import StringIO
 from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Union
 
 import pandas as pd
 
+from .csv_cache import PYARROW_AVAILABLE, get_default_cache
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
 # Optional import for URL functionality
 try:
     import requests
@@ -20,18 +30,166 @@ try:
 except ImportError:
     REQUESTS_AVAILABLE = False
 
-__all__ = ["load_csv"]
+__all__ = [
+    "DEFAULT_CHUNKSIZE",
+    "INPUT_SCHEMA",
+    "CsvSchemaError",
+    "iter_csv_chunks",
+    "load_csv",
+    "read_csv",
+]
+
+# Rows per chunk when streaming a CSV file
+DEFAULT_CHUNKSIZE = 100_000
+
+# Columns the KPI layer reads and the dtype each one is parsed as
+INPUT_SCHEMA: dict[str, str] = {
+    "Symbol": "object",
+    "Shortname": "object",
+    "Marketcap": "float64",
+    "Sector": "category",
+}
+
+CsvSource = Union[str, Path, IO[Any]]
+
+
+class CsvSchemaError(ValueError):
+    """Raised when a CSV file lacks schema columns or has malformed rows."""
+
+
+def _source_name(source: CsvSource) -> str:
+    return str(source) if isinstance(source, (str, Path)) else "input"
+
+
+def _check_columns(
+    columns: Iterable[str],
+    schema: dict[str, str],
+    source: CsvSource,
+) -> None:
+    """Raise ``CsvSchemaError`` if a schema column is missing."""
+    missing = [column for column in schema if column not in set(columns)]
+    if missing:
+        msg = (
+            f"CSV {_source_name(source)} is missing required columns: "
+            f"{', '.join(missing)}"
+        )
+        raise CsvSchemaError(msg)
+
+
+def _peek_columns(source: CsvSource) -> list[str] | None:
+    """Header of a path or seekable buffer, or None for one-shot streams."""
+    if isinstance(source, (str, Path)):
+        return pd.read_csv(source, nrows=0).columns.tolist()
+    if source.seekable():
+        position = source.tell()
+        columns = pd.read_csv(source, nrows=0).columns.tolist()
+        source.seek(position)
+        return columns
+    return None
+
+
+def _schema_options(
+    source: CsvSource,
+    schema: dict[str, str] | None,
+) -> dict[str, Any]:
+    """``pd.read_csv`` options projecting and typing the schema columns."""
+    if schema is None:
+        return {}
+    try:
+        columns = _peek_columns(source)
+    except (ValueError, pd.errors.ParserError) as e:
+        msg = f"Malformed CSV {_source_name(source)}: {e}"
+        raise CsvSchemaError(msg) from e
+    if columns is None:
+        # Checked on the parsed frame instead
+        return {"usecols": lambda column: column in schema, "dtype": schema}
+    _check_columns(columns, schema, source)
+    return {"usecols": list(schema), "dtype": schema}
+
+
+def read_csv(
+    source: CsvSource,
+    schema: dict[str, str] | None = INPUT_SCHEMA,
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """Parse a CSV file or buffer according to ``schema``.
+
+    Args:
+        source: Path or file-like object with CSV text
+        schema: Columns to load mapped to their dtype; None parses every
+            column with inferred dtypes
+        engine: ``pd.read_csv`` engine; defaults to ``pyarrow`` when it is
+            installed (which also rejects rows with a wrong number of
+            fields), else ``c``
+
+    Returns:
+        DataFrame with the schema columns in schema order
+
+    Raises:
+        FileNotFoundError: If a local file is not found
+        CsvSchemaError: If columns are missing or a row cannot be parsed
+
+    """
+    options = _schema_options(source, schema)
+    if engine is None:
+        engine = "pyarrow" if PYARROW_AVAILABLE and "usecols" in options else "c"
+    if callable(options.get("usecols")):
+        engine = "c"
+    try:
+        df = pd.read_csv(source, engine=engine, **options)
+    except (ValueError, pd.errors.ParserError) as e:
+        msg = f"Malformed CSV {_source_name(source)}: {e}"
+        raise CsvSchemaError(msg) from e
+    if schema is None:
+        return df
+    _check_columns(df.columns, schema, source)
+    return df[list(schema)]
+
+
+def _read_local_csv(
+    csv_file: str | Path,
+    schema: dict[str, str] | None,
+    *,
+    use_cache: bool,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """Parse a local CSV file, through the columnar cache when enabled."""
+
+    def parse(path: str | Path) -> pd.DataFrame:
+        if workers > 1:
+            from .parallel import parallel_read_csv
+
+            return parallel_read_csv(path, workers, schema)
+        return read_csv(path, schema)
+
+    cache = get_default_cache() if use_cache else None
+    if cache is None:
+        return parse(csv_file)
+    variant = json.dumps(schema) if schema is not None else ""
+    return cache.load(csv_file, parse, variant)
 
 
 def load_csv(
     csv_file: str | Path | None = None,
     url: str | None = None,
+    *,
+    use_cache: bool = True,
+    schema: dict[str, str] | None = INPUT_SCHEMA,
+    workers: int = 1,
 ) -> pd.DataFrame:
     """Load S&P 500 companies data from CSV file or URL.
 
+    Local files are parsed once and then served from the columnar cache in
+    ``csv_report.csv_cache`` while they are unchanged (requires pyarrow).
+
     Args:
         csv_file: Path to local CSV file (optional)
         url: URL to remote CSV file (optional)
+        use_cache: Whether local files may be served from the cache
+        schema: Columns to load and their dtypes (default ``INPUT_SCHEMA``);
+            None loads every column
+        workers: Processes parsing a local file in parallel (see
+            ``csv_report.parallel``)
 
     Returns:
         DataFrame containing S&P 500 companies data
@@ -39,11 +197,17 @@ def load_csv(
     Raises:
         FileNotFoundError: If local file not found
         requests.RequestException: If URL request fails
+        CsvSchemaError: If columns are missing or a row cannot be parsed
         ValueError: If neither file nor URL provided
 
     """
     if csv_file is not None:
-        return pd.read_csv(csv_file)
+        return _read_local_csv(
+            csv_file,
+            schema,
+            use_cache=use_cache,
+            workers=workers,
+        )
     if url is not None:
         if not REQUESTS_AVAILABLE:
             msg = (
@@ -55,10 +219,90 @@ def load_csv(
             )
         response = requests.get(url, timeout=30)
         response.raise_for_status()
-        return pd.read_csv(StringIO(response.text))
+        return read_csv(StringIO(response.text), schema)
     # Try to load from default location
     default_file = Path("data/sp500.csv")
     if default_file.exists():
-        return pd.read_csv(default_file)
+        return _read_local_csv(
+            default_file,
+            schema,
+            use_cache=use_cache,
+            workers=workers,
+        )
     msg = "No CSV file or URL provided, and default file not found"
     raise ValueError(msg)
+
+
+def _read_chunks(
+    source: CsvSource,
+    schema: dict[str, str] | None,
+    chunksize: int,
+) -> Iterator[pd.DataFrame]:
+    """Parse ``source`` in chunks according to ``schema`` (C engine)."""
+    options = _schema_options(source, schema)
+    try:
+        with pd.read_csv(source, chunksize=chunksize, **options) as reader:
+            for chunk in reader:
+                if schema is None:
+                    yield chunk
+                else:
+                    _check_columns(chunk.columns, schema, source)
+                    yield chunk[list(schema)]
+    except (ValueError, pd.errors.ParserError) as e:
+        if isinstance(e, CsvSchemaError):
+            raise
+        msg = f"Malformed CSV {_source_name(source)}: {e}"
+        raise CsvSchemaError(msg) from e
+
+
+def iter_csv_chunks(
+    csv_file: str | Path | None = None,
+    url: str | None = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    schema: dict[str, str] | None = INPUT_SCHEMA,
+) -> Iterator[pd.DataFrame]:
+    """Read S&P 500 companies data in chunks of at most ``chunksize`` rows.
+
+    Only one chunk is held in memory at a time, so files larger than RAM can
+    be processed (see ``kpi_service.streaming``).
+
+    Args:
+        csv_file: Path to local CSV file (optional)
+        url: URL to remote CSV file (optional)
+        chunksize: Number of rows per chunk
+        schema: Columns to load and their dtypes (default ``INPUT_SCHEMA``);
+            None loads every column
+
+    Yields:
+        DataFrame chunks in file order
+
+    Raises:
+        FileNotFoundError: If local file not found
+        requests.RequestException: If URL request fails
+        CsvSchemaError: If columns are missing or a row cannot be parsed
+        ValueError: If neither file nor URL provided, or chunksize < 1
+
+    """
+    if chunksize < 1:
+        msg = "chunksize must be a positive number of rows"
+        raise ValueError(msg)
+    if csv_file is None and url is not None:
+        if not REQUESTS_AVAILABLE:
+            msg = (
+                "requests library is required for URL loading. "
+                "Install with: pip install requests"
+            )
+            raise ImportError(
+                msg,
+            )
+        with requests.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from _read_chunks(response.raw, schema, chunksize)
+        return
+    if csv_file is None:
+        csv_file = Path("data/sp500.csv")
+        if not csv_file.exists():
+            msg = "No CSV file or URL provided, and default file not found"
+            raise ValueError(msg)
+    yield from _read_chunks(csv_file, schema, chunksize)
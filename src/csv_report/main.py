@@ -1,7 +1,13 @@
 """Main module for the CSV report generator using Typer CLI."""
 
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 import typer
 from rich.console import Console
@@ -9,16 +15,172 @@ from rich.panel import Panel
 from rich.table import Table
 from sqlalchemy import text
 
-from .database import DatabaseService
-from .load import load_csv
+from .batch import DEFAULT_PATTERN, resolve_csv_files, run_batch, split_source
+from .database import DatabaseService, kpi_records
+from .load import DEFAULT_CHUNKSIZE, iter_csv_chunks, load_csv
 from .logging_config import LoggedOperation, setup_cli_logging
-from .report.generate import generate_report, save_report
+from .models import Run
+from .parallel import parallel_aggregate_csv
+from .recorder import RunRecorder
+from .report.generate import render_report, report_payload, save_report
+from .result_cache import (
+    DEFAULT_RESULT_MAX_ENTRIES,
+    DEFAULT_RESULT_TTL,
+    report_digest,
+    result_cache_key,
+)
+from .retention import DEFAULT_ARCHIVE_BATCH_SIZE, default_archive_dir, parse_age
+from .retention import vacuum as vacuum_database
 
 # Initialize Typer app and console
 app = typer.Typer(help="Generate reports from CSV files with database tracking")
 console = Console()
 
 
+def _output_path(output_format: str, output_file: Optional[str]) -> Path:
+    """Report path from ``--output`` or the default for the format."""
+    if output_file:
+        return Path(output_file)
+    return Path(f"reports/sp500_analysis.{output_format.lower()}")
+
+
+def _result_cache_key(
+    csv_file: Optional[str],
+    output_format: str,
+    *,
+    stream: bool,
+    chunksize: int,
+    workers: int,
+) -> Optional[str]:
+    """Result cache key of a local input, or None if it cannot be hashed."""
+    input_path = Path(csv_file) if csv_file else Path("data/sp500.csv")
+    try:
+        return result_cache_key(
+            input_path,
+            output_format.lower(),
+            stream=stream,
+            chunksize=chunksize,
+            workers=workers,
+        )
+    except OSError:
+        return None
+
+
+def _reuse_cached_result(
+    db_service: DatabaseService,
+    cache_key: str,
+    csv_file: Optional[str],
+    output_format: str,
+    output_file: Optional[str],
+    start_time: float,
+    logger: logging.Logger,
+) -> bool:
+    """Serve a generate run from the result cache.
+
+    Returns:
+        False on a miss, or if the cached report file was changed or removed
+
+    """
+    entry = db_service.get_cached_result(cache_key, DEFAULT_RESULT_TTL)
+    if entry is None:
+        return False
+    cached_report = Path(entry.report_path)
+    if report_digest(cached_report) != entry.report_digest:
+        logger.info("Cached report %s changed or is missing", cached_report)
+        db_service.delete_cached_result(cache_key)
+        return False
+
+    output_path = _output_path(output_format, output_file)
+    if output_path.resolve() != cached_report.resolve():
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached_report, output_path)
+
+    source_run = db_service.get_run_by_id(entry.run_id)
+    duration = time.time() - start_time
+    run = db_service.create_run(
+        csv_file=csv_file or "default",
+        output_format=output_format.lower(),
+        rows_processed=source_run.rows_processed if source_run else None,
+        status="cached",
+        duration=duration,
+    )
+    db_service.record_cached_run(run.id, entry.run_id)
+    logger.info(
+        "Report served from the result cache",
+        extra={
+            "run_id": run.id,
+            "source_run_id": entry.run_id,
+            "output_file": str(output_path),
+            "duration": duration,
+        },
+    )
+    console.print(f"♻️ Inputs unchanged since run {entry.run_id}; reused its results")
+    console.print(f"✅ Report saved to: {output_path}")
+    console.print(f"📊 Cached run recorded in database with ID: {run.id}")
+    return True
+
+
+def _write_report(
+    report: str,
+    output_format: str,
+    output_file: Optional[str],
+    logger: logging.Logger,
+) -> Path:
+    """Save a rendered report to ``output_file`` or the default location."""
+    output_path = _output_path(output_format, output_file)
+
+    # Ensure reports directory exists
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Save report
+    logger.debug("Saving report to: %s", output_path)
+    final_path = save_report(report, output_path)
+    logger.info("Report saved successfully: %s", final_path)
+    return final_path
+
+
+def _complete_run(db_service: DatabaseService, run: Run, start_time: float) -> float:
+    """Mark a run as completed and store its duration in seconds."""
+    run.status = "completed"
+    # Calculate and store duration
+    duration = time.time() - start_time
+    run.duration = duration
+    with db_service.engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE run SET status = 'completed', "
+                "duration = :duration WHERE id = :id",
+            ),
+            {"id": run.id, "duration": duration},
+        )
+    return duration
+
+
+def _fail_run(db_service: DatabaseService, run: Run, error: Exception) -> None:
+    """Mark a run as failed and store the error message."""
+    run.status = "failed"
+    run.error_message = str(error)
+    with db_service.engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE run SET status = 'failed', "
+                "error_message = :error WHERE id = :id",
+            ),
+            {"error": str(error), "id": run.id},
+        )
+
+
+def _save_kpis(
+    db_service: DatabaseService,
+    run_id: int,
+    all_kpis: dict[str, Any],
+    logger: logging.Logger,
+) -> None:
+    """Store the KPIs of ``compute_all_kpis`` for a run in one transaction."""
+    count = db_service.add_kpis(run_id, kpi_records(all_kpis))
+    logger.debug("Saved %d KPIs to database", count)
+
+
 @app.command()
 def generate(
     csv_file: Optional[str] = typer.Option(
@@ -39,6 +201,35 @@ def generate(
         "--output",
         help="Output file path (default: reports/sp500_analysis.{format})",
     ),
+    *,
+    stream: bool = typer.Option(
+        False,
+        "--stream",
+        help="Aggregate the CSV chunk by chunk instead of loading it into memory",
+    ),
+    chunksize: int = typer.Option(
+        DEFAULT_CHUNKSIZE,
+        "--chunksize",
+        help="Rows per chunk in --stream mode",
+        min=1,
+    ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Re-parse the CSV instead of using the columnar parse cache",
+    ),
+    force: bool = typer.Option(
+        False,
+        "--force",
+        help="Recompute even if an earlier run had the same inputs",
+    ),
+    workers: int = typer.Option(
+        1,
+        "--workers",
+        "-w",
+        help="Processes parsing (and with --stream aggregating) the CSV in parallel",
+        min=1,
+    ),
 ) -> None:
     """Generate a report from a CSV file and store the run in the database."""
     # Setup logging
@@ -49,10 +240,14 @@ def generate(
             "csv_file": csv_file,
             "output_format": output_format,
             "output_file": output_file,
+            "stream": stream,
         },
     )
 
-    import time
+    # Add kpi_service to path and import
+    sys.path.append(str(Path(__file__).parent.parent))
+    from kpi_service.kpi import compute_all_kpis
+    from kpi_service.streaming import KpiAccumulator
 
     start_time = time.time()
 
@@ -68,27 +263,98 @@ def generate(
     logger.debug("Initializing database service")
     db_service = DatabaseService()
 
+    # Reuse the KPIs and report of an earlier run on identical inputs
+    cache_key = _result_cache_key(
+        csv_file,
+        output_format,
+        stream=stream,
+        chunksize=chunksize,
+        workers=workers,
+    )
+    if cache_key is not None and not force:
+        reused = _reuse_cached_result(
+            db_service,
+            cache_key,
+            csv_file,
+            output_format,
+            output_file,
+            start_time,
+            logger,
+        )
+        if reused:
+            return
+
+    # Database writes happen behind the pipeline, in a background thread
+    recorder = RunRecorder(db_service)
     try:
-        with LoggedOperation(logger, "CSV loading"):
-            with console.status("[bold green]Loading CSV data..."):
-                df = load_csv(csv_file=csv_file)
-            logger.info(
-                "CSV loaded successfully: %d rows, %d columns",
-                len(df),
-                len(df.columns),
-            )
+        df = None
+        aggregates = None
+        if stream:
+            # Aggregate chunk by chunk; the full DataFrame is never built
+            with LoggedOperation(logger, "Streaming CSV aggregation"):
+                with console.status("[bold green]Streaming CSV data..."):
+                    if workers > 1:
+                        # Each worker folds its partitions into an accumulator
+                        accumulator = parallel_aggregate_csv(
+                            csv_file or "data/sp500.csv",
+                            workers,
+                            chunksize=chunksize,
+                        )
+                    else:
+                        accumulator = KpiAccumulator()
+                        chunks = iter_csv_chunks(
+                            csv_file=csv_file,
+                            chunksize=chunksize,
+                        )
+                        for chunk in chunks:
+                            accumulator.update(chunk)
+                    aggregates = accumulator.to_aggregates()
+                rows = aggregates["overall"]["row_count"]
+                logger.info(
+                    "CSV streamed successfully: %d rows in chunks of %d",
+                    rows,
+                    chunksize,
+                )
+        else:
+            with LoggedOperation(logger, "CSV loading"):
+                with console.status("[bold green]Loading CSV data..."):
+                    df = load_csv(
+                        csv_file=csv_file,
+                        use_cache=not no_cache,
+                        workers=workers,
+                    )
+                rows = len(df)
+                logger.info(
+                    "CSV loaded successfully: %d rows, %d columns",
+                    rows,
+                    len(df.columns),
+                )
 
-        # Create run record in database
-        logger.debug("Creating run record in database")
-        run = db_service.create_run(
+        # Queue the run record; it is written while the KPIs are computed
+        logger.debug("Queueing run record")
+        run = recorder.create_run(
             csv_file=csv_file or "default",
             output_format=output_format.lower(),
-            rows_processed=len(df),
+            rows_processed=rows,
             status="processing",
         )
-        logger.info("Run record created with ID: %d", run.id)
 
-        console.print(f"📊 Processing {len(df)} rows...")
+        console.print(f"📊 Processing {rows} rows...")
+
+        # Calculate KPIs once; the report and the database share the aggregates
+        with (
+            LoggedOperation(logger, "KPI calculation"),
+            console.status("[bold green]Calculating KPIs..."),
+        ):
+            # Compute all KPIs
+            logger.debug("Computing all KPIs")
+            if aggregates is None:
+                # Mergeable state for later ``csv-report update`` runs, and
+                # the aggregates of the report from the same pass
+                accumulator = KpiAccumulator.from_frame(df)
+                aggregates = accumulator.to_aggregates()
+            all_kpis = compute_all_kpis(aggregates=aggregates)
+            logger.info("KPIs computed successfully: %d categories", len(all_kpis))
 
         with (
             LoggedOperation(logger, "Report generation"),
@@ -98,134 +364,43 @@ def generate(
         ):
             # Generate report
             logger.debug("Generating report content")
-            report = generate_report(df, output_format=output_format.lower())
-
-            # Determine output file path
-            if output_file:
-                output_path = Path(output_file)
-            else:
-                output_path = Path(
-                    f"reports/sp500_analysis.{output_format.lower()}",
-                )
-
-            # Ensure reports directory exists
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Save report
-            logger.debug("Saving report to: %s", output_path)
-            final_path = save_report(report, output_path)
-            logger.info("Report saved successfully: %s", final_path)
-
-        # Calculate and save KPIs to database
-        with LoggedOperation(logger, "KPI calculation"):
-            with console.status("[bold green]Calculating and saving KPIs..."):
-                import sys
-
-                # Add kpi_service to path and import
-                sys.path.append(str(Path(__file__).parent.parent))
-                from kpi_service.kpi import compute_all_kpis
-
-                # Compute all KPIs
-                logger.debug("Computing all KPIs")
-                all_kpis = compute_all_kpis(df)
-                logger.info("KPIs computed successfully: %d categories", len(all_kpis))
-
-            # Save base KPIs
-            logger.debug("Saving base KPIs to database")
-            base_kpis = all_kpis["base_kpis"]
-            db_service.add_kpi(
-                run_id=run.id,
-                name="total_companies",
-                value=float(base_kpis["total_companies"]),
-                unit="companies",
-                description="Total number of companies in the dataset",
-            )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="avg_market_cap",
-                value=float(base_kpis["avg_market_cap"]),
-                unit="USD",
-                description="Average market capitalization across all companies",
-            )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="median_market_cap",
-                value=float(base_kpis["median_market_cap"]),
-                unit="USD",
-                description="Median market capitalization across all companies",
-            )
+            payload = report_payload(aggregates, all_kpis)
+            report = render_report(payload, output_format=output_format.lower())
 
-            # Save enhanced KPIs
-            enhanced_kpis = all_kpis["enhanced_kpis"]
-            market_cap_dist = enhanced_kpis["market_cap_distribution"]
+            final_path = _write_report(report, output_format, output_file, logger)
 
-            db_service.add_kpi(
-                run_id=run.id,
-                name="small_cap_count",
-                value=float(market_cap_dist["small_cap_count"]),
-                unit="companies",
-                description="Number of small cap companies (<$2B market cap)",
+        # Queue KPIs, the full KPI payload and the mergeable aggregate state;
+        # the run is marked completed after them, and not at all if one of
+        # them fails
+        recorder.add_kpis(run, kpi_records(all_kpis))
+        recorder.save_kpi_payload(run, payload)
+        recorder.save_kpi_state(run, accumulator.to_state())
+        if cache_key is not None:
+            recorder.save_cached_result(
+                cache_key,
+                run,
+                output_format.lower(),
+                str(final_path.resolve()),
+                report_digest(final_path),
             )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="mid_cap_count",
-                value=float(market_cap_dist["mid_cap_count"]),
-                unit="companies",
-                description="Number of mid cap companies ($2B-$10B market cap)",
-            )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="large_cap_count",
-                value=float(market_cap_dist["large_cap_count"]),
-                unit="companies",
-                description="Number of large cap companies ($10B-$100B market cap)",
-            )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="mega_cap_count",
-                value=float(market_cap_dist["mega_cap_count"]),
-                unit="companies",
-                description="Number of mega cap companies (>$100B market cap)",
-            )
-
-            # Save tech vs traditional sector KPIs
-            tech_vs_trad = enhanced_kpis["tech_vs_traditional"]
-            db_service.add_kpi(
-                run_id=run.id,
-                name="tech_companies",
-                value=float(tech_vs_trad["tech_companies"]),
-                unit="companies",
-                description="Number of technology sector companies",
-            )
-            db_service.add_kpi(
-                run_id=run.id,
-                name="tech_market_cap",
-                value=float(tech_vs_trad["tech_market_cap"]),
-                unit="USD",
-                description="Total market cap of technology sector companies",
-            )
-
-        # Update run status to completed
-        logger.debug("Updating run status to completed")
-        run.status = "completed"
-        # Calculate and store duration
         duration = time.time() - start_time
-        run.duration = duration
-        with db_service.engine.begin() as conn:
-            conn.execute(
-                text(
-                    "UPDATE run SET status = 'completed', "
-                    "duration = :duration WHERE id = :id",
-                ),
-                {"id": run.id, "duration": duration},
+        recorder.complete_run(run, duration)
+        if cache_key is not None:
+            recorder.evict_result_cache(
+                DEFAULT_RESULT_TTL,
+                DEFAULT_RESULT_MAX_ENTRIES,
             )
 
+        with LoggedOperation(logger, "KPI persistence"):
+            recorder.flush()
+        logger.info("Run recorded with ID: %d", run.id)
+
         logger.info(
             "Report generation completed successfully",
             extra={
                 "run_id": run.id,
                 "output_file": str(final_path),
-                "rows_processed": len(df),
+                "rows_processed": rows,
                 "duration": duration,
             },
         )
@@ -233,11 +408,9 @@ def generate(
         console.print(f"📊 Run recorded in database with ID: {run.id}")
         console.print(f"⏱️ Duration: {duration:.2f} seconds")
 
-        # Calculate and display average duration of last 5 runs
-        last_5_runs = db_service.get_recent_runs(5)
-        durations = [r.duration for r in last_5_runs if r.duration is not None]
-        if durations:
-            avg_duration = sum(durations) / len(durations)
+        # Display average duration of last 5 runs
+        avg_duration = db_service.get_recent_average_duration(5)
+        if avg_duration is not None:
             console.print(
                 f"📊 Average duration of last 5 runs: {avg_duration:.2f} seconds",
             )
@@ -249,18 +422,289 @@ def generate(
 
         # Update run status to failed
         if "run" in locals():
-            logger.debug("Updating run %d status to failed", run.id)
-            run.status = "failed"
-            run.error_message = str(e)
-            with db_service.engine.begin() as conn:
-                conn.execute(
-                    text(
-                        "UPDATE run SET status = 'failed', "
-                        "error_message = :error WHERE id = :id",
-                    ),
-                    {"error": str(e), "id": run.id},
+            logger.debug("Updating run status to failed")
+            recorder.fail_run(run, e)
+
+        console.print(f"❌ Error: {e}")
+        raise typer.Exit(1)
+    finally:
+        # Commit whatever is still queued, also on failure
+        recorder.close()
+
+
+@app.command("generate-batch")
+def generate_batch(
+    source: str = typer.Argument(
+        ...,
+        help="Directory of CSV files or a glob such as 'data/**/*.csv'",
+    ),
+    pattern: str = typer.Option(
+        DEFAULT_PATTERN,
+        "--pattern",
+        help="Glob for the files picked up when SOURCE is a directory",
+    ),
+    output_format: str = typer.Option(
+        "markdown",
+        "--output-format",
+        "-o",
+        help="Format of the output reports",
+        case_sensitive=False,
+    ),
+    output_dir: str = typer.Option(
+        "reports/batch",
+        "--output-dir",
+        help="Directory for the reports, saved as <csv path below SOURCE>.<format>",
+    ),
+    workers: int = typer.Option(
+        os.cpu_count() or 1,
+        "--workers",
+        "-w",
+        help="Number of worker processes [default: number of CPUs]",
+        show_default=False,
+        min=1,
+    ),
+    *,
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Re-parse the CSVs instead of using the columnar parse cache",
+    ),
+) -> None:
+    """Generate reports for every CSV file of a directory or glob in parallel."""
+    # Setup logging
+    logger = setup_cli_logging()
+    logger.info(
+        "Starting batch report generation",
+        extra={
+            "source": source,
+            "pattern": pattern,
+            "output_format": output_format,
+            "workers": workers,
+        },
+    )
+
+    csv_files = resolve_csv_files(source, pattern)
+    if not csv_files:
+        console.print(f"❌ No CSV files found for: {source}")
+        raise typer.Exit(1)
+    workers = min(workers, len(csv_files))
+    console.print(
+        f"📂 Processing {len(csv_files)} files with {workers} worker(s)...",
+    )
+
+    # The workers only compute; this process is the single database writer
+    db_service = DatabaseService()
+    start_time = time.time()
+    completed, failed, rows = 0, [], 0
+    try:
+        results = run_batch(
+            csv_files,
+            output_format.lower(),
+            output_dir,
+            workers,
+            root=split_source(source, pattern)[0],
+            use_cache=not no_cache,
+        )
+    except ValueError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1) from e
+    with console.status("[bold green]Generating reports...") as status:
+        for result in results:
+            if result["error"] is None:
+                try:
+                    # The run and all its records are committed together
+                    with LoggedOperation(logger, "KPI persistence"):
+                        db_service.record_run(
+                            csv_file=result["csv_file"],
+                            output_format=output_format.lower(),
+                            kpis=kpi_records(result["all_kpis"]),
+                            payload=result["payload"],
+                            state=result["state"],
+                            rows_processed=result["rows"],
+                            duration=result["duration"],
+                        )
+                except Exception as e:
+                    result["error"] = f"Saving the run failed: {e}"
+                else:
+                    completed += 1
+                    rows += result["rows"]
+            if result["error"] is not None:
+                logger.error(
+                    "Report generation failed for %s: %s",
+                    result["csv_file"],
+                    result["error"],
+                )
+                db_service.create_run(
+                    csv_file=result["csv_file"],
+                    output_format=output_format.lower(),
+                    status="failed",
+                    error_message=result["error"],
+                    duration=result["duration"],
                 )
+                failed.append(result)
+            status.update(
+                f"[bold green]Generating reports... "
+                f"{completed + len(failed)}/{len(csv_files)}",
+            )
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    logger.info(
+        "Batch report generation finished",
+        extra={
+            "files": len(csv_files),
+            "failed": len(failed),
+            "rows_processed": rows,
+            "duration": elapsed,
+        },
+    )
+    for result in failed:
+        console.print(f"❌ {result['csv_file']}: {result['error']}")
+    console.print(
+        f"✅ {completed} reports saved to: {output_dir} ({len(failed)} failed)",
+    )
+    console.print(
+        f"⏱️ {elapsed:.2f} seconds: {len(csv_files) / elapsed:.2f} files/s, "
+        f"{rows / elapsed:,.0f} rows/s",
+    )
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command()
+def update(
+    base_run: int = typer.Option(
+        ...,
+        "--base-run",
+        help="ID of the run whose saved KPI state is updated",
+    ),
+    added: Optional[str] = typer.Option(
+        None,
+        "--added",
+        help="CSV file with rows added since the base run",
+    ),
+    removed: Optional[str] = typer.Option(
+        None,
+        "--removed",
+        help="CSV file with rows removed since the base run",
+    ),
+    output_format: str = typer.Option(
+        "markdown",
+        "--output-format",
+        "-o",
+        help="Format of the output report",
+        case_sensitive=False,
+    ),
+    output_file: Optional[str] = typer.Option(
+        None,
+        "--output",
+        help="Output file path (default: reports/sp500_analysis.{format})",
+    ),
+    chunksize: int = typer.Option(
+        DEFAULT_CHUNKSIZE,
+        "--chunksize",
+        help="Rows per chunk when reading the delta files",
+        min=1,
+    ),
+) -> None:
+    """Update the KPIs of a previous run with added and removed rows."""
+    # Setup logging
+    logger = setup_cli_logging()
+    logger.info(
+        "Starting incremental KPI update",
+        extra={
+            "base_run": base_run,
+            "added": added,
+            "removed": removed,
+            "output_format": output_format,
+        },
+    )
+
+    # Add kpi_service to path and import
+    sys.path.append(str(Path(__file__).parent.parent))
+    from kpi_service.kpi import compute_all_kpis
+    from kpi_service.streaming import IncompleteStateError, KpiAccumulator
+
+    start_time = time.time()
+
+    # Initialize database service
+    logger.debug("Initializing database service")
+    db_service = DatabaseService()
+
+    state = db_service.get_kpi_state(base_run)
+    if state is None:
+        console.print(f"❌ No saved KPI state for run {base_run}")
+        raise typer.Exit(1)
+
+    try:
+        accumulator = KpiAccumulator.from_state(state)
+
+        # Removals first, so a row that was changed (removed and re-added)
+        # is never matched against its own new version
+        with (
+            LoggedOperation(logger, "Delta aggregation"),
+            console.status("[bold green]Applying delta files..."),
+        ):
+            if removed:
+                for chunk in iter_csv_chunks(csv_file=removed, chunksize=chunksize):
+                    accumulator.remove(chunk)
+            if added:
+                for chunk in iter_csv_chunks(csv_file=added, chunksize=chunksize):
+                    accumulator.update(chunk)
+            aggregates = accumulator.to_aggregates()
+        rows = accumulator.row_count
+
+        # Create run record in database
+        logger.debug("Creating run record in database")
+        run = db_service.create_run(
+            csv_file=f"update of run {base_run}",
+            output_format=output_format.lower(),
+            rows_processed=rows,
+            status="processing",
+        )
+        logger.info("Run record created with ID: %d", run.id)
+
+        with LoggedOperation(logger, "KPI calculation"):
+            all_kpis = compute_all_kpis(aggregates=aggregates)
+
+        with LoggedOperation(logger, "Report generation"):
+            payload = report_payload(aggregates, all_kpis)
+            report = render_report(payload, output_format=output_format.lower())
+            final_path = _write_report(report, output_format, output_file, logger)
+
+        with LoggedOperation(logger, "KPI persistence"):
+            _save_kpis(db_service, run.id, all_kpis, logger)
+            db_service.save_kpi_payload(run.id, payload)
+            db_service.save_kpi_state(run.id, accumulator.to_state())
+
+        duration = _complete_run(db_service, run, start_time)
+
+        logger.info(
+            "Incremental KPI update completed successfully",
+            extra={
+                "run_id": run.id,
+                "base_run": base_run,
+                "output_file": str(final_path),
+                "rows_processed": rows,
+                "duration": duration,
+            },
+        )
+        console.print(f"✅ Report updated and saved to: {final_path}")
+        console.print(
+            f"📊 Run recorded in database with ID: {run.id} (based on run {base_run})",
+        )
+        console.print(f"⏱️ Duration: {duration:.2f} seconds")
 
+    except IncompleteStateError as e:
+        logger.warning("Incremental update not possible: %s", e)
+        if "run" in locals():
+            _fail_run(db_service, run, e)
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+    except Exception as e:
+        logger.exception("Incremental KPI update failed")
+        if "run" in locals():
+            logger.debug("Updating run %d status to failed", run.id)
+            _fail_run(db_service, run, e)
         console.print(f"❌ Error: {e}")
         raise typer.Exit(1)
 
@@ -279,6 +723,33 @@ def show_runs(
         "-r",
         help="Show details for a specific run ID",
     ),
+    cursor: Optional[str] = typer.Option(
+        None,
+        "--cursor",
+        "-c",
+        help="Continue after a previous page (printed below it; keep the filters)",
+    ),
+    status: Optional[str] = typer.Option(
+        None,
+        "--status",
+        help="Only show runs with this status",
+    ),
+    output_format: Optional[str] = typer.Option(
+        None,
+        "--output-format",
+        "-o",
+        help="Only show runs with this output format",
+    ),
+    since: Optional[datetime] = typer.Option(
+        None,
+        "--since",
+        help="Only show runs at or after this time",
+    ),
+    until: Optional[datetime] = typer.Option(
+        None,
+        "--until",
+        help="Only show runs before this time",
+    ),
 ) -> None:
     """Show recent report generation runs from the database."""
     db_service = DatabaseService()
@@ -325,8 +796,19 @@ def show_runs(
             console.print("📈 No KPIs recorded for this run")
 
     else:
-        # Show recent runs summary
-        runs = db_service.get_recent_runs(limit)
+        # Show one page of recent runs
+        try:
+            runs, next_cursor = db_service.list_runs(
+                limit,
+                cursor=cursor,
+                status=status,
+                output_format=output_format,
+                since=since,
+                until=until,
+            )
+        except ValueError as e:
+            console.print(f"❌ {e}")
+            raise typer.Exit(1)
         if not runs:
             console.print("📭 No runs found in database")
             return
@@ -361,6 +843,213 @@ def show_runs(
             )
 
         console.print(table)
+        if next_cursor:
+            console.print(f"➡️  Next page: csv-report show-runs --cursor {next_cursor}")
+
+
+@app.command("kpi-history")
+def kpi_history(
+    name: str = typer.Argument(..., help="KPI name, e.g. avg_market_cap"),
+    granularity: str = typer.Option(
+        "day",
+        "--granularity",
+        "-g",
+        help="Bucket size: hour, day or week",
+    ),
+    since: Optional[datetime] = typer.Option(
+        None,
+        "--since",
+        help="Start of the range (its bucket is included)",
+    ),
+    until: Optional[datetime] = typer.Option(
+        None,
+        "--until",
+        help="End of the range (exclusive)",
+    ),
+) -> None:
+    """Show the min/max/avg/last of a KPI per hour, day or week."""
+    db_service = DatabaseService()
+    try:
+        history = db_service.get_kpi_history(name, granularity, since, until)
+    except ValueError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+    if not history:
+        console.print(f"📭 No values recorded for KPI '{name}'")
+        return
+
+    table = Table(title=f"{name} per {granularity} ({len(history)} buckets)")
+    table.add_column("Bucket", style="green")
+    table.add_column("Count", style="magenta", justify="right")
+    for column in ("Min", "Max", "Avg", "Last"):
+        table.add_column(column, style="cyan", justify="right")
+    for point in history:
+        table.add_row(
+            point["bucket"],
+            str(point["count"]),
+            *(f"{point[key]:,.2f}" for key in ("min", "max", "avg", "last")),
+        )
+    console.print(table)
+
+
+@app.command()
+def stats(
+    group_by: str = typer.Option(
+        "output_format",
+        "--by",
+        "-b",
+        help="Group runs by output_format or csv_file",
+    ),
+    since: Optional[datetime] = typer.Option(
+        None,
+        "--since",
+        help="Start of the window [default: 7 days before --until]",
+    ),
+    until: Optional[datetime] = typer.Option(
+        None,
+        "--until",
+        help="End of the window, exclusive [default: now]",
+    ),
+) -> None:
+    """Show run duration percentiles, throughput and failure rate per group."""
+    db_service = DatabaseService()
+    try:
+        groups = db_service.get_run_stats(group_by, since, until)
+    except ValueError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+    if not groups:
+        console.print("📭 No runs in this window")
+        return
+
+    table = Table(title=f"Runs per {group_by} ({len(groups)} groups)")
+    table.add_column(group_by, style="green")
+    table.add_column("Runs", style="magenta", justify="right")
+    table.add_column("Failed", style="red", justify="right")
+    for column in ("p50 (s)", "p90 (s)", "p99 (s)", "Rows/s"):
+        table.add_column(column, style="cyan", justify="right")
+    for group in groups:
+        table.add_row(
+            group["key"],
+            str(group["runs"]),
+            f"{group['failure_rate']:.1%}",
+            *(
+                "N/A" if group[key] is None else f"{group[key]:,.2f}"
+                for key in (
+                    "p50_duration",
+                    "p90_duration",
+                    "p99_duration",
+                    "rows_per_second",
+                )
+            ),
+        )
+    console.print(table)
+
+
+@app.command()
+def render(
+    run_id: int = typer.Argument(..., help="Run whose report to render"),
+    output_format: str = typer.Option(
+        "markdown",
+        "--output-format",
+        "-o",
+        help="Format of the output report",
+        case_sensitive=False,
+    ),
+    output_file: Optional[str] = typer.Option(
+        None,
+        "--output",
+        help="Output file path (default: reports/run_{id}.{format})",
+    ),
+) -> None:
+    """Render the report of a past run from its stored KPIs, without its CSV."""
+    logger = setup_cli_logging()
+    db_service = DatabaseService()
+    run = db_service.get_run_by_id(run_id)
+    if not run:
+        console.print(f"❌ Run with ID {run_id} not found")
+        raise typer.Exit(1)
+    try:
+        payload = db_service.get_kpi_payload(run_id)
+    except ValueError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+    if payload is None:
+        console.print(
+            f"❌ Run {run_id} has no stored KPI payload; "
+            "only runs recorded since payloads were introduced can be rendered",
+        )
+        raise typer.Exit(1)
+
+    with LoggedOperation(logger, "Report rendering"):
+        report = render_report(
+            payload,
+            output_format=output_format.lower(),
+            generated_at=run.timestamp,
+        )
+        final_path = _write_report(
+            report,
+            output_format,
+            output_file or f"reports/run_{run_id}.{output_format.lower()}",
+            logger,
+        )
+    console.print(f"✅ Report of run {run_id} saved to: {final_path}")
+
+
+@app.command()
+def archive(
+    older_than: str = typer.Option(
+        "90d",
+        "--older-than",
+        help="Archive runs older than this age, e.g. 90d, 12w or 36h",
+    ),
+    archive_dir: Optional[Path] = typer.Option(
+        None,
+        "--archive-dir",
+        help="Parquet archive root (default: run_archive/ next to run.db)",
+    ),
+    batch_size: int = typer.Option(
+        DEFAULT_ARCHIVE_BATCH_SIZE,
+        "--batch-size",
+        help="Runs moved per transaction",
+    ),
+    *,
+    vacuum: bool = typer.Option(
+        True,
+        "--vacuum/--no-vacuum",
+        help="Return the freed space to the file system afterwards",
+    ),
+) -> None:
+    """Move old runs from run.db to compressed Parquet files.
+
+    Their KPIs, KPI payloads and KPI state are archived with them; their
+    result cache entries are dropped.
+    """
+    logger = setup_cli_logging()
+    try:
+        age = parse_age(older_than)
+    except ValueError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+
+    db_service = DatabaseService()
+    archive_dir = archive_dir or default_archive_dir(db_service.engine)
+    try:
+        with LoggedOperation(logger, "Run archival"):
+            summary = db_service.archive_runs(age, archive_dir, batch_size)
+    except ImportError as e:
+        console.print(f"❌ {e}")
+        raise typer.Exit(1)
+    console.print(
+        f"📦 Archived {summary['runs']:,} runs, {summary['kpis']:,} KPIs and "
+        f"{summary['payloads']:,} KPI payloads older than {older_than} into "
+        f"{summary['files']:,} files in {archive_dir}",
+    )
+
+    if vacuum and summary["runs"]:
+        with LoggedOperation(logger, "Database vacuum"):
+            freed = vacuum_database(db_service.engine)
+        console.print(f"🧹 Freed {freed / (1 << 20):,.1f} MiB of run.db")
 
 
 @app.command()
@@ -1,18 +1,25 @@
 """Database models for CSV report application using SQLModel."""
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
+def utcnow() -> datetime:
+    """Current UTC time as the naive datetime stored in run.db."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Run(SQLModel, table=True):
     """Model representing a CSV report generation run."""
 
-    __table_args__ = {"extend_existing": True}
+    # Ids of archived runs must not be handed out again (see ``retention``)
+    __table_args__ = {"extend_existing": True, "sqlite_autoincrement": True}
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow, index=True)
     csv_file: str = Field(description="Path to the CSV file that was processed")
     output_format: str = Field(description="Output format (markdown, html)")
     status: str = Field(default="completed", description="Status of the run")
@@ -44,7 +51,10 @@ class Run(SQLModel, table=True):
 class Kpi(SQLModel, table=True):
     """Model representing KPIs calculated from CSV data."""
 
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_kpi_run_id_name", "run_id", "name"),
+        {"extend_existing": True, "sqlite_autoincrement": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     run_id: int = Field(
@@ -58,7 +68,7 @@ class Kpi(SQLModel, table=True):
         default=None,
         description="Description of what this KPI measures",
     )
-    calculated_at: datetime = Field(default_factory=datetime.utcnow)
+    calculated_at: datetime = Field(default_factory=utcnow)
 
     class Config:
         schema_extra = {
@@ -70,3 +80,147 @@ class Kpi(SQLModel, table=True):
                 "description": "Total number of companies in the dataset",
             },
         }
+
+
+class KpiState(SQLModel, table=True):
+    """Model holding the mergeable KPI aggregate state of a run.
+
+    The state is the zlib-compressed JSON of ``KpiAccumulator.to_state()``;
+    ``csv-report update`` applies delta files to it instead of re-reading the
+    whole dataset.
+    """
+
+    __tablename__ = "kpi_state"
+    __table_args__ = {"extend_existing": True}
+
+    run_id: int = Field(
+        foreign_key="run.id",
+        primary_key=True,
+        description="Run whose aggregates this state holds",
+    )
+    state: bytes = Field(description="Compressed JSON aggregate state")
+    created_at: datetime = Field(default_factory=utcnow)
+
+
+class KpiPayload(SQLModel, table=True):
+    """Model holding the full KPI structure computed by a run.
+
+    The payload is the zlib-compressed JSON of ``report_payload()``: every
+    KPI of ``compute_all_kpis`` (top companies, percentiles, sector rankings,
+    ...) plus the report's sector table, so the report of a past run can be
+    rendered again in any format without its source CSV.
+    """
+
+    __tablename__ = "kpi_payload"
+    __table_args__ = {"extend_existing": True}
+
+    run_id: int = Field(
+        foreign_key="run.id",
+        primary_key=True,
+        description="Run whose KPIs this payload holds",
+    )
+    version: int = Field(description="Layout version of the payload")
+    payload: bytes = Field(description="Compressed JSON KPI structure")
+    created_at: datetime = Field(default_factory=utcnow)
+
+
+class ResultCache(SQLModel, table=True):
+    """Model mapping a content hash of a run's inputs to its results.
+
+    The key covers the input bytes, output format, template version and
+    loading mode; ``csv-report generate`` reuses the KPIs and report file of
+    ``run_id`` on a hit instead of recomputing them.
+    """
+
+    __tablename__ = "result_cache"
+    __table_args__ = {"extend_existing": True}
+
+    key: str = Field(primary_key=True, description="Hash of the run inputs")
+    run_id: int = Field(
+        foreign_key="run.id",
+        description="Run whose KPIs and report are reused",
+    )
+    output_format: str = Field(description="Output format (markdown, html)")
+    report_path: str = Field(description="Path of the rendered report")
+    report_digest: str = Field(description="SHA-256 of the rendered report")
+    created_at: datetime = Field(default_factory=utcnow)
+    last_used_at: datetime = Field(default_factory=utcnow)
+    hits: int = Field(default=0, description="Number of cache hits")
+
+
+class CachedRun(SQLModel, table=True):
+    """Model linking a run served from the result cache to its source run."""
+
+    __tablename__ = "cached_run"
+    __table_args__ = {"extend_existing": True}
+
+    run_id: int = Field(
+        foreign_key="run.id",
+        primary_key=True,
+        description="Run recorded for the cache hit",
+    )
+    source_run_id: int = Field(
+        foreign_key="run.id",
+        description="Run that computed the reused KPIs",
+    )
+
+
+class KpiRollup(SQLModel, table=True):
+    """Model holding pre-aggregated KPI values per time bucket.
+
+    One row per KPI name, granularity (hour, day, week) and bucket start,
+    updated incrementally whenever ``Kpi`` rows are inserted, so KPI history
+    is read without scanning the ``kpi`` table.
+    """
+
+    __tablename__ = "kpi_rollup"
+    __table_args__ = {"extend_existing": True}
+
+    name: str = Field(primary_key=True, description="Name of the KPI")
+    granularity: str = Field(primary_key=True, description="hour, day or week")
+    bucket_start: datetime = Field(
+        primary_key=True,
+        description="Start of the time bucket",
+    )
+    count: int = Field(description="Number of KPI values in the bucket")
+    total: float = Field(description="Sum of the values, for the average")
+    min_value: float = Field(description="Smallest value in the bucket")
+    max_value: float = Field(description="Largest value in the bucket")
+    last_value: float = Field(description="Most recently calculated value")
+    last_at: datetime = Field(description="When the last value was calculated")
+
+
+class Job(SQLModel, table=True):
+    """Model representing a KPI computation submitted to ``POST /jobs``.
+
+    Jobs run on the worker pool of the API process that accepted them
+    (``owner``). The result is the zlib-compressed JSON of the upload KPIs
+    and the report's sector table; it is dropped once ``expires_at`` has
+    passed.
+    """
+
+    __table_args__ = {"extend_existing": True}
+
+    id: str = Field(primary_key=True, description="Random job identifier")
+    filename: str = Field(description="Name of the uploaded CSV file")
+    status: str = Field(
+        default="queued",
+        index=True,
+        description="queued, running, completed, failed or expired",
+    )
+    owner: str = Field(description="host:pid of the process running the job")
+    created_at: datetime = Field(default_factory=utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    finished_at: Optional[datetime] = Field(default=None)
+    expires_at: Optional[datetime] = Field(
+        default=None,
+        description="When the result of a finished job is dropped",
+    )
+    error_message: Optional[str] = Field(
+        default=None,
+        description="Error message if failed",
+    )
+    result: Optional[bytes] = Field(
+        default=None,
+        description="Compressed JSON result of a completed job",
+    )
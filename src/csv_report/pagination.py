@@ -0,0 +1,134 @@
+"""Keyset pagination of runs.
+
+Runs are listed newest first, ordered by ``(timestamp, id)``. A page ends
+with an opaque cursor encoding the position of its last run; the next page
+continues strictly after it. Unlike ``OFFSET`` the query seeks on the
+``run.timestamp`` index (whose entries carry the id), so every page costs
+the same no matter how deep into the history it lies.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlmodel import select
+
+from .models import CachedRun, Kpi, Run
+
+__all__ = [
+    "MAX_PAGE_SIZE",
+    "InvalidCursorError",
+    "cached_sources_statement",
+    "decode_cursor",
+    "encode_cursor",
+    "group_kpis",
+    "kpis_statement",
+    "runs_page_statement",
+    "split_page",
+]
+
+# Upper bound of runs per page, so a response never grows with the table
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(run: Run) -> str:
+    """Opaque cursor pointing just after ``run``."""
+    position = f"{run.timestamp.isoformat()}|{run.id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Timestamp and id encoded in a cursor from ``encode_cursor``.
+
+    Raises:
+        InvalidCursorError: If the cursor was not produced by ``encode_cursor``
+
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, run_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(run_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        msg = f"Invalid cursor: {cursor!r}"
+        raise InvalidCursorError(msg) from e
+
+
+def runs_page_statement(
+    limit: int,
+    cursor: str | None = None,
+    status: str | None = None,
+    output_format: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """Select one page of runs, plus one extra row to detect a next page.
+
+    Args:
+        limit: Runs per page (at most ``MAX_PAGE_SIZE``)
+        cursor: Cursor of the previous page, None for the first page
+        status: Only runs with this status
+        output_format: Only runs with this output format
+        since: Only runs at or after this time
+        until: Only runs before this time
+
+    Raises:
+        InvalidCursorError: If ``cursor`` cannot be decoded
+        ValueError: If ``limit`` is out of range
+
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        msg = f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        raise ValueError(msg)
+    statement = select(Run)
+    if cursor is not None:
+        statement = statement.where(
+            tuple_(Run.timestamp, Run.id) < tuple_(*decode_cursor(cursor)),
+        )
+    if status is not None:
+        statement = statement.where(Run.status == status)
+    if output_format is not None:
+        statement = statement.where(Run.output_format == output_format)
+    if since is not None:
+        statement = statement.where(Run.timestamp >= since)
+    if until is not None:
+        statement = statement.where(Run.timestamp < until)
+    return statement.order_by(Run.timestamp.desc(), Run.id.desc()).limit(limit + 1)
+
+
+def split_page(runs: list[Run], limit: int) -> tuple[list[Run], str | None]:
+    """Page of runs and the cursor of the next page (None on the last page)."""
+    if len(runs) <= limit:
+        return runs, None
+    page = runs[:limit]
+    return page, encode_cursor(page[-1])
+
+
+def cached_sources_statement(run_ids: list[int]):
+    """Select the source runs of the cache hits among ``run_ids``."""
+    return select(CachedRun).where(CachedRun.run_id.in_(run_ids))
+
+
+def kpis_statement(run_ids: list[int]):
+    """Select the KPIs of all ``run_ids`` in one IN-list query."""
+    return select(Kpi).where(Kpi.run_id.in_(run_ids)).order_by(Kpi.run_id, Kpi.id)
+
+
+def group_kpis(
+    run_ids: list[int],
+    sources: list[CachedRun],
+    kpis: list[Kpi],
+) -> dict[int, list[Kpi]]:
+    """Map every run to its KPIs, cache hits to those of their source run."""
+    by_run: dict[int, list[Kpi]] = defaultdict(list)
+    for kpi in kpis:
+        by_run[kpi.run_id].append(kpi)
+    source_of = {cached.run_id: cached.source_run_id for cached in sources}
+    return {run_id: by_run.get(source_of.get(run_id, run_id), []) for run_id in run_ids}
@@ -0,0 +1,246 @@
+"""Parse a single large CSV file on several cores.
+
+The file is split into byte ranges that end on record boundaries: one
+sequential pass counts quote characters, so a newline inside a quoted
+(multiline) field is never taken as a split point. Each range is parsed in a
+worker process with the file's header prepended, using the same typed,
+column-projected ``read_csv`` as the serial loader.
+
+``parallel_read_csv`` concatenates the partitions into one DataFrame;
+``parallel_aggregate_csv`` folds each partition straight into a
+``KpiAccumulator`` so the full frame is never assembled.
+"""
+
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+import pandas as pd
+
+from .load import DEFAULT_CHUNKSIZE, INPUT_SCHEMA, _read_chunks, read_csv
+
+# Add kpi_service to path and import
+sys.path.append(str(Path(__file__).parent.parent))
+from kpi_service.streaming import KpiAccumulator
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+__all__ = [
+    "DEFAULT_PARTITION_BYTES",
+    "parallel_aggregate_csv",
+    "parallel_read_csv",
+    "partition_csv",
+]
+
+# Target size of one partition; several per worker balance the load
+DEFAULT_PARTITION_BYTES = 64 * 1024 * 1024
+
+SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+QUOTE = ord('"')
+
+T = TypeVar("T")
+
+
+def _record_ends(csv_file: str | Path, targets: list[int]) -> Iterator[int]:
+    """Offset after the first record-ending newline at or after each target.
+
+    A newline ends a record when an even number of quote characters precede
+    it (escaped quotes are doubled, so they keep the parity).
+    """
+    targets = sorted(targets)
+    quotes = 0
+    block_start = 0
+    with Path(csv_file).open("rb") as file:
+        while targets:
+            block = file.read(SCAN_BLOCK_SIZE)
+            if not block:
+                return
+            block_end = block_start + len(block)
+            while targets and targets[0] < block_end:
+                position = max(targets[0] - block_start, 0)
+                counted, parity = 0, quotes
+                newline = block.find(b"\n", position)
+                while newline != -1:
+                    parity += block.count(QUOTE, counted, newline)
+                    counted = newline
+                    if parity % 2 == 0:
+                        break
+                    newline = block.find(b"\n", newline + 1)
+                if newline == -1:
+                    # No record ends in the rest of this block
+                    targets[0] = block_end
+                    break
+                end = block_start + newline + 1
+                yield end
+                while targets and targets[0] < end:
+                    targets.pop(0)
+            quotes += block.count(QUOTE)
+            block_start = block_end
+
+
+def partition_csv(
+    csv_file: str | Path,
+    partitions: int,
+) -> tuple[bytes, list[tuple[int, int]]]:
+    """Split a CSV file into at most ``partitions`` record-aligned byte ranges.
+
+    Args:
+        csv_file: CSV file with a header line
+        partitions: Desired number of ranges
+
+    Returns:
+        The header bytes (including its newline) and ``(start, end)`` byte
+        offsets of the data ranges in file order
+
+    """
+    size = Path(csv_file).stat().st_size
+    header_end = next(_record_ends(csv_file, [0]), size)
+    with Path(csv_file).open("rb") as file:
+        header = file.read(header_end)
+    if header and not header.endswith(b"\n"):
+        header += b"\n"
+    step = max((size - header_end) // max(partitions, 1), 1)
+    targets = list(range(header_end + step, size, step))
+    bounds = [header_end, *_record_ends(csv_file, targets)]
+    if bounds[-1] < size:
+        bounds.append(size)
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    return header, [(start, end) for start, end in ranges if end > start]
+
+
+def _read_partition(
+    csv_file: str | Path,
+    header: bytes,
+    start: int,
+    end: int,
+    schema: dict[str, str] | None,
+) -> pd.DataFrame:
+    """Parse one byte range of the file with the header prepended."""
+    with Path(csv_file).open("rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return read_csv(BytesIO(header + data), schema)
+
+
+def _aggregate_partition(
+    csv_file: str | Path,
+    header: bytes,
+    start: int,
+    end: int,
+    chunksize: int,
+) -> KpiAccumulator:
+    """Fold one byte range of the file into a fresh accumulator.
+
+    The range is parsed ``chunksize`` rows at a time, so only its raw bytes
+    and one chunk of rows are in memory at once.
+    """
+    with Path(csv_file).open("rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    accumulator = KpiAccumulator()
+    for chunk in _read_chunks(BytesIO(header + data), INPUT_SCHEMA, chunksize):
+        accumulator.update(chunk)
+    return accumulator
+
+
+def _map_partitions(
+    func: Callable[..., T],
+    csv_file: str | Path,
+    workers: int,
+    partition_bytes: int,
+    *args: object,
+) -> tuple[bytes, list[T]]:
+    """Apply ``func`` to every partition in file order across ``workers``."""
+    size = Path(csv_file).stat().st_size
+    partitions = max(workers, -(-size // partition_bytes))
+    header, ranges = partition_csv(csv_file, partitions)
+    calls = [(csv_file, header, start, end, *args) for start, end in ranges]
+    if workers <= 1 or len(calls) <= 1:
+        return header, [func(*call) for call in calls]
+    with ProcessPoolExecutor(max_workers=min(workers, len(calls))) as executor:
+        return header, list(executor.map(func, *zip(*calls)))
+
+
+def parallel_read_csv(
+    csv_file: str | Path,
+    workers: int,
+    schema: dict[str, str] | None = INPUT_SCHEMA,
+    partition_bytes: int = DEFAULT_PARTITION_BYTES,
+) -> pd.DataFrame:
+    """Parse a local CSV file across ``workers`` processes.
+
+    Args:
+        csv_file: Local CSV file
+        workers: Number of worker processes (1 parses in-process)
+        schema: Columns to load and their dtypes, as for ``read_csv``
+        partition_bytes: Target size of one partition
+
+    Returns:
+        The same DataFrame as ``read_csv(csv_file, schema)``
+
+    Raises:
+        CsvSchemaError: If columns are missing or a row cannot be parsed
+
+    """
+    header, frames = _map_partitions(
+        _read_partition,
+        csv_file,
+        workers,
+        partition_bytes,
+        schema,
+    )
+    if not frames:
+        return read_csv(BytesIO(header), schema)
+    df = pd.concat(frames, ignore_index=True)
+    # Partitions infer their own categories; unify them again
+    for column, dtype in (schema or {}).items():
+        if dtype == "category":
+            df[column] = df[column].astype("category")
+    return df
+
+
+def parallel_aggregate_csv(
+    csv_file: str | Path,
+    workers: int,
+    partition_bytes: int = DEFAULT_PARTITION_BYTES,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> KpiAccumulator:
+    """Aggregate the KPIs of a local CSV file across ``workers`` processes.
+
+    Each partition is parsed in chunks and folded into its own accumulator
+    in a worker; only the small accumulators travel back and are merged, so
+    at most one partition's bytes and one chunk of rows per worker are in
+    memory at a time.
+
+    Args:
+        csv_file: Local CSV file
+        workers: Number of worker processes (1 aggregates in-process)
+        partition_bytes: Target size of one partition
+        chunksize: Rows parsed at a time within a partition
+
+    Returns:
+        Accumulator over every row of the file
+
+    Raises:
+        CsvSchemaError: If columns are missing or a row cannot be parsed
+
+    """
+    header, partials = _map_partitions(
+        _aggregate_partition,
+        csv_file,
+        workers,
+        partition_bytes,
+        chunksize,
+    )
+    if not partials:
+        read_csv(BytesIO(header))
+        return KpiAccumulator()
+    accumulator = partials[0]
+    for partial in partials[1:]:
+        accumulator.merge(partial)
+    return accumulator
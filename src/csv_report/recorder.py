@@ -0,0 +1,377 @@
+"""Write-behind recording of runs and their KPIs.
+
+``RunRecorder`` takes the database writes of a report run off the
+user-visible pipeline: every call only enqueues an event and returns. A
+single background thread drains the queue and applies everything queued so
+far in one transaction, in the order it was queued. Calls such as the
+result cache eviction run after that transaction, so they never split the
+writes of a run.
+
+If a transaction fails, every run it wrote to is marked failed on its
+handle and the later writes of those runs are skipped, except ``fail_run``:
+a run is therefore never marked completed without its KPIs. The error is
+raised by the next ``flush``.
+
+``flush`` blocks until all earlier events are committed; leaving the
+``with`` block (normally or through an exception) and interpreter exit
+flush as well. Run ids are assigned by the database, so ``RecordedRun.id``
+waits until the run's insert is committed.
+"""
+
+from __future__ import annotations
+
+import atexit
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Callable, final
+
+from sqlmodel import Session, insert, update
+
+from .database import (
+    KPI_PAYLOAD_VERSION,
+    DatabaseService,
+    kpi_rows,
+    pack_kpi_payload,
+    pack_kpi_state,
+)
+from .models import Kpi, KpiPayload, KpiState, ResultCache, Run
+from .rollups import rollup_rows, rollup_upsert_statement
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from datetime import timedelta
+
+__all__ = ["RecordedRun", "RunRecorder"]
+
+# Upper bound of events applied in one transaction
+DEFAULT_MAX_BATCH = 1000
+
+_STOP = object()
+
+
+class RecordedRun:
+    """Handle of a run queued with ``RunRecorder.create_run``.
+
+    The ``mark_*`` methods and ``database_id`` are used by the recorder's
+    writer thread.
+    """
+
+    def __init__(self) -> None:
+        self._id: int | None = None
+        self._pending_id: int | None = None
+        self._committed = threading.Event()
+        self._error: BaseException | None = None
+        self.status: str | None = None
+        self.duration: float | None = None
+        self.error_message: str | None = None
+
+    @property
+    def id(self) -> int:
+        """Database id, available once the run's insert is committed."""
+        self._committed.wait()
+        if self._id is None:
+            raise self._error
+        return self._id
+
+    @property
+    def committed(self) -> bool:
+        """Whether the run's insert is committed."""
+        return self._id is not None
+
+    @property
+    def error(self) -> BaseException | None:
+        """Error of a failed transaction that wrote to this run, if any."""
+        return self._error
+
+    def database_id(self) -> int:
+        """Id for writes in the current transaction.
+
+        Raises:
+            RuntimeError: If the run's insert was not applied
+
+        """
+        run_id = self._id if self._id is not None else self._pending_id
+        if run_id is None:
+            msg = "The run's insert was not committed"
+            raise RuntimeError(msg)
+        return run_id
+
+    def mark_inserted(self, run_id: int) -> None:
+        """Remember the id of the insert flushed in the current transaction."""
+        self._pending_id = run_id
+
+    def mark_committed(self) -> None:
+        """Publish the id once the insert's transaction is committed."""
+        if self._id is None:
+            self._id = self._pending_id
+        self._committed.set()
+
+    def mark_failed(self, error: BaseException) -> None:
+        """Record that a transaction writing to this run failed."""
+        if self._error is None:
+            self._error = error
+        self._pending_id = None
+        self._committed.set()
+
+
+@final
+class RunRecorder:
+    """Background writer coalescing run and KPI writes into transactions."""
+
+    def __init__(
+        self,
+        db_service: DatabaseService | None = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+    ) -> None:
+        self.db_service = db_service or DatabaseService()
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._error: BaseException | None = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="run-recorder",
+            daemon=True,
+        )
+        self._thread.start()
+        # Pending writes must not be lost if the recorder is never closed
+        atexit.register(self.close)
+
+    def __enter__(self) -> RunRecorder:
+        """Return the recorder; it is closed when the block is left."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Commit the pending writes and stop the writer thread."""
+        self.close()
+
+    def _submit(
+        self,
+        operation: Callable[[Session], None],
+        run: RecordedRun | None = None,
+        *,
+        created: bool = False,
+        after_failure: bool = False,
+    ) -> None:
+        """Queue an operation writing to ``run``.
+
+        Operations of a run that is already marked failed are skipped,
+        unless ``after_failure`` is set.
+        """
+        if self._closed:
+            msg = "RunRecorder is closed"
+            raise RuntimeError(msg)
+        self._queue.put(("op", (operation, run, created, after_failure)))
+
+    def create_run(self, **fields: object) -> RecordedRun:
+        """Queue a new run record (fields as for ``DatabaseService.create_run``)."""
+        handle = RecordedRun()
+        handle.status = fields.get("status", "completed")
+
+        def operation(session: Session) -> None:
+            run = Run(**fields)
+            session.add(run)
+            session.flush()
+            handle.mark_inserted(run.id)
+
+        self._submit(operation, handle, created=True)
+        return handle
+
+    def add_kpis(self, run: RecordedRun, kpis: Iterable[dict[str, Any]]) -> None:
+        """Queue KPI records of a run and their rollups."""
+        kpis = list(kpis)
+        upsert = rollup_upsert_statement(self.db_service.engine.dialect.name)
+
+        def operation(session: Session) -> None:
+            rows = kpi_rows(run.database_id(), kpis)
+            if rows:
+                session.execute(insert(Kpi), rows)
+                session.execute(upsert, rollup_rows(rows))
+
+        self._submit(operation, run)
+
+    def save_kpi_state(self, run: RecordedRun, state: dict[str, Any]) -> None:
+        """Queue the mergeable KPI aggregate state of a run.
+
+        The state is compressed by the writer thread, off the pipeline.
+        """
+
+        def operation(session: Session) -> None:
+            payload = pack_kpi_state(state)
+            session.merge(KpiState(run_id=run.database_id(), state=payload))
+
+        self._submit(operation, run)
+
+    def save_kpi_payload(self, run: RecordedRun, payload: dict[str, Any]) -> None:
+        """Queue the full KPI structure of a run (see ``report_payload``)."""
+        packed = pack_kpi_payload(payload)
+
+        def operation(session: Session) -> None:
+            session.merge(
+                KpiPayload(
+                    run_id=run.database_id(),
+                    version=KPI_PAYLOAD_VERSION,
+                    payload=packed,
+                ),
+            )
+
+        self._submit(operation, run)
+
+    def save_cached_result(
+        self,
+        key: str,
+        run: RecordedRun,
+        output_format: str,
+        report_path: str,
+        report_digest: str,
+    ) -> None:
+        """Queue the result cache entry for ``key``."""
+
+        def operation(session: Session) -> None:
+            session.merge(
+                ResultCache(
+                    key=key,
+                    run_id=run.database_id(),
+                    output_format=output_format,
+                    report_path=report_path,
+                    report_digest=report_digest,
+                ),
+            )
+
+        self._submit(operation, run)
+
+    def evict_result_cache(self, ttl: timedelta, max_entries: int) -> None:
+        """Queue ``DatabaseService.evict_result_cache``.
+
+        It runs after the transaction of the writes queued with it.
+        """
+        self._queue.put(
+            ("call", lambda: self.db_service.evict_result_cache(ttl, max_entries)),
+        )
+
+    def update_run(
+        self,
+        run: RecordedRun,
+        *,
+        after_failure: bool = False,
+        **fields: object,
+    ) -> None:
+        """Queue an update of run columns, e.g. status and duration."""
+        for name, value in fields.items():
+            setattr(run, name, value)
+
+        def operation(session: Session) -> None:
+            statement = update(Run).where(Run.id == run.database_id())
+            session.execute(statement.values(**fields))
+
+        self._submit(operation, run, after_failure=after_failure)
+
+    def complete_run(self, run: RecordedRun, duration: float) -> None:
+        """Queue marking a run as completed with its duration in seconds."""
+        self.update_run(run, status="completed", duration=duration)
+
+    def fail_run(self, run: RecordedRun, error: BaseException) -> None:
+        """Queue marking a run as failed with the error message.
+
+        Applied even after an earlier write of the run failed, as long as
+        the run itself was inserted.
+        """
+        self.update_run(
+            run,
+            after_failure=True,
+            status="failed",
+            error_message=str(error),
+        )
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed.
+
+        Raises:
+            Exception: The first error the writer ran into, if any
+
+        """
+        if not self._closed:
+            done = threading.Event()
+            self._queue.put(("flush", done))
+            done.wait()
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        """Commit the pending writes and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(("stop", _STOP))
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        """Writer loop: apply drained events in order, one transaction per batch.
+
+        Calls drained with a batch run after its transaction is committed.
+        """
+        stopped = False
+        while not stopped:
+            events = [self._queue.get()]
+            # The writer is the only consumer, so a non-empty queue has an item
+            while len(events) < self.max_batch and not self._queue.empty():
+                events.append(self._queue.get_nowait())
+            operations: list = []
+            calls: list = []
+            for kind, payload in events:
+                if kind == "op":
+                    operations.append(payload)
+                elif kind == "call":
+                    calls.append(payload)
+                else:
+                    self._commit(operations)
+                    operations = []
+                    for call in calls:
+                        self._guarded(call)
+                    calls = []
+                    if kind == "flush":
+                        payload.set()
+                    else:
+                        stopped = True
+            self._commit(operations)
+            for call in calls:
+                self._guarded(call)
+
+    def _commit(self, operations: list) -> None:
+        """Apply queued operations in one transaction and publish new run ids.
+
+        Operations of runs marked failed by an earlier transaction are
+        skipped. If the transaction fails, every run it wrote to is marked
+        failed.
+        """
+        operations = [
+            (operation, run, created)
+            for operation, run, created, after_failure in operations
+            if run is None or run.error is None or (after_failure and run.committed)
+        ]
+        if not operations:
+            return
+
+        def apply() -> None:
+            with Session(self.db_service.engine) as session:
+                for operation, _, _ in operations:
+                    operation(session)
+                session.commit()
+
+        error = self._guarded(apply)
+        for _, run, created in operations:
+            if error is not None and run is not None:
+                run.mark_failed(error)
+            elif created:
+                run.mark_committed()
+
+    def _guarded(self, func: Callable[[], object]) -> BaseException | None:
+        """Run ``func``, remembering the first error for ``flush``."""
+        try:
+            func()
+        except Exception as e:  # surfaced by flush()
+            if self._error is None:
+                self._error = e
+            return e
+        return None
@@ -6,10 +6,11 @@ S&P 500 companies data using Jinja2 templates.
 
 from __future__ import annotations
 
+import hashlib
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from jinja2 import Environment, FileSystemLoader
 
@@ -18,57 +19,153 @@ if TYPE_CHECKING:
 
 # Add kpi_service to path and import
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from kpi_service.kpi import calculate_base_kpis, calculate_enhanced_kpis
-
-__all__ = ["generate_report", "save_report"]
-
-
-def generate_report(df: pd.DataFrame, output_format: str = "markdown") -> str:
+from kpi_service.kpi import (
+    build_kpi_aggregates,
+    calculate_base_kpis,
+    calculate_enhanced_kpis,
+    compute_all_kpis,
+    frame_to_records,
+)
+
+__all__ = [
+    "generate_report",
+    "render_report",
+    "report_payload",
+    "report_sectors",
+    "save_report",
+    "template_version",
+]
+
+# Jinja2 template rendered for each output format (markdown is the fallback)
+TEMPLATES = {
+    "html": "report_template.html",
+    "markdown": "template.markdown.j2",
+}
+
+# Columns of the legacy per-sector table rendered by the report templates
+LEGACY_SECTOR_FIELDS = {
+    "Sector": ("Sector", str),
+    "company_count": ("company_count", int),
+    "avg_market_cap": ("avg_market_cap", float),
+    "median_market_cap": ("median_market_cap", float),
+}
+
+
+def generate_report(
+    df: pd.DataFrame | None,
+    output_format: str = "markdown",
+    aggregates: dict[str, Any] | None = None,
+) -> str:
     """Generate a report from the S&P 500 companies data using Jinja2 template.
 
     Args:
         df: DataFrame containing S&P 500 companies data
         output_format: 'html' or 'markdown'
+        aggregates: Precomputed result of ``build_kpi_aggregates``; when given,
+            ``df`` is not touched and may be ``None``
 
     Returns:
         String containing the formatted report
 
     """
-    if df.empty:
+    if aggregates is None:
+        if df is None or df.empty:
+            return "No data available for analysis."
+        aggregates = build_kpi_aggregates(df)
+    if aggregates["overall"]["row_count"] == 0:
         return "No data available for analysis."
 
     # Compute KPIs
-    base_kpis = calculate_base_kpis(df)
-    enhanced_kpis = calculate_enhanced_kpis(df)
+    kpis = {
+        "base_kpis": calculate_base_kpis(aggregates=aggregates),
+        "enhanced_kpis": calculate_enhanced_kpis(aggregates=aggregates),
+        "report_sectors": report_sectors(aggregates),
+    }
+    return render_report(kpis, output_format)
+
 
+def report_sectors(aggregates: dict[str, Any]) -> list[dict[str, Any]]:
+    """Rows of the per-sector table of the report templates."""
     # Legacy sector KPIs for backward compatibility
-    sector_kpis = (
-        df.groupby("Sector")
-        .agg({"Shortname": "count", "Marketcap": ["mean", "median"]})
+    return frame_to_records(
+        aggregates["sectors"][["listed_count", "avg_market_cap", "median_market_cap"]]
+        .rename(columns={"listed_count": "company_count"})
         .round(2)
+        .reset_index(),
+        LEGACY_SECTOR_FIELDS,
     )
 
-    # Flatten column names
-    sector_kpis.columns = ["company_count", "avg_market_cap", "median_market_cap"]
-    sector_kpis = sector_kpis.reset_index()
+
+def report_payload(
+    aggregates: dict[str, Any],
+    all_kpis: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Full KPI structure of a dataset, enough to render its report again.
+
+    Args:
+        aggregates: Result of ``build_kpi_aggregates``
+        all_kpis: ``compute_all_kpis`` of the same aggregates, if already
+            computed
+
+    Returns:
+        ``compute_all_kpis`` output plus the report's ``report_sectors``
+
+    """
+    if all_kpis is None:
+        all_kpis = compute_all_kpis(aggregates=aggregates)
+    return {**all_kpis, "report_sectors": report_sectors(aggregates)}
+
+
+def render_report(
+    kpis: dict[str, Any],
+    output_format: str = "markdown",
+    generated_at: datetime | None = None,
+) -> str:
+    """Render a report from KPIs instead of the data they were computed from.
+
+    Args:
+        kpis: Mapping with base_kpis, enhanced_kpis and report_sectors, e.g.
+            a stored ``report_payload``
+        output_format: 'html' or 'markdown'
+        generated_at: Generation time shown in the report (default: now)
+
+    Returns:
+        String containing the formatted report
+
+    """
+    if kpis["base_kpis"]["total_companies"] == 0:
+        return "No data available for analysis."
 
     # Load Jinja2 template
     template_dir = Path(__file__).parent
     env = Environment(loader=FileSystemLoader(template_dir), autoescape=True)
-    if output_format == "html":
-        template = env.get_template("report_template.html")
-    else:
-        template = env.get_template("template.markdown.j2")
+    template = env.get_template(_template_name(output_format))
 
     # Render template with data
     return template.render(
-        base_kpis=base_kpis,
-        sector_kpis=sector_kpis,
-        enhanced_kpis=enhanced_kpis,
-        generated_at=datetime.now().strftime("%B %d, %Y at %I:%M:%S %p"),
+        base_kpis=kpis["base_kpis"],
+        sector_kpis=kpis["report_sectors"],
+        enhanced_kpis=kpis["enhanced_kpis"],
+        generated_at=(generated_at or datetime.now()).strftime(
+            "%B %d, %Y at %I:%M:%S %p",
+        ),
     )
 
 
+def _template_name(output_format: str) -> str:
+    return TEMPLATES.get(output_format, TEMPLATES["markdown"])
+
+
+def template_version(output_format: str) -> str:
+    """Content hash of the template rendered for ``output_format``.
+
+    Changes whenever the template is edited, so cached reports rendered with
+    an older template are not reused.
+    """
+    template = Path(__file__).parent / _template_name(output_format)
+    return hashlib.sha256(template.read_bytes()).hexdigest()[:16]
+
+
 def save_report(report: str, output_file: Path | None = None) -> Path:
     """Save a report to a file.
 
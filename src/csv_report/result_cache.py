@@ -0,0 +1,96 @@
+"""Content-addressed keys for the run result cache.
+
+``csv-report generate`` looks the key of its inputs up in the
+``result_cache`` table of ``run.db``. On a hit the KPIs and the rendered
+report of the earlier run are reused and only a lightweight "cached" run is
+recorded; load, KPI calculation, rendering and KPI inserts are skipped.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from kpi_service.upload_cache import kpi_code_version
+
+from .csv_cache import file_digest, get_default_cache
+from .load import INPUT_SCHEMA
+from .report.generate import template_version
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+__all__ = [
+    "DEFAULT_RESULT_MAX_ENTRIES",
+    "DEFAULT_RESULT_TTL",
+    "report_digest",
+    "result_cache_key",
+]
+
+DEFAULT_RESULT_TTL = timedelta(
+    seconds=int(os.getenv("CSV_REPORT_RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+)
+DEFAULT_RESULT_MAX_ENTRIES = int(
+    os.getenv("CSV_REPORT_RESULT_CACHE_MAX_ENTRIES", "1000"),
+)
+
+# Bump when the key layout changes; KPI code changes are covered by
+# ``kpi_code_version``
+RESULT_CACHE_VERSION = 2
+
+
+def _input_digest(csv_file: str | Path) -> str:
+    """Content hash of the input, memoized by the parse cache when available."""
+    cache = get_default_cache()
+    if cache is not None:
+        try:
+            return cache.content_digest(csv_file)
+        except OSError:
+            pass
+    return file_digest(csv_file)
+
+
+def result_cache_key(
+    csv_file: str | Path,
+    output_format: str,
+    *,
+    stream: bool,
+    chunksize: int | None = None,
+    workers: int = 1,
+) -> str:
+    """Hash of everything a generate run's results depend on.
+
+    Args:
+        csv_file: Local input CSV file
+        output_format: Report format (markdown or html)
+        stream: Whether the KPIs were aggregated in --stream mode, whose
+            medians are approximate for large inputs
+        chunksize: Rows per chunk in --stream mode
+        workers: Processes aggregating in --stream mode; with ``chunksize``
+            they decide where the approximate medians' sketches compact
+
+    Returns:
+        Hex digest identifying the run's KPIs and report
+
+    """
+    parts = [
+        str(RESULT_CACHE_VERSION),
+        _input_digest(csv_file),
+        output_format,
+        template_version(output_format),
+        json.dumps(INPUT_SCHEMA),
+        kpi_code_version(),
+        f"stream:{chunksize}:{workers}" if stream else "memory",
+    ]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def report_digest(report_path: str | Path) -> str | None:
+    """Content hash of a rendered report, or None if it no longer exists."""
+    try:
+        return file_digest(report_path)
+    except OSError:
+        return None
@@ -0,0 +1,546 @@
+"""Retention of old runs: archival to month-partitioned Parquet files.
+
+``archive_runs`` moves runs older than a cutoff, with their KPIs, KPI
+payloads and KPI state, out of ``run.db`` in batches. Each batch is written
+to zstd-compressed Parquet files partitioned by month (``run/month=YYYY-MM/``,
+``kpi/month=.../``, ``kpi_payload/...``, ``kpi_state/...``) and deleted from
+the database in the same write transaction, once its files are on disk.
+Cached-run links of archived runs are archived with them (``cached_run/``,
+in the month of the cached run) and their result cache entries dropped;
+``kpi_rollup`` keeps covering archived values, so ``get_kpi_history`` is
+unaffected. ``vacuum`` then returns the freed pages to the file system.
+
+``read_history`` is the read path for history queries: it unions the
+archived partitions with the live table, so callers see every run whether
+or not it was archived. ``run`` and ``kpi`` ids are ``AUTOINCREMENT`` in
+SQLite, so ids of archived rows are not handed out again; databases created
+before that can still reuse them, which is why archived rows are identified
+by id and timestamp together.
+
+Lookups of single runs and pages of runs fall back to the archive for runs
+that are no longer live: ``archived_records`` reads the archived rows of a
+run, and ``archived_runs_page`` merges archived runs into a page of live
+ones.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import pandas as pd
+from sqlalchemy import (
+    DateTime,
+    Float,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+    delete,
+    select,
+)
+
+from .models import CachedRun, Kpi, KpiPayload, KpiState, ResultCache, Run
+from .pagination import decode_cursor
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine
+
+# Optional import for the Parquet archive files
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+__all__ = [
+    "DEFAULT_ARCHIVE_BATCH_SIZE",
+    "PYARROW_AVAILABLE",
+    "archive_runs",
+    "archived_records",
+    "archived_runs_page",
+    "default_archive_dir",
+    "parse_age",
+    "read_archive",
+    "read_history",
+    "vacuum",
+]
+
+DEFAULT_ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_COMPRESSION = "zstd"
+PARTITION_COLUMN = "month"
+
+# Archived tables and the timestamp column they are partitioned by
+TIME_COLUMNS = {
+    "run": "timestamp",
+    "kpi": "calculated_at",
+    "kpi_payload": "created_at",
+    "kpi_state": "created_at",
+}
+ARCHIVED_TABLES = {
+    model.__tablename__: model.__table__ for model in (Run, Kpi, KpiPayload, KpiState)
+}
+# Archived with their run and partitioned by its month; no time column
+ARCHIVED_LINKS = {CachedRun.__tablename__: CachedRun.__table__}
+
+_AGE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _require_pyarrow() -> None:
+    if not PYARROW_AVAILABLE:
+        msg = (
+            "pyarrow is required for the run archive. "
+            "Install with: pip install pyarrow"
+        )
+        raise ImportError(msg)
+
+
+def parse_age(value: str) -> timedelta:
+    """Parse an age such as ``90d``, ``12w``, ``36h``, ``30m`` or ``45s``.
+
+    Raises:
+        ValueError: If ``value`` is not a whole number followed by a unit
+
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([smhdw])\s*", value)
+    if match is None:
+        msg = f"Invalid age {value!r}, use e.g. 90d, 12w or 36h"
+        raise ValueError(msg)
+    amount, unit = match.groups()
+    return timedelta(**{_AGE_UNITS[unit]: int(amount)})
+
+
+def default_archive_dir(engine: Engine) -> Path:
+    """Archive directory of a database (``CSV_REPORT_ARCHIVE_DIR`` overrides).
+
+    SQLite databases are archived next to their file, e.g. ``run_archive/``
+    beside ``run.db``.
+    """
+    configured = os.getenv("CSV_REPORT_ARCHIVE_DIR")
+    if configured:
+        return Path(configured)
+    database = engine.url.database
+    if engine.dialect.name == "sqlite" and database and database != ":memory:":
+        path = Path(database)
+        return path.parent / f"{path.stem}_archive"
+    return Path.home() / ".local" / "share" / "csv_report" / "archive"
+
+
+def _arrow_schema(table: Table) -> pa.Schema:
+    """Arrow schema of a model table, from its columns' SQL types."""
+    types = [
+        (Integer, pa.int64()),
+        (Float, pa.float64()),
+        (String, pa.string()),
+        (DateTime, pa.timestamp("us")),
+        (LargeBinary, pa.binary()),
+    ]
+    fields = []
+    for column in table.columns:
+        # sqlmodel's AutoString decorates String
+        sql_type = getattr(column.type, "impl", column.type)
+        arrow_type = next(t for sql, t in types if isinstance(sql_type, sql))
+        fields.append((column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_partitions(
+    directory: Path,
+    table: Table,
+    rows: list,
+    times: list[datetime] | None = None,
+) -> list[Path]:
+    """Write rows of ``table`` to one Parquet file per month they fall in.
+
+    Files are named after the first and last id they hold and a digest of
+    the ids and timestamps of their rows, and written through a synced
+    temporary file. A partition thus never contains a partial file,
+    rewriting a batch replaces its files, and rows that reuse the ids of
+    earlier archived ones never overwrite them.
+
+    Args:
+        directory: Archive root
+        table: One of ``ARCHIVED_TABLES`` or ``ARCHIVED_LINKS``
+        rows: Result rows of ``select(table)``, ordered by their first column
+        times: Timestamps the rows are partitioned by (default: the values
+            of the table's ``TIME_COLUMNS`` column)
+
+    Returns:
+        Paths of the written files
+
+    """
+    schema = _arrow_schema(table)
+    columns = list(zip(*rows))
+    batch = pa.table(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+    if times is None:
+        times = columns[schema.get_field_index(TIME_COLUMNS[table.name])]
+    months: dict[tuple[int, int], list[int]] = {}
+    for position, timestamp in enumerate(times):
+        months.setdefault((timestamp.year, timestamp.month), []).append(position)
+
+    files = []
+    for (year, month), positions in sorted(months.items()):
+        partition = directory / table.name / f"{PARTITION_COLUMN}={year}-{month:02d}"
+        partition.mkdir(parents=True, exist_ok=True)
+        ids = [columns[0][position] for position in positions]
+        digest = hashlib.sha256()
+        for row_id, position in zip(ids, positions):
+            digest.update(f"{row_id}@{times[position].isoformat()};".encode())
+        name = f"part-{ids[0]:012d}-{ids[-1]:012d}-{digest.hexdigest()[:8]}"
+        path = partition / f"{name}.parquet"
+        tmp_path = path.with_suffix(".tmp")
+        pq.write_table(
+            batch.take(positions),
+            tmp_path,
+            compression=ARCHIVE_COMPRESSION,
+        )
+        with tmp_path.open("rb+") as file:
+            os.fsync(file.fileno())
+        tmp_path.replace(path)
+        files.append(path)
+    return files
+
+
+def _delete_runs(connection: Connection, run_ids: list[int]) -> None:
+    """Delete runs with their KPIs and every row referencing them.
+
+    Their KPIs, payloads, state and cached-run links must be archived first.
+    Links of live cached runs to archived source runs are kept, so those
+    runs still find their KPIs in the archive.
+    """
+    for model in (Kpi, KpiPayload, KpiState, ResultCache, CachedRun):
+        connection.execute(delete(model).where(model.run_id.in_(run_ids)))
+    connection.execute(delete(Run).where(Run.id.in_(run_ids)))
+
+
+def archive_runs(
+    engine: Engine,
+    cutoff: datetime,
+    directory: Path | None = None,
+    batch_size: int = DEFAULT_ARCHIVE_BATCH_SIZE,
+) -> dict[str, int]:
+    """Move runs older than ``cutoff`` with their KPIs to Parquet files.
+
+    The KPI payloads, state and cached-run links of the runs are archived
+    with them; their result cache entries are dropped. Runs whose KPIs are
+    still reused by a newer cached run are kept.
+
+    Args:
+        engine: Engine of the database to prune
+        cutoff: Runs with an earlier timestamp (UTC) are archived
+        directory: Archive root (default: ``default_archive_dir``)
+        batch_size: Runs written and deleted per transaction
+
+    Returns:
+        Numbers of archived runs, KPIs and payloads and of written files
+
+    """
+    _require_pyarrow()
+    if directory is None:
+        directory = default_archive_dir(engine)
+    directory = Path(directory)
+    run_table = Run.__table__
+    newer_runs = select(Run.id).where(Run.timestamp >= cutoff)
+    still_reused = select(CachedRun.source_run_id).where(
+        CachedRun.run_id.in_(newer_runs),
+    )
+    summary = {"runs": 0, "kpis": 0, "payloads": 0, "files": 0}
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            if engine.dialect.name == "sqlite":
+                # Hold the write lock from reading a batch until it is deleted
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            runs = (
+                connection.execute(
+                    select(run_table)
+                    .where(
+                        Run.timestamp < cutoff,
+                        Run.id > last_id,
+                        Run.id.not_in(still_reused),
+                    )
+                    .order_by(Run.id)
+                    .limit(batch_size),
+                )
+            ).all()
+            if not runs:
+                connection.rollback()
+                break
+            run_ids = [run.id for run in runs]
+            files = _write_partitions(directory, run_table, runs)
+            counts = {}
+            for model in (Kpi, KpiPayload, KpiState):
+                rows = connection.execute(
+                    select(model.__table__)
+                    .where(model.run_id.in_(run_ids))
+                    .order_by(*model.__table__.primary_key.columns),
+                ).all()
+                if rows:
+                    files += _write_partitions(directory, model.__table__, rows)
+                counts[model.__tablename__] = len(rows)
+            links = connection.execute(
+                select(CachedRun.__table__)
+                .where(CachedRun.run_id.in_(run_ids))
+                .order_by(CachedRun.run_id),
+            ).all()
+            if links:
+                run_times = {run.id: run.timestamp for run in runs}
+                files += _write_partitions(
+                    directory,
+                    CachedRun.__table__,
+                    links,
+                    times=[run_times[link.run_id] for link in links],
+                )
+            _delete_runs(connection, run_ids)
+            connection.commit()
+        last_id = run_ids[-1]
+        summary["runs"] += len(runs)
+        summary["kpis"] += counts["kpi"]
+        summary["payloads"] += counts["kpi_payload"]
+        summary["files"] += len(files)
+    return summary
+
+
+def vacuum(engine: Engine) -> int:
+    """Return the free pages of a SQLite database to the file system.
+
+    New databases use ``auto_vacuum=INCREMENTAL`` (see
+    ``db_init.SQLITE_PRAGMAS``) and only release their free pages; older
+    ones are converted by a one-off full ``VACUUM``.
+
+    Returns:
+        Bytes the database file shrank by (0 for other databases)
+
+    """
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return 0
+    path = Path(engine.url.database)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        # Move committed pages out of the WAL first so the sizes compare
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        size_before = path.stat().st_size
+        mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if mode == _AUTO_VACUUM_INCREMENTAL:
+            # sqlite3's execute() steps this pragma once, freeing one page;
+            # executescript() runs it to completion
+            dbapi_connection = connection.connection.dbapi_connection
+            dbapi_connection.executescript("PRAGMA incremental_vacuum")
+        else:
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return size_before - path.stat().st_size
+
+
+def read_archive(
+    directory: Path,
+    table_name: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filters: dict[str, Any] | None = None,
+) -> pd.DataFrame:
+    """Archived rows of one of ``ARCHIVED_TABLES`` in ``[since, until)``.
+
+    Only the month partitions overlapping the range are read, and within
+    them only the row groups whose timestamps do.
+
+    Args:
+        directory: Archive root
+        table_name: ``run``, ``kpi``, ``kpi_payload`` or ``kpi_state``, or
+            ``cached_run`` (without ``since`` and ``until``)
+        since: Earliest timestamp to include
+        until: Timestamp to stop before
+        filters: Column values the rows must equal, e.g. ``{"name": ...}``;
+            a list matches any of its values
+
+    Returns:
+        Rows with the table's columns; empty if nothing was archived
+
+    """
+    table = {**ARCHIVED_TABLES, **ARCHIVED_LINKS}[table_name]
+    columns = [column.name for column in table.columns]
+    root = Path(directory) / table_name
+    if not root.is_dir() or next(root.glob("*/*.parquet"), None) is None:
+        return pd.DataFrame(columns=columns)
+    _require_pyarrow()
+
+    month = ds.field(PARTITION_COLUMN)
+    conditions = [
+        (
+            ds.field(name).isin(value)
+            if isinstance(value, list)
+            else ds.field(name) == value
+        )
+        for name, value in (filters or {}).items()
+    ]
+    if since is not None:
+        time_column = ds.field(TIME_COLUMNS[table_name])
+        conditions += [month >= f"{since:%Y-%m}", time_column >= since]
+    if until is not None:
+        time_column = ds.field(TIME_COLUMNS[table_name])
+        conditions += [month <= f"{until:%Y-%m}", time_column < until]
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        schema=_arrow_schema(table).append(pa.field(PARTITION_COLUMN, pa.string())),
+        partitioning=ds.partitioning(
+            pa.schema([(PARTITION_COLUMN, pa.string())]),
+            flavor="hive",
+        ),
+    )
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def read_history(
+    engine: Engine,
+    table_name: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filters: dict[str, Any] | None = None,
+    directory: Path | None = None,
+) -> pd.DataFrame:
+    """Rows of one of ``ARCHIVED_TABLES`` in ``[since, until)``, live and archived.
+
+    Arguments are those of ``read_archive``; ``directory`` defaults to
+    ``default_archive_dir``. Rows are ordered by their timestamp column.
+    """
+    table = ARCHIVED_TABLES[table_name]
+    time_column = table.c[TIME_COLUMNS[table_name]]
+    statement = select(table)
+    for name, value in (filters or {}).items():
+        statement = statement.where(table.c[name] == value)
+    if since is not None:
+        statement = statement.where(time_column >= since)
+    if until is not None:
+        statement = statement.where(time_column < until)
+    with engine.connect() as connection:
+        live = pd.DataFrame(
+            connection.execute(statement).mappings().all(),
+            columns=[column.name for column in table.columns],
+        )
+    # Match the archived dtypes even where every live value is NULL
+    for column in table.columns:
+        if isinstance(column.type, (Integer, Float)):
+            live[column.name] = pd.to_numeric(live[column.name])
+        elif isinstance(column.type, DateTime):
+            live[column.name] = pd.to_datetime(live[column.name])
+
+    if directory is None:
+        directory = default_archive_dir(engine)
+    archived = read_archive(directory, table_name, since, until, filters)
+    frames = [frame for frame in (archived, live) if not frame.empty]
+    if not frames:
+        return live
+    # A batch re-archived after an interrupted run is stored twice; rows of
+    # databases that reuse ids only share the id, not the timestamp
+    key = [column.name for column in table.primary_key.columns]
+    history = pd.concat(frames, ignore_index=True).drop_duplicates(
+        [*key, time_column.name],
+        keep="last",
+    )
+    return history.sort_values([time_column.name, *key], ignore_index=True)
+
+
+def archived_records(
+    directory: Path,
+    table_name: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filters: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
+    """Archived rows as mappings of Python values, e.g. for ``Run(**record)``.
+
+    Arguments are those of ``read_archive``. Missing values are None, and
+    rows archived twice by an interrupted run are returned once.
+    """
+    archived = read_archive(directory, table_name, since, until, filters)
+    if archived.empty:
+        return []
+    table = {**ARCHIVED_TABLES, **ARCHIVED_LINKS}[table_name]
+    key = [column.name for column in table.primary_key.columns]
+    if table_name in TIME_COLUMNS:
+        key.append(TIME_COLUMNS[table_name])
+    archived = archived.drop_duplicates(key, keep="last").sort_values(key)
+    records = archived.astype(object).where(archived.notna(), None)
+    return [
+        {
+            name: value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+            for name, value in record.items()
+        }
+        for record in records.to_dict("records")
+    ]
+
+
+def archived_runs_page(
+    directory: Path,
+    runs: list[Run],
+    limit: int,
+    cursor: str | None = None,
+    status: str | None = None,
+    output_format: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[Run]:
+    """Merge archived runs into a page of live runs, newest first.
+
+    Only archived runs that belong on the page are read: those after
+    ``cursor`` and, when the live page is full, at or after its oldest run,
+    so pages of recent runs skip every archived month.
+
+    Args:
+        directory: Archive root
+        runs: Live runs of ``runs_page_statement`` with the same arguments
+        limit: Runs per page
+        cursor: Cursor of the previous page, None for the first page
+        status: Only runs with this status
+        output_format: Only runs with this output format
+        since: Only runs at or after this time
+        until: Only runs before this time
+
+    Returns:
+        Up to ``limit + 1`` runs, for ``split_page``
+
+    """
+    position = decode_cursor(cursor) if cursor is not None else None
+    if position is not None:
+        # Runs at the cursor's timestamp are compared by id below
+        end = position[0] + timedelta(microseconds=1)
+        until = end if until is None else min(until, end)
+    if len(runs) > limit:
+        oldest = runs[-1].timestamp
+        since = oldest if since is None else max(since, oldest)
+    filters = {
+        name: value
+        for name, value in (("status", status), ("output_format", output_format))
+        if value is not None
+    }
+    archived = [
+        Run(**record)
+        for record in archived_records(directory, "run", since, until, filters)
+    ]
+    if not archived:
+        return runs
+    live = {(run.id, run.timestamp) for run in runs}
+    merged = runs + [
+        run
+        for run in archived
+        if (run.id, run.timestamp) not in live
+        and (position is None or (run.timestamp, run.id) < position)
+    ]
+    merged.sort(key=lambda run: (run.timestamp, run.id), reverse=True)
+    return merged[: limit + 1]
@@ -0,0 +1,198 @@
+"""Incrementally maintained KPI rollups for time-series queries.
+
+Every inserted KPI value is folded into one ``KpiRollup`` row per
+granularity: count, sum, min, max and the most recent value of its hour,
+day and week. The fold is an upsert executed in the same transaction as the
+KPI insert, so rollups never drift from the ``kpi`` table, and a history
+query reads one row per bucket through the primary key however many runs
+lie behind it.
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import case
+from sqlmodel import select
+
+from .models import Kpi, KpiRollup
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy.engine import Connection
+
+__all__ = [
+    "GRANULARITIES",
+    "backfill_rollups",
+    "bucket_start",
+    "history_point",
+    "history_statement",
+    "rollup_rows",
+    "rollup_upsert_statement",
+]
+
+GRANULARITIES = ("hour", "day", "week")
+
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the hour, day or week (from Monday) containing ``timestamp``.
+
+    Raises:
+        ValueError: If ``granularity`` is not one of ``GRANULARITIES``
+
+    """
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    msg = f"Unknown granularity {granularity!r}, use one of {GRANULARITIES}"
+    raise ValueError(msg)
+
+
+def rollup_rows(kpis: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Fold KPI rows into one rollup row per name, granularity and bucket.
+
+    Args:
+        kpis: Mappings with name, value and calculated_at, as inserted into
+            the ``kpi`` table; NaN values are skipped
+
+    Returns:
+        Rows for ``rollup_upsert_statement``
+
+    """
+    rows: dict[tuple[str, str, datetime], dict[str, Any]] = {}
+    for kpi in kpis:
+        value = float(kpi["value"])
+        if math.isnan(value):
+            continue
+        calculated_at = kpi["calculated_at"]
+        for granularity in GRANULARITIES:
+            key = (kpi["name"], granularity, bucket_start(calculated_at, granularity))
+            row = rows.get(key)
+            if row is None:
+                rows[key] = {
+                    "name": key[0],
+                    "granularity": granularity,
+                    "bucket_start": key[2],
+                    "count": 1,
+                    "total": value,
+                    "min_value": value,
+                    "max_value": value,
+                    "last_value": value,
+                    "last_at": calculated_at,
+                }
+                continue
+            row["count"] += 1
+            row["total"] += value
+            row["min_value"] = min(row["min_value"], value)
+            row["max_value"] = max(row["max_value"], value)
+            if calculated_at >= row["last_at"]:
+                row["last_value"] = value
+                row["last_at"] = calculated_at
+    return list(rows.values())
+
+
+def rollup_upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT statement merging rollup rows into ``kpi_rollup``.
+
+    Raises:
+        NotImplementedError: For databases without ``ON CONFLICT`` support
+
+    """
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        msg = f"KPI rollups are not supported on {dialect_name}"
+        raise NotImplementedError(msg)
+    table = KpiRollup.__table__
+    statement = insert(table)
+    new = statement.excluded
+    newer = new.last_at >= table.c.last_at
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.name, table.c.granularity, table.c.bucket_start],
+        set_={
+            "count": table.c.count + new.count,
+            "total": table.c.total + new.total,
+            "min_value": case(
+                (new.min_value < table.c.min_value, new.min_value),
+                else_=table.c.min_value,
+            ),
+            "max_value": case(
+                (new.max_value > table.c.max_value, new.max_value),
+                else_=table.c.max_value,
+            ),
+            "last_value": case((newer, new.last_value), else_=table.c.last_value),
+            "last_at": case((newer, new.last_at), else_=table.c.last_at),
+        },
+    )
+
+
+def backfill_rollups(connection: Connection) -> int:
+    """Fold every existing KPI into ``kpi_rollup`` (for databases from before it).
+
+    Returns:
+        Number of KPI values folded
+
+    """
+    statement = rollup_upsert_statement(connection.dialect.name)
+    result = connection.execution_options(yield_per=BACKFILL_BATCH_SIZE).execute(
+        select(Kpi.name, Kpi.value, Kpi.calculated_at),
+    )
+    folded = 0
+    for batch in result.mappings().partitions():
+        rows = rollup_rows(batch)
+        if rows:
+            connection.execute(statement, rows)
+        folded += len(batch)
+    return folded
+
+
+def history_statement(
+    name: str,
+    granularity: str,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """Select the rollups of one KPI over ``[since, until)`` in time order.
+
+    Raises:
+        ValueError: If ``granularity`` is not one of ``GRANULARITIES``
+
+    """
+    if granularity not in GRANULARITIES:
+        msg = f"Unknown granularity {granularity!r}, use one of {GRANULARITIES}"
+        raise ValueError(msg)
+    statement = select(KpiRollup).where(
+        KpiRollup.name == name,
+        KpiRollup.granularity == granularity,
+    )
+    if since is not None:
+        # The bucket containing ``since`` is included
+        statement = statement.where(
+            KpiRollup.bucket_start >= bucket_start(since, granularity),
+        )
+    if until is not None:
+        statement = statement.where(KpiRollup.bucket_start < until)
+    return statement.order_by(KpiRollup.bucket_start)
+
+
+def history_point(rollup: KpiRollup) -> dict[str, Any]:
+    """One point of a KPI history: bucket start and its statistics."""
+    return {
+        "bucket": rollup.bucket_start.isoformat(),
+        "count": rollup.count,
+        "min": rollup.min_value,
+        "max": rollup.max_value,
+        "avg": rollup.total / rollup.count,
+        "last": rollup.last_value,
+    }
@@ -0,0 +1,118 @@
+"""Run duration and throughput statistics aggregated in SQL.
+
+One statement per call groups the runs of a time window by output format or
+input file and returns run and failure counts, nearest-rank duration
+percentiles and rows per second. Percentiles use a window function, so only
+the aggregated rows leave the database. The window is located through the
+``run.timestamp`` index, so the cost grows with the runs in the window, not
+with the size of the ``run`` table.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import and_, case, func
+from sqlmodel import select
+
+from .models import Run, utcnow
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Row
+
+__all__ = [
+    "DEFAULT_STATS_WINDOW",
+    "PERCENTILES",
+    "STATS_GROUPS",
+    "stats_row",
+    "stats_statement",
+    "stats_window",
+]
+
+STATS_GROUPS = ("output_format", "csv_file")
+
+PERCENTILES = (50, 90, 99)
+
+DEFAULT_STATS_WINDOW = timedelta(days=7)
+
+
+def stats_window(
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> tuple[datetime, datetime]:
+    """Resolve ``[since, until)``, by default the ``DEFAULT_STATS_WINDOW`` to now."""
+    until = until or utcnow()
+    return since or until - DEFAULT_STATS_WINDOW, until
+
+
+def stats_statement(group_by: str, since: datetime, until: datetime):
+    """Select the statistics of the runs in ``[since, until)`` per group.
+
+    Durations and throughput are taken from completed runs; failures are
+    counted against all runs of the group.
+
+    Raises:
+        ValueError: If ``group_by`` is not one of ``STATS_GROUPS``
+
+    """
+    if group_by not in STATS_GROUPS:
+        msg = f"Unknown grouping {group_by!r}, use one of {STATS_GROUPS}"
+        raise ValueError(msg)
+    group = getattr(Run, group_by)
+    timed = and_(Run.status == "completed", Run.duration.is_not(None))
+    ranked = (
+        select(
+            group.label("key"),
+            Run.status,
+            Run.duration,
+            Run.rows_processed,
+            timed.label("timed"),
+            func.cume_dist()
+            .over(partition_by=[group, timed], order_by=Run.duration)
+            .label("cume_dist"),
+        )
+        .where(Run.timestamp >= since, Run.timestamp < until)
+        .subquery()
+    )
+    is_timed = ranked.c.timed.is_(True)
+    percentiles = [
+        # Nearest rank: the smallest duration with at least p% of the
+        # completed runs at or below it
+        func.min(
+            case(
+                (and_(is_timed, ranked.c.cume_dist >= p / 100), ranked.c.duration),
+            ),
+        ).label(f"p{p}")
+        for p in PERCENTILES
+    ]
+    with_rows = and_(is_timed, ranked.c.rows_processed.is_not(None))
+    return (
+        select(
+            ranked.c.key,
+            func.count().label("runs"),
+            func.count(case((ranked.c.status == "failed", 1))).label("failed"),
+            func.count(case((is_timed, 1))).label("completed"),
+            func.avg(case((is_timed, ranked.c.duration))).label("avg"),
+            *percentiles,
+            func.sum(case((with_rows, ranked.c.rows_processed))).label("rows"),
+            func.sum(case((with_rows, ranked.c.duration))).label("seconds"),
+        )
+        .group_by(ranked.c.key)
+        .order_by(func.count().desc(), ranked.c.key)
+    )
+
+
+def stats_row(row: Row) -> dict[str, Any]:
+    """Statistics of one group, from a row of ``stats_statement``."""
+    return {
+        "key": row.key,
+        "runs": row.runs,
+        "failed": row.failed,
+        "failure_rate": row.failed / row.runs,
+        "completed": row.completed,
+        "avg_duration": row.avg,
+        **{f"p{p}_duration": getattr(row, f"p{p}") for p in PERCENTILES},
+        "rows_processed": row.rows or 0,
+        "rows_per_second": row.rows / row.seconds if row.seconds else None,
+    }
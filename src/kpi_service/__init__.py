@@ -1,17 +1,23 @@
 """KPI Service package for CSV analysis."""
 
 from .kpi import (
+    build_kpi_aggregates,
     calculate_base_kpis,
     calculate_enhanced_kpis,
     calculate_sector_kpis,
     compute_all_kpis,
     compute_kpis,
+    count_market_cap_bands,
+    frame_to_records,
 )
 
 __all__ = [
+    "build_kpi_aggregates",
     "calculate_base_kpis",
     "calculate_enhanced_kpis",
     "calculate_sector_kpis",
     "compute_all_kpis",
     "compute_kpis",
+    "count_market_cap_bands",
+    "frame_to_records",
 ]
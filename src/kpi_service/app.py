@@ -1,18 +1,103 @@
+import asyncio
+import os
 import sys
-from io import StringIO
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 
-import pandas as pd
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # Add the csv_report module to the path
 sys.path.append(str(Path(__file__).parent.parent))
-from csv_report.database import DatabaseService
+from csv_report.async_database import AsyncDatabaseService
+from csv_report.db_init import dispose_async_engines, dispose_engines
+from csv_report.models import Job
+from csv_report.pagination import MAX_PAGE_SIZE, InvalidCursorError
+from csv_report.report.generate import render_report
+from csv_report.run_stats import stats_window
 
-from .kpi import compute_all_kpis, compute_kpis
+from .jobs import JobManager, JobQueueFullError, is_expired, job_result
+from .responses import KpiJSONResponse
+from .upload_cache import UploadCache, upload_cache_key
+from .workers import KpiWorkerPool, PoolBusyError
 
-app = FastAPI(title="CSV-KPI-Service")
+# Uploads are rejected with 413 as soon as more bytes than this arrive
+MAX_UPLOAD_BYTES = int(os.getenv("KPI_SERVICE_MAX_UPLOAD_BYTES", str(100 * 2**20)))
+
+# Endpoints receiving CSV uploads
+UPLOAD_PATHS = ("/upload", "/jobs")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the upload workers; release them and the database pools on shutdown.
+
+    Jobs left unfinished by a previous process of this host are marked
+    failed first.
+    """
+    await app.state.jobs.recover()
+    await app.state.upload_pool.start()
+    yield
+    app.state.upload_pool.shutdown()
+    await app.state.jobs.shutdown()
+    await dispose_async_engines()
+    dispose_engines()
+
+
+class UploadSizeLimitMiddleware:
+    """Reject upload bodies larger than ``app.state.max_upload_bytes``.
+
+    Applies to the ``UPLOAD_PATHS``. A declared Content-Length over the limit
+    is refused before the body is read; otherwise the received bytes are
+    counted while the multipart parser spools the upload, so a chunked
+    upload is cut off at the limit instead of first being written to disk
+    in full.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Pass requests on, counting the body bytes of uploads."""
+        # ``/upload/`` reaches the same endpoint as ``/upload``
+        path = scope.get("path", "").rstrip("/") or "/"
+        if scope["type"] != "http" or path not in UPLOAD_PATHS:
+            await self.app(scope, receive, send)
+            return
+        max_bytes = scope["app"].state.max_upload_bytes
+        detail = f"Datei zu groß (max. {max_bytes} Bytes)"
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length", b"").decode()
+        if declared.isdigit() and int(declared) > max_bytes:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app = FastAPI(
+    title="CSV-KPI-Service",
+    lifespan=lifespan,
+    default_response_class=KpiJSONResponse,
+)
+app.state.max_upload_bytes = MAX_UPLOAD_BYTES
+app.state.upload_pool = KpiWorkerPool.from_env()
+app.state.jobs = JobManager.from_env()
+app.state.upload_cache = UploadCache()
+app.add_middleware(UploadSizeLimitMiddleware)
 
 
 @app.get("/healthz")
@@ -25,30 +110,179 @@ async def health_check():
 async def upload_csv(file: Annotated[UploadFile, File()] = ...):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Nur CSV akzeptiert")
-    try:
-        contents = await file.read()
-        df = pd.read_csv(StringIO(contents.decode()))
+    cache = app.state.upload_cache
+    kpis = key = None
+    headers = {}
+    if cache.enabled:
+        # Same bytes and KPI code as an earlier upload: reuse its KPIs
+        key = await asyncio.to_thread(upload_cache_key, file.file)
+        kpis = await asyncio.to_thread(cache.get, key)
+        headers["X-Upload-Cache"] = "miss" if kpis is None else "hit"
+    if kpis is None:
+        kpis = await _compute_upload_kpis(file)
+        if key is not None:
+            await asyncio.to_thread(cache.put, key, kpis)
+    # Returned as a response so the KPIs skip jsonable_encoder
+    return KpiJSONResponse(
+        {
+            "filename": file.filename,
+            "basic_kpis": kpis["basic_kpis"],  # Legacy basic KPIs
+            "enhanced_kpis": kpis["enhanced_kpis"],  # New comprehensive KPIs
+        },
+        headers=headers,
+    )
 
-        # Use enhanced KPI calculation
-        all_kpis = compute_all_kpis(df)
 
-        return {
-            "filename": file.filename,
-            "basic_kpis": compute_kpis(df),  # Legacy basic KPIs
-            "enhanced_kpis": all_kpis,  # New comprehensive KPIs
-        }
+async def _compute_upload_kpis(file: UploadFile) -> dict:
+    try:
+        # Parsed chunk by chunk straight from the spooled upload file, on a
+        # worker so other requests are served meanwhile
+        return await app.state.upload_pool.upload_kpis(file.file)
+    except PoolBusyError:
+        raise HTTPException(
+            status_code=503,
+            detail="Zu viele Uploads in Bearbeitung, bitte später erneut versuchen",
+            headers={"Retry-After": "1"},
+        )
     except Exception as exc:
         raise HTTPException(status_code=422, detail=f"Parsing-Fehler: {exc}")
 
 
+@app.get("/upload/cache")
+async def get_upload_cache_stats():
+    """Hit and miss counters of this worker's /upload cache."""
+    return app.state.upload_cache.stats()
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: Annotated[UploadFile, File()] = ...):
+    """Accept a CSV and compute its KPIs in the background.
+
+    Returns the job id at once; poll ``status_url`` until the job is
+    completed, then fetch its result or rendered report.
+    """
+    if not file.filename.endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Nur CSV akzeptiert")
+    try:
+        job = await app.state.jobs.submit(file.filename, file.file)
+    except JobQueueFullError:
+        raise HTTPException(
+            status_code=429,
+            detail="Zu viele Jobs in Bearbeitung, bitte später erneut versuchen",
+            headers={"Retry-After": "5"},
+        )
+    return {"id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+
+async def _get_job(job_id: str) -> Job:
+    job = await AsyncDatabaseService().get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return None if value is None else value.isoformat()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status of a job and, once it is completed, its KPIs."""
+    job = await _get_job(job_id)
+    # Results past their expiry time are gone even if not yet swept
+    expired = is_expired(job)
+    summary = {
+        "id": job.id,
+        "filename": job.filename,
+        "status": "expired" if expired else job.status,
+        "created_at": _isoformat(job.created_at),
+        "started_at": _isoformat(job.started_at),
+        "finished_at": _isoformat(job.finished_at),
+        "expires_at": _isoformat(job.expires_at),
+        "error_message": job.error_message,
+        "result": None,
+        "report_url": None,
+    }
+    if job.status == "completed" and not expired:
+        result = job_result(job)
+        summary["result"] = {
+            "basic_kpis": result["basic_kpis"],
+            "enhanced_kpis": result["enhanced_kpis"],
+        }
+        summary["report_url"] = f"/jobs/{job.id}/report"
+    return KpiJSONResponse(summary)
+
+
+@app.get("/jobs/{job_id}/report")
+async def get_job_report(
+    job_id: str,
+    output_format: Literal["markdown", "html"] = "markdown",
+):
+    """Render the report of a completed job."""
+    job = await _get_job(job_id)
+    if is_expired(job):
+        raise HTTPException(
+            status_code=410,
+            detail=f"The result of job {job_id} has expired",
+        )
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} is {job.status}, not completed",
+        )
+
+    result = job_result(job)
+    payload = {**result["enhanced_kpis"], "report_sectors": result["report_sectors"]}
+    report = render_report(payload, output_format, generated_at=job.finished_at)
+    if output_format == "html":
+        return HTMLResponse(report)
+    return PlainTextResponse(report, media_type="text/markdown")
+
+
+def _run_summary(run) -> dict:
+    return {
+        "id": run.id,
+        "timestamp": run.timestamp.isoformat(),
+        "csv_file": run.csv_file,
+        "output_format": run.output_format,
+        "status": run.status,
+        "rows_processed": run.rows_processed,
+        "error_message": run.error_message,
+    }
+
+
+def _kpi_summary(kpi) -> dict:
+    return {
+        "name": kpi.name,
+        "value": kpi.value,
+        "unit": kpi.unit,
+        "description": kpi.description,
+        "calculated_at": kpi.calculated_at.isoformat(),
+    }
+
+
 @app.get("/runs")
-async def get_runs(limit: Optional[int] = 10, run_id: Optional[int] = None):
-    """Get CSV report generation runs from the database."""
-    db_service = DatabaseService()
+async def get_runs(
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = 10,
+    run_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    output_format: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    *,
+    include_kpis: bool = False,
+):
+    """Get CSV report generation runs from the database.
+
+    Runs are listed newest first, one page at a time; pass ``next_cursor``
+    of a page as ``cursor`` to get the next one.
+    """
+    db_service = AsyncDatabaseService()
 
     if run_id:
         # Return specific run details
-        run = db_service.get_run_by_id(run_id)
+        run = await db_service.get_run_by_id(run_id)
         if not run:
             raise HTTPException(
                 status_code=404,
@@ -56,44 +290,105 @@ async def get_runs(limit: Optional[int] = 10, run_id: Optional[int] = None):
             )
 
         # Get KPIs for this run
-        kpis = db_service.get_kpis_for_run(run.id)
+        kpis = await db_service.get_kpis_for_run(run.id)
 
         return {
-            "run": {
-                "id": run.id,
-                "timestamp": run.timestamp.isoformat(),
-                "csv_file": run.csv_file,
-                "output_format": run.output_format,
-                "status": run.status,
-                "rows_processed": run.rows_processed,
-                "error_message": run.error_message,
-            },
-            "kpis": [
-                {
-                    "name": kpi.name,
-                    "value": kpi.value,
-                    "unit": kpi.unit,
-                    "description": kpi.description,
-                    "calculated_at": kpi.calculated_at.isoformat(),
-                }
-                for kpi in kpis
-            ],
+            "run": _run_summary(run),
+            "kpis": [_kpi_summary(kpi) for kpi in kpis],
         }
-    # Return recent runs summary
-    runs = db_service.get_recent_runs(limit)
+    # Return one page of runs
+    try:
+        runs, next_cursor = await db_service.list_runs(
+            limit,
+            cursor=cursor,
+            status=status,
+            output_format=output_format,
+            since=since,
+            until=until,
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    summaries = [_run_summary(run) for run in runs]
+    if include_kpis:
+        # One query for the KPIs of the whole page
+        kpis = await db_service.get_kpis_for_runs([run.id for run in runs])
+        for summary in summaries:
+            summary["kpis"] = [_kpi_summary(kpi) for kpi in kpis[summary["id"]]]
+
+    return {
+        "runs": summaries,
+        "total_count": len(summaries),
+        "next_cursor": next_cursor,
+    }
+
 
+@app.get("/runs/stats")
+async def get_run_stats(
+    group_by: Literal["output_format", "csv_file"] = "output_format",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Get duration percentiles, rows per second and failure rate per group.
+
+    Aggregated in SQL over ``[since, until)``, by default the last 7 days.
+    """
+    since, until = stats_window(since, until)
+    groups = await AsyncDatabaseService().get_run_stats(group_by, since, until)
     return {
-        "runs": [
-            {
-                "id": run.id,
-                "timestamp": run.timestamp.isoformat(),
-                "csv_file": run.csv_file,
-                "output_format": run.output_format,
-                "status": run.status,
-                "rows_processed": run.rows_processed,
-                "error_message": run.error_message,
-            }
-            for run in runs
-        ],
-        "total_count": len(runs),
+        "group_by": group_by,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "groups": groups,
     }
+
+
+@app.get("/runs/{run_id}/report")
+async def get_run_report(
+    run_id: int,
+    output_format: Literal["markdown", "html"] = "markdown",
+):
+    """Render the report of a past run from its stored KPI payload.
+
+    The source CSV is not read, so reports of runs whose input has since
+    changed or disappeared can still be rendered, in either format.
+    """
+    db_service = AsyncDatabaseService()
+    run = await db_service.get_run_by_id(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail=f"Run with ID {run_id} not found")
+    try:
+        payload = await db_service.get_kpi_payload(run_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if payload is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Run {run_id} has no stored KPI payload",
+        )
+
+    report = render_report(payload, output_format, generated_at=run.timestamp)
+    if output_format == "html":
+        return HTMLResponse(report)
+    return PlainTextResponse(report, media_type="text/markdown")
+
+
+@app.get("/kpis/{name}/history")
+async def get_kpi_history(
+    name: str,
+    granularity: Literal["hour", "day", "week"] = "day",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Get the min/max/avg/last of a KPI per hour, day or week.
+
+    Read from the KPI rollups, so the cost depends on the number of buckets
+    in the range, not on the number of runs behind them.
+    """
+    history = await AsyncDatabaseService().get_kpi_history(
+        name,
+        granularity,
+        since=since,
+        until=until,
+    )
+    return {"name": name, "granularity": granularity, "points": history}
@@ -0,0 +1,254 @@
+"""Background KPI jobs behind ``POST /jobs``.
+
+Large uploads outlive proxy timeouts when computed within the request.
+``JobManager.submit`` instead saves the upload to ``KPI_SERVICE_JOB_DIR``,
+records a queued ``Job`` in run.db and returns at once; an asyncio task
+then computes the KPIs on a ``KpiWorkerPool`` (configured like the upload
+pool through ``KPI_SERVICE_JOB_EXECUTOR``, ``KPI_SERVICE_JOB_WORKERS`` and
+``KPI_SERVICE_JOB_QUEUE_DEPTH``) and stores the result on the job. Once the
+workers and the wait queue are full, ``submit`` raises ``JobQueueFullError``
+(429). Finished results are dropped after ``KPI_SERVICE_JOB_TTL`` seconds.
+
+Jobs run in the process that accepted them. When that process is gone,
+its queued and running jobs are marked failed by the next one starting on
+the same host (``recover``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any
+
+from csv_report.async_database import AsyncDatabaseService
+from csv_report.database import pack_kpi_payload
+from csv_report.models import utcnow
+
+from .workers import COPY_BUFFER_BYTES, KpiWorkerPool, upload_kpis
+
+if TYPE_CHECKING:
+    from csv_report.models import Job
+
+__all__ = [
+    "DEFAULT_JOB_TTL",
+    "JobManager",
+    "JobQueueFullError",
+    "compute_job",
+    "is_expired",
+    "job_result",
+]
+
+DEFAULT_JOB_TTL = timedelta(
+    seconds=int(os.getenv("KPI_SERVICE_JOB_TTL", str(24 * 3600))),
+)
+
+DEFAULT_JOB_DIR = Path(
+    os.getenv("KPI_SERVICE_JOB_DIR", Path(tempfile.gettempdir()) / "kpi_service_jobs"),
+)
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when a job is submitted while every worker and queue slot is taken."""
+
+
+def compute_job(path: str) -> dict[str, Any]:
+    """Compute the result of a job from its saved upload.
+
+    Returns:
+        ``basic_kpis`` and ``enhanced_kpis`` as returned by ``/upload``, plus
+        the ``report_sectors`` the report templates need
+
+    """
+    return upload_kpis(path, sectors=True)
+
+
+def job_result(job: Job) -> dict[str, Any] | None:
+    """Decompress the result of a completed job (None if there is none)."""
+    if job.result is None:
+        return None
+    return json.loads(zlib.decompress(job.result))
+
+
+def is_expired(job: Job, now: datetime | None = None) -> bool:
+    """Whether a job's result is gone or past its expiry time."""
+    if job.status == "expired":
+        return True
+    return job.expires_at is not None and job.expires_at <= (now or utcnow())
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process that owns a job may still be running it."""
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Another machine's jobs cannot be checked from here
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _save_upload(upload: IO[bytes], path: Path) -> None:
+    upload.seek(0)
+    with open(path, "wb") as copy:
+        shutil.copyfileobj(upload, copy, COPY_BUFFER_BYTES)
+
+
+class JobManager:
+    """Accepts jobs, runs them on a worker pool and records them in run.db."""
+
+    def __init__(
+        self,
+        pool: KpiWorkerPool,
+        database_url: str | None = None,
+        job_dir: Path | None = None,
+        ttl: timedelta = DEFAULT_JOB_TTL,
+    ) -> None:
+        self.pool = pool
+        self.database_url = database_url
+        self.job_dir = Path(job_dir or DEFAULT_JOB_DIR)
+        self.ttl = ttl
+        self.owner = _owner()
+        # Jobs accepted by this process that have not finished yet
+        self.active = 0
+        self._job_ids: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    @classmethod
+    def from_env(cls) -> JobManager:
+        """Manager with a pool configured by the ``KPI_SERVICE_JOB_*`` variables."""
+        return cls(KpiWorkerPool.from_env("KPI_SERVICE_JOB"))
+
+    @property
+    def capacity(self) -> int:
+        """Jobs that may be running or waiting at once."""
+        return self.pool.workers + self.pool.queue_depth
+
+    def database(self) -> AsyncDatabaseService:
+        """Service of the database the jobs are recorded in."""
+        return AsyncDatabaseService(self.database_url)
+
+    async def submit(self, filename: str, upload: IO[bytes]) -> Job:
+        """Save an upload, record it as a queued job and start computing it.
+
+        Raises:
+            JobQueueFullError: If ``capacity`` jobs are already unfinished
+
+        """
+        if self.active >= self.capacity:
+            msg = f"{self.active} jobs are already queued or running"
+            raise JobQueueFullError(msg)
+        self.active += 1
+        job_id = uuid.uuid4().hex
+        path = self.job_dir / f"{job_id}.csv"
+        try:
+            self.job_dir.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(_save_upload, upload, path)
+            job = await self.database().create_job(job_id, filename, self.owner)
+        except BaseException:
+            self.active -= 1
+            path.unlink(missing_ok=True)
+            raise
+        self._job_ids.add(job_id)
+        task = asyncio.create_task(self._run(job_id, path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        await self.database().expire_jobs()
+        return job
+
+    async def _run(self, job_id: str, path: Path) -> None:
+        """Compute a job on the pool and record its outcome."""
+        db = self.database()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores are bound to the loop they first wait on
+            self._loop, self._slots = loop, asyncio.Semaphore(self.pool.workers)
+        try:
+            # The job stays queued until one of the pool's workers is free
+            async with self._slots:
+                await db.update_job(
+                    job_id,
+                    status="running",
+                    started_at=utcnow(),
+                )
+                result = await self.pool.run(compute_job, str(path))
+            fields = {"status": "completed", "result": pack_kpi_payload(result)}
+        except Exception as exc:
+            fields = {"status": "failed", "error_message": str(exc)}
+        finally:
+            self.active -= 1
+            self._job_ids.discard(job_id)
+            path.unlink(missing_ok=True)
+        finished_at = utcnow()
+        await db.update_job(
+            job_id,
+            finished_at=finished_at,
+            expires_at=finished_at + self.ttl,
+            **fields,
+        )
+
+    async def recover(self) -> int:
+        """Fail the unfinished jobs of processes on this host that are gone.
+
+        Jobs recorded under this manager's own owner that it did not accept
+        count as gone too: after a container restart the service runs under
+        the PID of the process that recorded them (often PID 1).
+
+        Also expires the results of finished jobs past their expiry time.
+
+        Returns:
+            Number of jobs marked failed
+
+        """
+        db = self.database()
+        finished_at = utcnow()
+        failed = 0
+        for job in await db.get_unfinished_jobs():
+            if job.owner == self.owner:
+                if job.id in self._job_ids:
+                    continue
+            elif _owner_alive(job.owner):
+                continue
+            await db.update_job(
+                job.id,
+                status="failed",
+                error_message="The service stopped before the job finished",
+                finished_at=finished_at,
+                expires_at=finished_at + self.ttl,
+            )
+            failed += 1
+        await db.expire_jobs()
+        return failed
+
+    async def join(self) -> None:
+        """Wait until every job accepted so far has finished."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        """Cancel unfinished jobs and stop the workers.
+
+        Cancelled jobs stay queued or running in run.db until the next
+        process starting on this host marks them failed (see ``recover``).
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.pool.shutdown()
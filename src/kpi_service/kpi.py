@@ -2,36 +2,307 @@
 
 This module provides comprehensive KPI calculation functions for analyzing
 CSV data, particularly focused on S&P 500 companies data.
+
+All KPI dictionaries are derived from one set of shared aggregates (see
+``build_kpi_aggregates``), so the expensive ``groupby("Sector")`` and the
+global market cap statistics are only computed once per dataset.
 """
 
-from typing import Any
+from typing import Any, Optional
 
+import numpy as np
 import pandas as pd
 
 __all__ = [
+    "MARKET_CAP_BANDS",
+    "PERCENTILES",
+    "TECH_SECTORS",
+    "build_kpi_aggregates",
     "calculate_base_kpis",
     "calculate_enhanced_kpis",
     "calculate_sector_kpis",
     "compute_all_kpis",
     "compute_kpis",
+    "count_market_cap_bands",
+    "frame_to_records",
 ]
 
+# Sectors grouped as "technology" in the tech vs traditional comparison
+TECH_SECTORS = ["Technology", "Communication Services"]
+
+# Market cap quantiles reported in ``enhanced_kpis["percentiles"]``
+PERCENTILES = [0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+# Market cap bands as name -> (lower bound, upper bound) in USD. Lower bounds
+# are inclusive, upper bounds exclusive and ``None`` means unbounded. Bands may
+# overlap: "large" also counts the "mega" caps. Pass a different mapping (for
+# example with "nano" and "micro" bands) as ``market_cap_bands``.
+MarketCapBands = dict[str, tuple[Optional[float], Optional[float]]]
+
+MARKET_CAP_BANDS: MarketCapBands = {
+    "small": (None, 2e9),
+    "mid": (2e9, 10e9),
+    "large": (10e9, None),
+    "mega": (100e9, None),
+}
+
+TOP_COMPANIES = 10
+TOP_SECTORS = 5
+
+# Output key -> (source column, Python type) for the JSON-ready KPI lists
+SECTOR_FIELDS = {
+    "sector": ("Sector", str),
+    "avg_market_cap": ("avg_market_cap", float),
+    "median_market_cap": ("median_market_cap", float),
+    "company_count": ("company_count", int),
+}
+RANKING_FIELDS = {
+    **SECTOR_FIELDS,
+    "total_market_cap": ("total_market_cap", float),
+}
+COMPANY_FIELDS = {
+    "symbol": ("Symbol", str),
+    "shortname": ("Shortname", str),
+    "marketcap": ("Marketcap", float),
+    "marketcap_b": ("Marketcap_B", float),
+    "sector": ("Sector", str),
+}
+
+_NUMPY_DTYPES = {float: "float64", int: "int64", bool: "bool"}
+
+
+def _column_summary(df: pd.DataFrame) -> dict[str, Any]:
+    """Column count and rounded means of the numeric columns."""
+    return {
+        "count": len(df.columns),
+        "means": df.select_dtypes("number").mean().round(2).to_dict(),
+    }
+
+
+def compute_kpis(
+    df: Optional[pd.DataFrame] = None,
+    aggregates: Optional[dict[str, Any]] = None,
+) -> dict:
+    """Basic KPI calculation for quick analysis (legacy function).
+
+    Args:
+        df: DataFrame to summarize
+        aggregates: Precomputed result of ``build_kpi_aggregates`` (optional),
+            so the legacy KPIs come from the same pass as ``compute_all_kpis``
+
+    """
+    if aggregates is None:
+        aggregates = {"overall": {"row_count": len(df)}, "columns": _column_summary(df)}
+    columns = aggregates["columns"]
+    return {
+        "rows": aggregates["overall"]["row_count"],
+        "cols": columns["count"],
+        "means": dict(columns["means"]),
+    }
+
+
+def _column_values(column: pd.Series, kind: type) -> list[Any]:
+    """Convert a column to a list of plain Python values of type ``kind``."""
+    if kind is str:
+        return list(map(str, column.tolist()))
+    return column.to_numpy(dtype=_NUMPY_DTYPES[kind]).tolist()
+
+
+def frame_to_records(
+    frame: pd.DataFrame,
+    fields: dict[str, tuple[str, type]],
+) -> list[dict[str, Any]]:
+    """Materialize a DataFrame as a list of JSON-ready dictionaries.
+
+    Each column is converted in bulk (no per-row ``Series`` boxing), so this
+    is much cheaper than looping over ``DataFrame.iterrows()``.
+
+    Args:
+        frame: DataFrame to convert (the index is ignored)
+        fields: Mapping of output key to ``(column, type)`` where type is one
+            of ``str``, ``float``, ``int`` or ``bool``; the output keys keep
+            this order
+
+    Returns:
+        One dictionary per row with plain Python values
+
+    """
+    keys = list(fields)
+    columns = [_column_values(frame[column], kind) for column, kind in fields.values()]
+    return [dict(zip(keys, values)) for values in zip(*columns)]
+
+
+def _overall_stats(df: pd.DataFrame) -> dict[str, Any]:
+    """Global market cap statistics for the whole dataset."""
+    marketcap = df["Marketcap"]
+    valid = int(marketcap.count())
+    percentiles_raw = marketcap.quantile(PERCENTILES)
+    return {
+        "row_count": len(df),
+        "market_cap_count": valid,
+        "avg_market_cap": float(marketcap.mean()) if valid else 0.0,
+        "median_market_cap": float(marketcap.median()) if valid else 0.0,
+        "percentiles": {
+            f"p{int(k*100)}": float(v) if not pd.isna(v) else 0.0
+            for k, v in percentiles_raw.items()
+        },
+    }
+
+
+def _sector_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-sector count/sum/mean/median table (rows without a sector included)."""
+    return df.groupby("Sector", dropna=False, observed=True).agg(
+        row_count=("Marketcap", "size"),
+        company_count=("Marketcap", "count"),
+        listed_count=("Shortname", "count"),
+        total_market_cap=("Marketcap", "sum"),
+        avg_market_cap=("Marketcap", "mean"),
+        median_market_cap=("Marketcap", "median"),
+    )
+
+
+def _band_edges(bands: MarketCapBands) -> list:
+    """Sorted finite thresholds used by a set of market cap bands."""
+    for name, (lower, upper) in bands.items():
+        if lower is not None and upper is not None and lower >= upper:
+            msg = f"Market cap band '{name}' has lower bound >= upper bound"
+            raise ValueError(msg)
+    return sorted(
+        {bound for pair in bands.values() for bound in pair if bound is not None},
+    )
+
+
+def _count_bands(
+    bin_counts: np.ndarray,
+    edges: list,
+    bands: MarketCapBands,
+) -> dict[str, int]:
+    """Sum the per-bin counts into the (possibly overlapping) bands."""
+    counts = {}
+    for name, (lower, upper) in bands.items():
+        start = 0 if lower is None else edges.index(lower) + 1
+        stop = len(edges) + 1 if upper is None else edges.index(upper) + 1
+        counts[name] = int(bin_counts[start:stop].sum())
+    return counts
+
+
+def count_market_cap_bands(
+    marketcap: pd.Series,
+    bands: Optional[MarketCapBands] = None,
+) -> dict[str, int]:
+    """Count companies per market cap band in one pass over ``Marketcap``.
+
+    Every value is assigned to the interval between two consecutive
+    thresholds with ``searchsorted``; band counts are sums over those
+    intervals, so no filtered copies of the data are created.
+
+    Args:
+        marketcap: Market cap column
+        bands: Band thresholds (defaults to ``MARKET_CAP_BANDS``)
+
+    Returns:
+        Dictionary mapping band name to company count
+
+    """
+    if bands is None:
+        bands = MARKET_CAP_BANDS
+    edges = _band_edges(bands)
+    values = marketcap.to_numpy(dtype="float64", na_value=np.nan)
+    bins = np.searchsorted(np.asarray(edges, dtype="float64"), values, side="right")
+    bin_counts = np.bincount(bins, minlength=len(edges) + 1)
+    # NaN sorts after every threshold; missing market caps belong to no band
+    bin_counts[-1] -= int(np.isnan(values).sum())
+    return _count_bands(bin_counts, edges, bands)
+
+
+def build_kpi_aggregates(
+    df: pd.DataFrame,
+    market_cap_bands: Optional[MarketCapBands] = None,
+) -> dict[str, Any]:
+    """Compute the shared aggregates every KPI dictionary is derived from.
+
+    The sector table is built with a single ``groupby("Sector")`` and the
+    global statistics with a single pass over ``Marketcap``; pass the result
+    to ``compute_all_kpis`` or ``generate_report`` to avoid recomputing them.
+
+    Args:
+        df: DataFrame containing S&P 500 companies data
+        market_cap_bands: Band thresholds (defaults to ``MARKET_CAP_BANDS``)
+
+    Returns:
+        Dictionary containing:
+        - overall: Global row count, mean, median and percentiles
+        - sectors: Per-sector table indexed by sector name
+        - unassigned: Counts and sums for rows without a sector
+        - top_companies: The largest companies by market cap
+        - market_cap_bands: Company count per market cap band
+        - columns: Column count and numeric column means for ``compute_kpis``
+
+    """
+    table = _sector_table(df)
+    named = table.index.notna()
+    missing = table[~named]
 
-def compute_kpis(df: pd.DataFrame) -> dict:
-    """Basic KPI calculation for quick analysis (legacy function)."""
-    numeric = df.select_dtypes("number")
     return {
-        "rows": len(df),
-        "cols": len(df.columns),
-        "means": numeric.mean().round(2).to_dict(),
+        "overall": _overall_stats(df),
+        "sectors": table[named],
+        "unassigned": {
+            "row_count": int(missing["row_count"].sum()),
+            "company_count": int(missing["company_count"].sum()),
+            "total_market_cap": float(missing["total_market_cap"].sum()),
+        },
+        "top_companies": df.nlargest(TOP_COMPANIES, "Marketcap")[
+            ["Symbol", "Shortname", "Marketcap", "Sector"]
+        ],
+        "market_cap_bands": count_market_cap_bands(df["Marketcap"], market_cap_bands),
+        "columns": _column_summary(df),
+    }
+
+
+def _group_totals(
+    sectors: pd.DataFrame,
+    extra: Optional[dict[str, Any]] = None,
+) -> tuple[int, int, float]:
+    """Sum row count, valid count and market cap over a set of sector rows."""
+    rows = int(sectors["row_count"].sum())
+    valid = int(sectors["company_count"].sum())
+    total = float(sectors["total_market_cap"].sum())
+    if extra is not None:
+        rows += extra["row_count"]
+        valid += extra["company_count"]
+        total += extra["total_market_cap"]
+    return rows, valid, total
+
+
+def _market_cap_distribution(aggregates: dict[str, Any]) -> dict[str, Any]:
+    """Counts and percentages per market cap band (counts first).
+
+    Percentages are NaN when there are no rows.
+    """
+    bands = aggregates["market_cap_bands"]
+    rows = aggregates["overall"]["row_count"]
+    distribution: dict[str, Any] = {
+        f"{name}_cap_count": count for name, count in bands.items()
     }
+    for name, count in bands.items():
+        distribution[f"{name}_cap_pct"] = float(_mean(count * 100, rows))
+    return distribution
+
+
+def _mean(total: float, count: int) -> float:
+    """Mean of a sum over ``count`` values (NaN when nothing was counted)."""
+    return total / count if count else float("nan")
 
 
-def calculate_base_kpis(df: pd.DataFrame) -> dict[str, Any]:
+def calculate_base_kpis(
+    df: Optional[pd.DataFrame] = None,
+    aggregates: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
     """Calculate base KPIs for the entire dataset.
 
     Args:
         df: DataFrame containing S&P 500 companies data
+        aggregates: Precomputed result of ``build_kpi_aggregates`` (optional)
 
     Returns:
         Dictionary containing:
@@ -40,22 +311,23 @@ def calculate_base_kpis(df: pd.DataFrame) -> dict[str, Any]:
         - median_market_cap: Median market capitalization
 
     """
+    overall = aggregates["overall"] if aggregates is not None else _overall_stats(df)
     return {
-        "total_companies": len(df),
-        "avg_market_cap": (
-            float(df["Marketcap"].mean()) if not df["Marketcap"].isna().all() else 0.0
-        ),
-        "median_market_cap": (
-            float(df["Marketcap"].median()) if not df["Marketcap"].isna().all() else 0.0
-        ),
+        "total_companies": overall["row_count"],
+        "avg_market_cap": overall["avg_market_cap"],
+        "median_market_cap": overall["median_market_cap"],
     }
 
 
-def calculate_sector_kpis(df: pd.DataFrame) -> dict[str, Any]:
+def calculate_sector_kpis(
+    df: Optional[pd.DataFrame] = None,
+    aggregates: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
     """Calculate KPIs for each sector.
 
     Args:
         df: DataFrame containing S&P 500 companies data
+        aggregates: Precomputed result of ``build_kpi_aggregates`` (optional)
 
     Returns:
         Dictionary with sector statistics containing:
@@ -63,178 +335,126 @@ def calculate_sector_kpis(df: pd.DataFrame) -> dict[str, Any]:
         company_count
 
     """
-    sector_stats = df.groupby("Sector").agg({"Marketcap": ["mean", "median", "count"]})
-
-    # Flatten column names
-    sector_stats.columns = ["avg_market_cap", "median_market_cap", "company_count"]
-
-    sector_stats = sector_stats.reset_index()
+    if aggregates is not None:
+        sector_stats = aggregates["sectors"]
+    else:
+        sector_stats = _sector_table(df)
+        sector_stats = sector_stats[sector_stats.index.notna()]
 
     # Convert to list of dictionaries for JSON serialization
-    sectors = []
-    for _, row in sector_stats.iterrows():
-        sectors.append(
-            {
-                "sector": str(row["Sector"]),
-                "avg_market_cap": float(row["avg_market_cap"]),
-                "median_market_cap": float(row["median_market_cap"]),
-                "company_count": int(row["company_count"]),
-            },
-        )
+    sectors = frame_to_records(sector_stats.reset_index(), SECTOR_FIELDS)
 
     return {"sectors": sectors}
 
 
-def calculate_enhanced_kpis(df: pd.DataFrame) -> dict[str, Any]:
+def calculate_enhanced_kpis(
+    df: Optional[pd.DataFrame] = None,
+    aggregates: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
     """Calculate enhanced KPIs including top companies, market cap distribution, and
     percentiles.
 
     Args:
         df: DataFrame containing S&P 500 companies data
+        aggregates: Precomputed result of ``build_kpi_aggregates`` (optional)
 
     Returns:
         Dictionary containing comprehensive analysis
 
     """
+    if aggregates is None:
+        aggregates = build_kpi_aggregates(df)
+
     # Top 10 companies by market cap
-    top_companies_df = df.nlargest(10, "Marketcap")[
-        ["Symbol", "Shortname", "Marketcap", "Sector"]
-    ].copy()
+    top_companies_df = aggregates["top_companies"].copy()
     top_companies_df["Marketcap_B"] = (
         top_companies_df["Marketcap"] / 1e9
     )  # Convert to billions
 
     # Convert to list of dictionaries for JSON serialization
-    top_companies = []
-    for _, row in top_companies_df.iterrows():
-        top_companies.append(
-            {
-                "symbol": str(row["Symbol"]),
-                "shortname": str(row["Shortname"]),
-                "marketcap": float(row["Marketcap"]),
-                "marketcap_b": float(row["Marketcap_B"]),
-                "sector": str(row["Sector"]),
-            },
-        )
-
-    # Market cap percentiles
-    percentiles_raw = df["Marketcap"].quantile([0.25, 0.5, 0.75, 0.9, 0.95, 0.99])
-    percentiles = {
-        f"p{int(k*100)}": float(v) if not pd.isna(v) else 0.0
-        for k, v in percentiles_raw.items()
-    }
-
-    # Market cap distribution (Small: <$2B, Mid: $2B-$10B, Large: >$10B)
-    small_cap = df[df["Marketcap"] < 2e9]
-    mid_cap = df[(df["Marketcap"] >= 2e9) & (df["Marketcap"] < 10e9)]
-    large_cap = df[df["Marketcap"] >= 10e9]
-    mega_cap = df[df["Marketcap"] >= 100e9]  # $100B+
+    top_companies = frame_to_records(top_companies_df, COMPANY_FIELDS)
 
     # Sector rankings
+    sectors = aggregates["sectors"]
     sector_rankings_df = (
-        df.groupby("Sector")
-        .agg({"Marketcap": ["mean", "median", "count", "sum"]})
+        sectors[
+            [
+                "avg_market_cap",
+                "median_market_cap",
+                "company_count",
+                "total_market_cap",
+            ]
+        ]
         .round(2)
+        .sort_values("avg_market_cap", ascending=False)
+        .reset_index()
     )
-    sector_rankings_df.columns = [
-        "avg_market_cap",
-        "median_market_cap",
-        "company_count",
-        "total_market_cap",
-    ]
-    sector_rankings_df = sector_rankings_df.sort_values(
-        "avg_market_cap",
-        ascending=False,
-    ).reset_index()
 
     # Convert to list of dictionaries for JSON serialization
-    sector_rankings = []
-    for _, row in sector_rankings_df.iterrows():
-        sector_rankings.append(
-            {
-                "sector": str(row["Sector"]),
-                "avg_market_cap": float(row["avg_market_cap"]),
-                "median_market_cap": float(row["median_market_cap"]),
-                "company_count": int(row["company_count"]),
-                "total_market_cap": float(row["total_market_cap"]),
-            },
-        )
-
-    # Technology vs Traditional sectors
-    tech_sectors = ["Technology", "Communication Services"]
-    tech_companies = df[df["Sector"].isin(tech_sectors)]
-    traditional_companies = df[~df["Sector"].isin(tech_sectors)]
+    sector_rankings = frame_to_records(sector_rankings_df, RANKING_FIELDS)
+
+    # Technology vs Traditional sectors (rows without a sector count as
+    # traditional)
+    is_tech = sectors.index.isin(TECH_SECTORS)
+    tech_rows, tech_valid, tech_total = _group_totals(sectors[is_tech])
+    trad_rows, trad_valid, trad_total = _group_totals(
+        sectors[~is_tech],
+        aggregates["unassigned"],
+    )
 
     # Sector concentration (top 5 sectors by market cap)
-    top_sectors_by_market_cap_df = sector_rankings_df.nlargest(5, "total_market_cap")
-    top_sectors_by_market_cap = []
-    for _, row in top_sectors_by_market_cap_df.iterrows():
-        top_sectors_by_market_cap.append(
-            {
-                "sector": str(row["Sector"]),
-                "avg_market_cap": float(row["avg_market_cap"]),
-                "median_market_cap": float(row["median_market_cap"]),
-                "company_count": int(row["company_count"]),
-                "total_market_cap": float(row["total_market_cap"]),
-            },
-        )
+    top_sectors_by_market_cap_df = sector_rankings_df.nlargest(
+        TOP_SECTORS,
+        "total_market_cap",
+    )
+    top_sectors_by_market_cap = frame_to_records(
+        top_sectors_by_market_cap_df,
+        RANKING_FIELDS,
+    )
 
     return {
         "top_companies": top_companies,
-        "percentiles": percentiles,
-        "market_cap_distribution": {
-            "small_cap_count": len(small_cap),
-            "mid_cap_count": len(mid_cap),
-            "large_cap_count": len(large_cap),
-            "mega_cap_count": len(mega_cap),
-            "small_cap_pct": float(len(small_cap) / len(df) * 100),
-            "mid_cap_pct": float(len(mid_cap) / len(df) * 100),
-            "large_cap_pct": float(len(large_cap) / len(df) * 100),
-            "mega_cap_pct": float(len(mega_cap) / len(df) * 100),
-        },
+        "percentiles": dict(aggregates["overall"]["percentiles"]),
+        "market_cap_distribution": _market_cap_distribution(aggregates),
         "sector_rankings": sector_rankings,
         "tech_vs_traditional": {
-            "tech_companies": len(tech_companies),
-            "traditional_companies": len(traditional_companies),
-            "tech_market_cap": (
-                float(tech_companies["Marketcap"].sum())
-                if len(tech_companies) > 0
-                else 0.0
-            ),
-            "traditional_market_cap": (
-                float(traditional_companies["Marketcap"].sum())
-                if len(traditional_companies) > 0
-                else 0.0
-            ),
+            "tech_companies": tech_rows,
+            "traditional_companies": trad_rows,
+            "tech_market_cap": tech_total if tech_rows > 0 else 0.0,
+            "traditional_market_cap": trad_total if trad_rows > 0 else 0.0,
             "tech_avg_market_cap": (
-                float(tech_companies["Marketcap"].mean())
-                if len(tech_companies) > 0
-                else 0.0
+                _mean(tech_total, tech_valid) if tech_rows > 0 else 0.0
             ),
             "traditional_avg_market_cap": (
-                float(
-                    traditional_companies["Marketcap"].mean(),
-                )
-                if len(traditional_companies) > 0
-                else 0.0
+                _mean(trad_total, trad_valid) if trad_rows > 0 else 0.0
             ),
         },
         "top_sectors_by_market_cap": top_sectors_by_market_cap,
     }
 
 
-def compute_all_kpis(df: pd.DataFrame) -> dict[str, Any]:
+def compute_all_kpis(
+    df: Optional[pd.DataFrame] = None,
+    aggregates: Optional[dict[str, Any]] = None,
+    market_cap_bands: Optional[MarketCapBands] = None,
+) -> dict[str, Any]:
     """Compute all KPIs and return them in a structured format.
 
     Args:
         df: DataFrame containing S&P 500 companies data
+        aggregates: Precomputed result of ``build_kpi_aggregates`` (optional)
+        market_cap_bands: Band thresholds used when building the aggregates
+            (defaults to ``MARKET_CAP_BANDS``)
 
     Returns:
         Dictionary containing both base KPIs and sector KPIs
 
     """
+    if aggregates is None:
+        aggregates = build_kpi_aggregates(df, market_cap_bands)
+
     return {
-        "base_kpis": calculate_base_kpis(df),
-        "sector_kpis": calculate_sector_kpis(df),
-        "enhanced_kpis": calculate_enhanced_kpis(df),
+        "base_kpis": calculate_base_kpis(aggregates=aggregates),
+        "sector_kpis": calculate_sector_kpis(aggregates=aggregates),
+        "enhanced_kpis": calculate_enhanced_kpis(aggregates=aggregates),
     }
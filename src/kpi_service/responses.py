@@ -0,0 +1,58 @@
+"""JSON responses of the KPI service, serialized with orjson when available.
+
+Returned from a handler, ``KpiJSONResponse`` also skips FastAPI's
+``jsonable_encoder``, which walks every value of the nested KPI dictionaries
+in Python before they are serialized. KPI payloads only hold dicts, lists,
+strings, numbers and None, so they need no conversion. orjson writes NaN
+and infinite floats as ``null``; without orjson the standard library is
+used, which refuses them like Starlette's ``JSONResponse``.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# Optional import for faster JSON serialization
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+__all__ = [
+    "ORJSON_AVAILABLE",
+    "KpiJSONResponse",
+    "dumps",
+    "loads",
+]
+
+
+def dumps(content: object) -> bytes:
+    """Serialize ``content`` to compact UTF-8 JSON."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+def loads(data: bytes) -> dict[str, Any]:
+    """Parse a JSON object written by ``dumps``."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class KpiJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered by ``dumps``."""
+
+    def render(self, content: object) -> bytes:
+        """Serialize the response body with ``dumps``."""
+        return dumps(content)
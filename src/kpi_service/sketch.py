@@ -0,0 +1,242 @@
+"""Bounded-memory, mergeable quantile sketch.
+
+The sketch is a simplified KLL compactor stack: values land on level 0 and,
+whenever a level grows past ``capacity`` items, it is sorted and every other
+item is promoted to the next level with twice the weight. Memory therefore
+grows with ``capacity * log2(n / capacity)`` instead of ``n``.
+
+As long as no compaction has happened (at most ``capacity`` values seen) the
+sketch still holds every value and its quantiles are exact and identical to
+``pandas.Series.quantile`` / ``median``. Beyond that the rank error is
+roughly ``log2(n / capacity) / capacity``.
+
+Values can also be removed again (for incremental deltas): an exact sketch
+deletes them the next time it is read, a compacted one records them in a
+second sketch whose ranks are subtracted at query time. Either way a removal
+costs time in the size of the removed values, not of the sketch.
+
+``to_dict`` stores every level as the base64 of its float64 bytes, and
+``bounded`` compacts a copy to a fixed capacity, so saved sketches stay small
+however many values they summarize.
+"""
+
+from __future__ import annotations
+
+import base64
+import sys
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from numpy.typing import ArrayLike
+
+__all__ = ["DEFAULT_CAPACITY", "EXACT_CAPACITY", "QuantileSketch"]
+
+DEFAULT_CAPACITY = 8192
+
+# Capacity of a sketch that never compacts: it keeps every value, so its
+# quantiles stay exact at the cost of memory linear in the values seen
+EXACT_CAPACITY = sys.maxsize
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch over a stream of floats."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        if capacity < 2:
+            msg = "Sketch capacity must be at least 2"
+            raise ValueError(msg)
+        self.capacity = capacity
+        self.count = 0
+        self.levels: list[np.ndarray] = [np.empty(0, dtype="float64")]
+        self._compactions = 0
+        # Values removed after compaction, subtracted from ranks at query time
+        self.removed: QuantileSketch | None = None
+        # Values removed from an exact sketch, deleted by ``settle``
+        self._pending: list[np.ndarray] = []
+
+    @property
+    def is_exact(self) -> bool:
+        """Whether exactly the current values are held (quantiles are exact)."""
+        return len(self.levels) == 1 and self.removed is None
+
+    @staticmethod
+    def _clean(values: ArrayLike) -> np.ndarray:
+        """Values as a float array without NaN."""
+        values = np.asarray(values, dtype="float64")
+        return values[~np.isnan(values)]
+
+    def update(self, values: ArrayLike) -> None:
+        """Add values to the sketch (NaN values are ignored)."""
+        values = self._clean(values)
+        if values.size == 0:
+            return
+        self.count += int(values.size)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def remove(self, values: ArrayLike) -> None:
+        """Remove values that were previously added (NaN values are ignored).
+
+        An exact sketch only queues the values; they are deleted together the
+        next time the sketch is read, merged or compacted.
+        """
+        values = self._clean(values)
+        if values.size == 0:
+            return
+        if self.is_exact:
+            self._pending.append(values)
+        else:
+            if self.removed is None:
+                self.removed = QuantileSketch(self.capacity)
+            self.removed.update(values)
+        self.count -= int(values.size)
+
+    def settle(self) -> None:
+        """Delete the queued removals from an exact sketch.
+
+        Raises:
+            ValueError: If the sketch does not hold one of the removed values
+
+        """
+        if not self._pending:
+            return
+        removed = np.concatenate(self._pending)
+        self._pending = []
+        held, held_counts = np.unique(self.levels[0], return_counts=True)
+        gone, gone_counts = np.unique(removed, return_counts=True)
+        positions = np.searchsorted(held, gone)
+        found = positions < held.size
+        found[found] = held[positions[found]] == gone[found]
+        if not found.all():
+            msg = "Cannot remove values that were never added to the sketch"
+            raise ValueError(msg)
+        held_counts[positions] -= gone_counts
+        if (held_counts < 0).any():
+            msg = "Cannot remove values that were never added to the sketch"
+            raise ValueError(msg)
+        self.levels[0] = np.repeat(held, held_counts)
+
+    def merge(self, other: QuantileSketch) -> None:
+        """Merge another sketch into this one."""
+        self.settle()
+        other.settle()
+        self.count += other.count
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0, dtype="float64"))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        if other.removed is not None:
+            if self.removed is None:
+                self.removed = QuantileSketch(self.capacity)
+            self.removed.merge(other.removed)
+        self._compress()
+
+    def _compress(self) -> None:
+        """Promote half of every over-full level to the next level."""
+        if self._pending and self.levels[0].size > self.capacity:
+            self.settle()
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.capacity:
+                items = np.sort(items)
+                # Keep one item back when the level has an odd size
+                keep, items = items[: items.size % 2], items[items.size % 2 :]
+                # Alternate the promoted half so the rounding errors cancel out
+                promoted = items[self._compactions % 2 :: 2]
+                self._compactions += 1
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype="float64"))
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted],
+                )
+            level += 1
+
+    def weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        """All retained items sorted, with their cumulative weights."""
+        self.settle()
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(level.size, 2**i, dtype="int64")
+                for i, level in enumerate(self.levels)
+            ],
+        )
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs: list[float]) -> list[float]:
+        """Return the value at each quantile in ``qs`` (NaN when empty)."""
+        self.settle()
+        if self.count == 0:
+            return [float("nan")] * len(qs)
+        if self.is_exact:
+            return [float(v) for v in np.quantile(self.levels[0], qs)]
+        items, cumulative = self.weighted_items()
+        if self.removed is not None and self.removed.count:
+            gone, gone_cumulative = self.removed.weighted_items()
+            below = np.searchsorted(gone, items, side="right")
+            ranks = np.where(below > 0, gone_cumulative[below - 1], 0)
+            cumulative = np.maximum.accumulate(cumulative - ranks)
+        total = self.count
+        positions = np.searchsorted(cumulative, np.asarray(qs) * total, side="left")
+        positions = np.clip(positions, 0, items.size - 1)
+        return [float(items[p]) for p in positions]
+
+    def quantile(self, q: float) -> float:
+        """Return the value at quantile ``q``."""
+        return self.quantiles([q])[0]
+
+    def median(self) -> float:
+        """Return the median (identical to ``pandas`` while exact)."""
+        self.settle()
+        if self.count and self.is_exact:
+            return float(np.median(self.levels[0]))
+        return self.quantile(0.5)
+
+    def bounded(self, capacity: int = DEFAULT_CAPACITY) -> QuantileSketch:
+        """Copy of the sketch compacted to at most ``capacity`` items per level."""
+        sketch = QuantileSketch(min(capacity, self.capacity))
+        sketch.merge(self)
+        return sketch
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the sketch to JSON-compatible types.
+
+        Levels are stored as the base64 of their little-endian float64 bytes.
+        """
+        self.settle()
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "compactions": self._compactions,
+            "levels": [
+                base64.b64encode(level.astype("<f8").tobytes()).decode("ascii")
+                for level in self.levels
+            ],
+            "removed": self.removed.to_dict() if self.removed is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> QuantileSketch:
+        """Restore a sketch serialized with ``to_dict``.
+
+        Levels saved as lists of floats by earlier versions are read as well.
+        """
+        sketch = cls(data["capacity"])
+        sketch.count = data["count"]
+        sketch._compactions = data["compactions"]
+        sketch.levels = [
+            (
+                np.frombuffer(base64.b64decode(level), dtype="<f8").astype("float64")
+                if isinstance(level, str)
+                else np.asarray(level, dtype="float64")
+            )
+            for level in data["levels"]
+        ]
+        if data.get("removed") is not None:
+            sketch.removed = cls.from_dict(data["removed"])
+        return sketch
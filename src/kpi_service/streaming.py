@@ -0,0 +1,411 @@
+"""Out-of-core KPI aggregation over chunks of a CSV file.
+
+``KpiAccumulator`` keeps mergeable partial aggregates, so a file can be fed
+through it chunk by chunk (or partitions can be aggregated separately and
+merged) while memory stays flat. ``to_aggregates`` returns the same structure
+as ``build_kpi_aggregates``, so ``compute_all_kpis`` and ``generate_report``
+work unchanged on top of it.
+
+The accumulator also supports removing rows again and can be saved with
+``to_state`` / ``from_state``, which lets ``csv-report update`` apply small
+added/removed delta files to the state of an earlier run instead of
+re-aggregating the whole dataset.
+
+Exactness per KPI compared to loading the whole file:
+
+========================================  ===================================
+KPI                                       Result
+========================================  ===================================
+total_companies, company counts           exact
+avg/total market cap (overall, sector,    exact (up to floating-point
+tech vs traditional)                      summation order)
+top_companies, sector rankings order      exact
+market_cap_distribution                   exact
+median_market_cap (overall and sector)    approximate, exact while a sketch
+                                          holds <= ``sketch_capacity`` values
+percentiles (p25-p99)                     approximate, same rule as medians
+========================================  ===================================
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import pandas as pd
+
+from .kpi import (
+    MARKET_CAP_BANDS,
+    PERCENTILES,
+    TOP_COMPANIES,
+    MarketCapBands,
+    compute_kpis,
+    count_market_cap_bands,
+)
+from .sketch import DEFAULT_CAPACITY, QuantileSketch
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = [
+    "IncompleteStateError",
+    "KpiAccumulator",
+    "aggregate_chunks",
+    "summarize_chunks",
+]
+
+TOP_COLUMNS = ["Symbol", "Shortname", "Marketcap", "Sector"]
+SECTOR_COUNTERS = ["row_count", "company_count", "listed_count"]
+
+# Top companies kept as candidates, so removed leaders can be replaced
+DEFAULT_TOP_CANDIDATES = 100
+
+
+class IncompleteStateError(ValueError):
+    """Raised when a removal delta cannot be applied to the saved state."""
+
+
+class KpiAccumulator:
+    """Mergeable partial aggregates for the KPIs of ``compute_all_kpis``."""
+
+    def __init__(
+        self,
+        market_cap_bands: MarketCapBands | None = None,
+        sketch_capacity: int = DEFAULT_CAPACITY,
+        top_candidates: int = DEFAULT_TOP_CANDIDATES,
+    ) -> None:
+        self.market_cap_bands = (
+            market_cap_bands if market_cap_bands is not None else MARKET_CAP_BANDS
+        )
+        self.sketch_capacity = sketch_capacity
+        self.top_candidates = max(top_candidates, TOP_COMPANIES)
+        self.row_count = 0
+        self.market_cap_count = 0
+        self.market_cap_sum = 0.0
+        self.market_cap = QuantileSketch(sketch_capacity)
+        # Sector name (None for rows without a sector) -> partial aggregates
+        self.sectors: dict[str | None, dict[str, Any]] = {}
+        self.top_companies = pd.DataFrame(columns=TOP_COLUMNS)
+        self.band_counts = dict.fromkeys(self.market_cap_bands, 0)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        market_cap_bands: MarketCapBands | None = None,
+    ) -> KpiAccumulator:
+        """Aggregate a whole DataFrame in one pass.
+
+        The sketches are sized to hold every value, so ``to_aggregates``
+        gives exactly the KPIs of ``build_kpi_aggregates(df)`` and the state
+        can be saved for later deltas without aggregating the frame twice
+        (``to_state`` compacts the sketches it saves).
+        """
+        accumulator = cls(market_cap_bands, max(DEFAULT_CAPACITY, len(df)))
+        accumulator.update(df)
+        return accumulator
+
+    def _sector(self, name: str | None) -> dict[str, Any]:
+        """Partial aggregates of one sector, created on first use."""
+        if name not in self.sectors:
+            self.sectors[name] = {
+                "row_count": 0,
+                "company_count": 0,
+                "listed_count": 0,
+                "total_market_cap": 0.0,
+                "sketch": QuantileSketch(self.sketch_capacity),
+            }
+        return self.sectors[name]
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk of rows into the aggregates."""
+        self._apply(chunk, 1)
+        if not chunk.empty:
+            candidates = chunk.nlargest(self.top_candidates, "Marketcap")
+            self._merge_top(candidates[TOP_COLUMNS])
+
+    def remove(self, chunk: pd.DataFrame) -> None:
+        """Take rows that were previously added back out of the aggregates.
+
+        Raises:
+            IncompleteStateError: If so many of the largest companies are
+                removed that the top 10 can no longer be derived
+
+        """
+        self._apply(chunk, -1)
+        if chunk.empty or self.top_companies.empty:
+            return
+        top = self.top_companies.reset_index(drop=True)
+        keep = np.ones(len(top), dtype=bool)
+        for row in chunk[TOP_COLUMNS].itertuples(index=False):
+            matches = keep & _matches(top, row)
+            if matches.any():
+                keep[matches.argmax()] = False
+        self.top_companies = top[keep]
+        if len(self.top_companies) < min(TOP_COMPANIES, self.market_cap_count):
+            msg = (
+                "Too many of the largest companies were removed to update the "
+                "top companies incrementally; run a full generate instead"
+            )
+            raise IncompleteStateError(msg)
+
+    def _apply(self, chunk: pd.DataFrame, sign: int) -> None:
+        """Add (``sign=1``) or subtract (``sign=-1``) a chunk's partials."""
+        if chunk.empty:
+            return
+        marketcap = chunk["Marketcap"]
+        values = marketcap.to_numpy(dtype="float64", na_value=np.nan)
+
+        self.row_count += sign * len(chunk)
+        self.market_cap_count += sign * int(marketcap.count())
+        self.market_cap_sum += sign * float(marketcap.sum())
+        if sign > 0:
+            self.market_cap.update(values)
+        else:
+            self.market_cap.remove(values)
+
+        # Per-sector partials with bincount over the factorized sector codes
+        codes, names = pd.factorize(chunk["Sector"], use_na_sentinel=False)
+        groups = len(names)
+        valid = ~np.isnan(values)
+        row_counts = np.bincount(codes, minlength=groups)
+        company_counts = np.bincount(codes[valid], minlength=groups)
+        listed_counts = np.bincount(
+            codes[chunk["Shortname"].notna().to_numpy()],
+            minlength=groups,
+        )
+        totals = np.bincount(codes[valid], weights=values[valid], minlength=groups)
+        order = np.argsort(codes, kind="stable")
+        sector_values = np.split(values[order], np.cumsum(row_counts)[:-1])
+
+        for code, name in enumerate(names):
+            key = None if pd.isna(name) else str(name)
+            sector = self._sector(key)
+            sector["row_count"] += sign * int(row_counts[code])
+            sector["company_count"] += sign * int(company_counts[code])
+            sector["listed_count"] += sign * int(listed_counts[code])
+            sector["total_market_cap"] += sign * float(totals[code])
+            if sign > 0:
+                sector["sketch"].update(sector_values[code])
+            else:
+                sector["sketch"].remove(sector_values[code])
+            if sector["row_count"] == 0:
+                del self.sectors[key]
+
+        for band, count in count_market_cap_bands(
+            marketcap,
+            self.market_cap_bands,
+        ).items():
+            self.band_counts[band] += sign * count
+
+    def _merge_top(self, candidates: pd.DataFrame) -> None:
+        """Keep the top company candidates across the seen rows."""
+        if self.top_companies.empty:
+            merged = candidates
+        else:
+            merged = pd.concat([self.top_companies, candidates], ignore_index=True)
+        self.top_companies = merged.nlargest(self.top_candidates, "Marketcap")
+
+    def merge(self, other: KpiAccumulator) -> None:
+        """Merge the aggregates of another accumulator (e.g. a later partition)."""
+        if other.market_cap_bands != self.market_cap_bands:
+            msg = "Cannot merge accumulators with different market cap bands"
+            raise ValueError(msg)
+        self.row_count += other.row_count
+        self.market_cap_count += other.market_cap_count
+        self.market_cap_sum += other.market_cap_sum
+        self.market_cap.merge(other.market_cap)
+        for name, partial in other.sectors.items():
+            sector = self._sector(name)
+            for counter in [*SECTOR_COUNTERS, "total_market_cap"]:
+                sector[counter] += partial[counter]
+            sector["sketch"].merge(partial["sketch"])
+        if not other.top_companies.empty:
+            self._merge_top(other.top_companies)
+        for band, count in other.band_counts.items():
+            self.band_counts[band] += count
+
+    def to_aggregates(self) -> dict[str, Any]:
+        """Return the aggregates in the shape of ``build_kpi_aggregates``."""
+        valid = self.market_cap_count
+        percentiles = self.market_cap.quantiles(PERCENTILES)
+        overall = {
+            "row_count": self.row_count,
+            "market_cap_count": valid,
+            "avg_market_cap": self.market_cap_sum / valid if valid else 0.0,
+            "median_market_cap": self.market_cap.median() if valid else 0.0,
+            "percentiles": {
+                f"p{int(k*100)}": v if not pd.isna(v) else 0.0
+                for k, v in zip(PERCENTILES, percentiles)
+            },
+        }
+
+        named = sorted(name for name in self.sectors if name is not None)
+        rows = [self.sectors[name] for name in named]
+        sectors = pd.DataFrame(
+            {
+                "row_count": [r["row_count"] for r in rows],
+                "company_count": [r["company_count"] for r in rows],
+                "listed_count": [r["listed_count"] for r in rows],
+                "total_market_cap": [r["total_market_cap"] for r in rows],
+                "avg_market_cap": [
+                    (
+                        r["total_market_cap"] / r["company_count"]
+                        if r["company_count"]
+                        else float("nan")
+                    )
+                    for r in rows
+                ],
+                "median_market_cap": [r["sketch"].median() for r in rows],
+            },
+            index=pd.Index(named, name="Sector", dtype="object"),
+        ).astype(dict.fromkeys(SECTOR_COUNTERS, "int64"))
+
+        missing = self.sectors.get(None)
+        return {
+            "overall": overall,
+            "sectors": sectors,
+            "unassigned": {
+                "row_count": missing["row_count"] if missing else 0,
+                "company_count": missing["company_count"] if missing else 0,
+                "total_market_cap": missing["total_market_cap"] if missing else 0.0,
+            },
+            "top_companies": self.top_companies.head(TOP_COMPANIES),
+            "market_cap_bands": dict(self.band_counts),
+        }
+
+    def to_state(self, sketch_capacity: int = DEFAULT_CAPACITY) -> dict[str, Any]:
+        """Serialize the accumulator to JSON-compatible types.
+
+        Sketches holding more than ``sketch_capacity`` values per level are
+        saved compacted to it, so the state stays small however many rows
+        were aggregated; medians and percentiles of the restored accumulator
+        are approximate beyond that many values.
+        """
+        capacity = min(self.sketch_capacity, sketch_capacity)
+        top = self.top_companies[TOP_COLUMNS].astype(object)
+        return {
+            "market_cap_bands": {
+                name: list(bounds) for name, bounds in self.market_cap_bands.items()
+            },
+            "sketch_capacity": capacity,
+            "top_candidates": self.top_candidates,
+            "row_count": self.row_count,
+            "market_cap_count": self.market_cap_count,
+            "market_cap_sum": self.market_cap_sum,
+            "market_cap": self.market_cap.bounded(capacity).to_dict(),
+            "sectors": [
+                {
+                    "sector": name,
+                    **{key: value for key, value in partial.items() if key != "sketch"},
+                    "sketch": partial["sketch"].bounded(capacity).to_dict(),
+                }
+                for name, partial in self.sectors.items()
+            ],
+            "top_companies": top.where(top.notna(), None).values.tolist(),
+            "band_counts": dict(self.band_counts),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> KpiAccumulator:
+        """Restore an accumulator saved with ``to_state``."""
+        accumulator = cls(
+            {name: tuple(bounds) for name, bounds in state["market_cap_bands"].items()},
+            state["sketch_capacity"],
+            state["top_candidates"],
+        )
+        accumulator.row_count = state["row_count"]
+        accumulator.market_cap_count = state["market_cap_count"]
+        accumulator.market_cap_sum = state["market_cap_sum"]
+        accumulator.market_cap = QuantileSketch.from_dict(state["market_cap"])
+        for entry in state["sectors"]:
+            partial = {
+                key: value
+                for key, value in entry.items()
+                if key not in ("sector", "sketch")
+            }
+            partial["sketch"] = QuantileSketch.from_dict(entry["sketch"])
+            accumulator.sectors[entry["sector"]] = partial
+        top = pd.DataFrame(state["top_companies"], columns=TOP_COLUMNS)
+        top["Marketcap"] = top["Marketcap"].astype("float64")
+        accumulator.top_companies = top
+        accumulator.band_counts = dict(state["band_counts"])
+        return accumulator
+
+
+def _matches(top: pd.DataFrame, row: tuple) -> np.ndarray:
+    """Rows of ``top`` equal to ``row`` (missing values compare equal)."""
+    matches = np.ones(len(top), dtype=bool)
+    for column, value in zip(TOP_COLUMNS, row):
+        if pd.isna(value):
+            matches &= top[column].isna().to_numpy()
+        elif column == "Marketcap":
+            matches &= top[column].to_numpy(dtype="float64") == float(value)
+        else:
+            matches &= (top[column].astype(str) == str(value)).to_numpy()
+    return matches
+
+
+def aggregate_chunks(
+    chunks: Iterable[pd.DataFrame],
+    market_cap_bands: MarketCapBands | None = None,
+    sketch_capacity: int = DEFAULT_CAPACITY,
+) -> dict[str, Any]:
+    """Aggregate an iterable of DataFrame chunks into KPI aggregates.
+
+    Args:
+        chunks: DataFrames with the S&P 500 companies columns
+        market_cap_bands: Band thresholds (defaults to ``MARKET_CAP_BANDS``)
+        sketch_capacity: Values held per quantile sketch before compacting
+
+    Returns:
+        Aggregates accepted by ``compute_all_kpis`` and ``generate_report``
+
+    """
+    accumulator = KpiAccumulator(market_cap_bands, sketch_capacity)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.to_aggregates()
+
+
+def summarize_chunks(
+    chunks: Iterable[pd.DataFrame],
+    market_cap_bands: MarketCapBands | None = None,
+    sketch_capacity: int = DEFAULT_CAPACITY,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Compute ``compute_kpis`` and the KPI aggregates in one pass over chunks.
+
+    Columns that are not numeric in every chunk are left out of the means,
+    like ``compute_kpis`` leaves out the non-numeric columns of a whole file.
+
+    Args:
+        chunks: DataFrames with the S&P 500 companies columns
+        market_cap_bands: Band thresholds (defaults to ``MARKET_CAP_BANDS``)
+        sketch_capacity: Values held per quantile sketch before compacting
+
+    Returns:
+        The ``compute_kpis`` dictionary and the aggregates it is derived
+        from, accepted by ``compute_all_kpis``
+
+    """
+    accumulator = KpiAccumulator(market_cap_bands, sketch_capacity)
+    columns: list[str] = []
+    sums: dict[str, float] = {}
+    counts: dict[str, int] = {}
+    non_numeric: set[str] = set()
+    for chunk in chunks:
+        columns = columns or list(chunk.columns)
+        numeric = chunk.select_dtypes("number")
+        non_numeric.update(set(chunk.columns) - set(numeric.columns))
+        for name, column in numeric.items():
+            sums[name] = sums.get(name, 0.0) + float(column.sum())
+            counts[name] = counts.get(name, 0) + int(column.count())
+        accumulator.update(chunk)
+    means = {
+        name: round(sums[name] / counts[name], 2) if counts[name] else np.nan
+        for name in columns
+        if name in sums and name not in non_numeric
+    }
+    aggregates = accumulator.to_aggregates()
+    aggregates["columns"] = {"count": len(columns), "means": means}
+    return compute_kpis(aggregates=aggregates), aggregates
@@ -1,7 +1,13 @@
 # src/kpi_service/tests/test_api.py
+import asyncio
 import sys
+import time
 from pathlib import Path
 
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
 from fastapi.testclient import TestClient
 
 # Add the src directory to the path
@@ -23,6 +29,208 @@ def test_upload_ok() -> None:
     assert r.json()["basic_kpis"]["rows"] == 3
 
 
+def test_upload_over_size_limit(monkeypatch) -> None:
+    csv = b"Symbol,Shortname,Sector,Marketcap\n" + b"AAPL,Apple,Tech,1\n" * 100
+    monkeypatch.setattr(app.state, "max_upload_bytes", 1000)
+
+    declared = client.post("/upload", files={"file": ("big.csv", csv, "text/csv")})
+    assert declared.status_code == 413
+    # Refused before the router redirects to the path without the slash
+    for path in ("/upload/", "/jobs/"):
+        slashed = client.post(
+            path,
+            files={"file": ("big.csv", csv, "text/csv")},
+            follow_redirects=False,
+        )
+        assert slashed.status_code == 413
+
+    # Without Content-Length the limit applies to the bytes received
+    boundary = b"limit-test"
+    body = (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="big.csv"\r\n'
+        b"Content-Type: text/csv\r\n\r\n" + csv + b"\r\n--" + boundary + b"--\r\n"
+    )
+    chunked = client.post(
+        "/upload",
+        content=(body[i : i + 256] for i in range(0, len(body), 256)),
+        headers={"Content-Type": "multipart/form-data; boundary=limit-test"},
+    )
+    assert chunked.status_code == 413
+
+
 def test_wrong_extension() -> None:
     r = client.post("/upload", files={"file": ("bad.txt", b"dummy", "text/plain")})
     assert r.status_code == 400
+
+
+def test_health_check_is_not_blocked_by_runs_queries() -> None:
+    """/healthz is answered while many /runs queries are still in flight."""
+
+    async def hammer() -> tuple[float, float, list[int]]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+            start = time.perf_counter()
+            runs = [
+                asyncio.create_task(ac.get("/runs", params={"limit": 200}))
+                for _ in range(100)
+            ]
+            await asyncio.sleep(0)
+            health = await ac.get("/healthz")
+            health_latency = time.perf_counter() - start
+            responses = await asyncio.gather(*runs)
+            total = time.perf_counter() - start
+        codes = [health.status_code] + [r.status_code for r in responses]
+        return health_latency, total, codes
+
+    health_latency, total, codes = asyncio.run(hammer())
+
+    assert set(codes) == {200}
+    assert health_latency < total / 2
+
+
+def test_health_check_stays_flat_during_uploads() -> None:
+    """/healthz keeps answering while uploads are computed on the workers."""
+    rows = 100_000
+    rng = np.random.default_rng(0)
+    csv = pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(rows)],
+            "Shortname": [f"Company {i}" for i in range(rows)],
+            "Sector": rng.choice(["Technology", "Energy", "Utilities"], rows),
+            "Marketcap": rng.lognormal(23.5, 1.6, rows),
+        },
+    ).to_csv(index=False)
+
+    async def probe() -> tuple[list[float], float, list[int]]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+            start = time.perf_counter()
+            uploads = [
+                asyncio.create_task(
+                    ac.post(
+                        "/upload",
+                        files={"file": ("big.csv", csv, "text/csv")},
+                        timeout=None,
+                    ),
+                )
+                for _ in range(4)
+            ]
+            # Delay of each health check past its 20 ms tick, which includes
+            # any time the event loop was blocked
+            latencies = []
+            while not all(upload.done() for upload in uploads):
+                tick = time.perf_counter() + 0.02
+                await asyncio.sleep(0.02)
+                await ac.get("/healthz")
+                latencies.append(time.perf_counter() - tick)
+            responses = await asyncio.gather(*uploads)
+            total = time.perf_counter() - start
+        return latencies, total, [r.status_code for r in responses]
+
+    latencies, total, codes = asyncio.run(probe())
+
+    assert codes == [200] * 4
+    assert len(latencies) >= 4
+    assert max(latencies) < total / 4
+
+
+def test_runs_cursor_pagination_with_kpis() -> None:
+    first = client.get("/runs", params={"limit": 1, "include_kpis": True}).json()
+    assert first["total_count"] == 1
+    assert "kpis" in first["runs"][0]
+
+    if first["next_cursor"]:
+        second = client.get(
+            "/runs",
+            params={"limit": 1, "cursor": first["next_cursor"]},
+        ).json()
+        assert second["runs"][0]["id"] != first["runs"][0]["id"]
+
+
+def test_runs_rejects_invalid_cursor_and_limit() -> None:
+    assert client.get("/runs", params={"cursor": "garbage!"}).status_code == 400
+    assert client.get("/runs", params={"limit": 0}).status_code == 422
+
+
+def test_kpi_history() -> None:
+    r = client.get("/kpis/total_companies/history", params={"granularity": "week"})
+    assert r.status_code == 200
+    assert r.json()["granularity"] == "week"
+    r = client.get("/kpis/total_companies/history", params={"granularity": "month"})
+    assert r.status_code == 422
+
+
+def test_run_report_of_unknown_run() -> None:
+    assert client.get("/runs/999999999/report").status_code == 404
+    r = client.get("/runs/1/report", params={"output_format": "pdf"})
+    assert r.status_code == 422
+
+
+def test_run_stats() -> None:
+    r = client.get("/runs/stats", params={"group_by": "csv_file"})
+    assert r.status_code == 200
+    assert r.json()["group_by"] == "csv_file"
+    assert isinstance(r.json()["groups"], list)
+    r = client.get("/runs/stats", params={"group_by": "status"})
+    assert r.status_code == 422
+
+
+def test_job_lifecycle() -> None:
+    csv = (
+        b"Symbol,Shortname,Sector,Marketcap\n"
+        b"AAPL,Apple Inc,Technology,3000000000000\n"
+        b"XOM,Exxon Mobil,Energy,400000000000"
+    )
+    # The lifespan keeps one event loop running for the background jobs
+    with TestClient(app) as jobs_client:
+        r = jobs_client.post("/jobs", files={"file": ("demo.csv", csv, "text/csv")})
+        assert r.status_code == 202
+        status_url = r.json()["status_url"]
+
+        jobs_client.portal.call(app.state.jobs.join)
+        job = jobs_client.get(status_url).json()
+        assert job["status"] == "completed"
+        assert job["result"]["basic_kpis"]["rows"] == 2
+
+        report = jobs_client.get(job["report_url"], params={"output_format": "html"})
+        assert report.status_code == 200
+        assert "Energy" in report.text
+
+        assert jobs_client.get("/jobs/unknown").status_code == 404
+        assert jobs_client.get("/jobs/unknown/report").status_code == 404
+        bad = jobs_client.post("/jobs", files={"file": ("bad.txt", b"x", "text/plain")})
+        assert bad.status_code == 400
+
+
+def test_repeated_upload_is_served_from_cache() -> None:
+    csv = (
+        b"Symbol,Shortname,Sector,Marketcap\n"
+        b"AAPL,Apple Inc,Technology,3000000000000\n"
+        b"CVX,Chevron,Energy,300000000000"
+    )
+    app.state.upload_cache.clear()
+    before = client.get("/upload/cache").json()
+
+    first = client.post("/upload", files={"file": ("a.csv", csv, "text/csv")})
+    second = client.post("/upload", files={"file": ("b.csv", csv, "text/csv")})
+
+    assert first.headers["X-Upload-Cache"] == "miss"
+    assert second.headers["X-Upload-Cache"] == "hit"
+    assert second.json()["filename"] == "b.csv"
+    assert second.json()["enhanced_kpis"] == first.json()["enhanced_kpis"]
+    after = client.get("/upload/cache").json()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+
+def test_upload_with_empty_numeric_column() -> None:
+    pytest.importorskip("orjson")
+    csv = (
+        b"Symbol,Shortname,Sector,Marketcap,Employees\n"
+        b"AAPL,Apple Inc,Technology,3000000000000,\n"
+        b"XOM,Exxon Mobil,Energy,400000000000,"
+    )
+    r = client.post("/upload", files={"file": ("empty.csv", csv, "text/csv")})
+    assert r.status_code == 200
+    assert r.json()["basic_kpis"]["means"]["Employees"] is None
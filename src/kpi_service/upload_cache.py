@@ -0,0 +1,248 @@
+"""Response cache of ``POST /upload`` keyed by the content of the upload.
+
+Dashboards post the same file again and again; each time it used to be
+parsed and its KPIs computed anew. ``UploadCache`` keeps the KPIs of recent
+uploads, keyed by the SHA-256 of the spooled upload (read in blocks, never
+held in memory whole) and of the KPI code (``kpi_code_version``), so a
+deploy with changed KPI code never serves older results.
+
+Entries are stored as compact JSON (``responses.dumps``). The in-memory
+tier of each process is an LRU bounded by
+``KPI_SERVICE_UPLOAD_CACHE_MAX_BYTES`` (0 disables it); entries expire
+after ``KPI_SERVICE_UPLOAD_CACHE_TTL`` seconds. With
+``KPI_SERVICE_UPLOAD_CACHE_DIR`` set, entries are also written to that
+directory, shared by every uvicorn worker on the host and bounded by
+``KPI_SERVICE_UPLOAD_CACHE_DISK_MAX_BYTES``; a memory miss that hits the
+disk tier is promoted to memory.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any
+
+from .responses import dumps, loads
+from .workers import COPY_BUFFER_BYTES, UPLOAD_CHUNKSIZE
+
+__all__ = [
+    "DEFAULT_UPLOAD_CACHE_MAX_BYTES",
+    "DEFAULT_UPLOAD_CACHE_TTL",
+    "UploadCache",
+    "kpi_code_version",
+    "upload_cache_key",
+]
+
+DEFAULT_UPLOAD_CACHE_MAX_BYTES = int(
+    os.getenv("KPI_SERVICE_UPLOAD_CACHE_MAX_BYTES", str(64 * 2**20)),
+)
+DEFAULT_UPLOAD_CACHE_TTL = int(os.getenv("KPI_SERVICE_UPLOAD_CACHE_TTL", "3600"))
+DEFAULT_UPLOAD_CACHE_DIR = os.getenv("KPI_SERVICE_UPLOAD_CACHE_DIR") or None
+DEFAULT_UPLOAD_CACHE_DISK_MAX_BYTES = int(
+    os.getenv("KPI_SERVICE_UPLOAD_CACHE_DISK_MAX_BYTES", str(1 << 30)),
+)
+
+# Bump when the layout of cached responses changes
+UPLOAD_CACHE_VERSION = 1
+ENTRY_SUFFIX = ".json"
+
+# Modules whose code determines the KPIs of an upload
+KPI_MODULES = ("kpi.py", "sketch.py", "streaming.py", "workers.py")
+
+
+@lru_cache(maxsize=1)
+def kpi_code_version() -> str:
+    """Short hash of the KPI code, like ``template_version`` for templates."""
+    digest = hashlib.sha256()
+    for name in KPI_MODULES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def upload_cache_key(upload: IO[bytes]) -> str:
+    """Hash of an upload's bytes and of everything its KPIs depend on."""
+    digest = hashlib.sha256(
+        f"{UPLOAD_CACHE_VERSION}:{kpi_code_version()}:{UPLOAD_CHUNKSIZE}:".encode(),
+    )
+    upload.seek(0)
+    for block in iter(lambda: upload.read(COPY_BUFFER_BYTES), b""):
+        digest.update(block)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """Size-bounded LRU cache of upload KPIs with a TTL and a disk tier.
+
+    Safe to use from several threads; the handler calls it through
+    ``asyncio.to_thread`` because the disk tier does file I/O.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_UPLOAD_CACHE_MAX_BYTES,
+        ttl: int = DEFAULT_UPLOAD_CACHE_TTL,
+        directory: str | Path | None = DEFAULT_UPLOAD_CACHE_DIR,
+        disk_max_bytes: int = DEFAULT_UPLOAD_CACHE_DISK_MAX_BYTES,
+    ) -> None:
+        self.max_bytes = max(max_bytes, 0)
+        self.ttl = ttl
+        self.directory = Path(directory) if directory is not None else None
+        self.disk_max_bytes = disk_max_bytes
+        # key -> (expiry as Unix time, JSON bytes), least recently used first
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether either tier can hold entries."""
+        return self.max_bytes > 0 or self.directory is not None
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached KPIs of ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return loads(entry[1])
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, *entry)
+        return loads(entry[1])
+
+    def put(self, key: str, kpis: dict[str, Any]) -> None:
+        """Cache the KPIs of an upload in both tiers."""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        try:
+            data = dumps(kpis)
+        except ValueError:
+            # NaN means without orjson: such a response fails to render anyway
+            return
+        with self._lock:
+            self._store(key, expires_at, data)
+        if self.directory is not None:
+            with contextlib.suppress(OSError):
+                self._write_disk(key, expires_at, data)
+
+    def _store(self, key: str, expires_at: float, data: bytes) -> None:
+        """Add an entry to the memory tier and evict down to ``max_bytes``."""
+        if len(data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (expires_at, data)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        _, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / f"{key}{ENTRY_SUFFIX}"
+
+    def _read_disk(self, key: str, now: float) -> tuple[float, bytes] | None:
+        """Read an unexpired entry of the disk tier.
+
+        Files hold the expiry time on their first line and the JSON after it.
+        """
+        if self.directory is None:
+            return None
+        path = self._entry(key)
+        try:
+            header, _, data = path.read_bytes().partition(b"\n")
+            expires_at = float(header)
+        except (OSError, ValueError):
+            return None
+        if expires_at <= now:
+            with contextlib.suppress(OSError):
+                path.unlink()
+            return None
+        # Mark as recently used for the LRU eviction
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return expires_at, data
+
+    def _write_disk(self, key: str, expires_at: float, data: bytes) -> None:
+        """Write an entry through a temporary file so readers never see half."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(b"%f\n" % expires_at)
+                tmp.write(data)
+            tmp_path.replace(self._entry(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            raise
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Remove least recently used files until ``disk_max_bytes`` is respected."""
+        entries = []
+        for entry in self.directory.glob(f"*{ENTRY_SUFFIX}"):
+            with contextlib.suppress(OSError):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                entry.unlink()
+            total -= size
+
+    def clear(self) -> None:
+        """Remove every entry of both tiers; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory is not None:
+            for entry in self.directory.glob(f"*{ENTRY_SUFFIX}"):
+                with contextlib.suppress(OSError):
+                    entry.unlink()
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counters of this process and the memory tier's size."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "disk": None if self.directory is None else str(self.directory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "kpi_code_version": kpi_code_version(),
+            }
@@ -0,0 +1,234 @@
+"""Worker pool computing upload KPIs off the FastAPI event loop.
+
+Parsing an upload and computing its KPIs is CPU-bound; run inline in an
+``async def`` handler it stalls every other request of the worker, health
+checks included. ``KpiWorkerPool`` runs ``upload_kpis`` on a thread pool or
+on a process pool whose workers are forked and warmed up (pandas and the KPI
+code imported) when the service starts. At most ``workers`` uploads are
+computed at once and at most ``queue_depth`` more wait for a slot; beyond
+that ``PoolBusyError`` is raised, which the API answers with 503.
+
+Configured through ``KPI_SERVICE_UPLOAD_EXECUTOR`` (``thread`` or
+``process``), ``KPI_SERVICE_UPLOAD_WORKERS`` and
+``KPI_SERVICE_UPLOAD_QUEUE_DEPTH``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, TypeVar
+
+import pandas as pd
+
+from csv_report.report.generate import report_sectors
+
+from .kpi import compute_all_kpis
+from .sketch import EXACT_CAPACITY
+from .streaming import summarize_chunks
+
+__all__ = [
+    "EXECUTOR_KINDS",
+    "KpiWorkerPool",
+    "PoolBusyError",
+    "upload_kpis",
+]
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Rows parsed from an upload at a time
+UPLOAD_CHUNKSIZE = 50_000
+
+# Upload chunks copied to a file for process workers
+COPY_BUFFER_BYTES = 1 << 20
+
+_T = TypeVar("_T")
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+def upload_kpis(
+    source: str | Path | IO[bytes],
+    chunksize: int = UPLOAD_CHUNKSIZE,
+    *,
+    sectors: bool = False,
+) -> dict[str, Any]:
+    """Parse an uploaded CSV chunk by chunk and compute its KPIs.
+
+    Only the aggregates and the market cap values are kept across chunks;
+    the quantile sketches never compact, so medians and percentiles are
+    exact, as if the whole file had been loaded.
+
+    Args:
+        source: Path or binary file object of the upload
+        chunksize: Rows parsed at a time
+        sectors: Also return the ``report_sectors`` the report templates need
+
+    Returns:
+        Dictionary with the legacy ``basic_kpis`` and the ``enhanced_kpis``
+        of ``compute_all_kpis`` (plus ``report_sectors`` if requested)
+
+    """
+    chunks = pd.read_csv(source, chunksize=chunksize)
+    basic_kpis, aggregates = summarize_chunks(
+        chunks,
+        sketch_capacity=EXACT_CAPACITY,
+    )
+    kpis = {
+        "basic_kpis": basic_kpis,
+        "enhanced_kpis": compute_all_kpis(aggregates=aggregates),
+    }
+    if sectors:
+        kpis["report_sectors"] = report_sectors(aggregates)
+    return kpis
+
+
+def _warm_up() -> None:
+    """Run a tiny upload through a worker so its first real one is not slower."""
+    frame = pd.DataFrame(
+        {
+            "Symbol": ["A"],
+            "Shortname": ["A"],
+            "Marketcap": [1.0],
+            "Sector": ["Technology"],
+        },
+    )
+    basic_kpis, aggregates = summarize_chunks([frame])
+    compute_all_kpis(aggregates=aggregates)
+
+
+def _copy_to_file(upload: IO[bytes]) -> str:
+    """Copy an upload to a named temporary file that process workers can open."""
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as copy:
+        shutil.copyfileobj(upload, copy, COPY_BUFFER_BYTES)
+    return copy.name
+
+
+class KpiWorkerPool:
+    """Bounded thread or process pool running ``upload_kpis``."""
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        workers: int = 2,
+        queue_depth: int = 8,
+    ) -> None:
+        """Create the pool; workers are started by ``start`` or on first use.
+
+        Raises:
+            ValueError: If ``kind`` is not one of ``EXECUTOR_KINDS`` or
+                ``workers`` is below 1
+
+        """
+        if kind not in EXECUTOR_KINDS:
+            msg = f"Unknown executor {kind!r}, use one of {EXECUTOR_KINDS}"
+            raise ValueError(msg)
+        if workers < 1:
+            msg = f"An upload pool needs at least one worker, got {workers}"
+            raise ValueError(msg)
+        self.kind = kind
+        self.workers = workers
+        self.queue_depth = max(queue_depth, 0)
+        self.pending = 0
+        self._executor: Executor | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    @classmethod
+    def from_env(cls, prefix: str = "KPI_SERVICE_UPLOAD") -> KpiWorkerPool:
+        """Pool configured by the ``<prefix>_*`` variables (see module docstring)."""
+        return cls(
+            kind=os.getenv(f"{prefix}_EXECUTOR", "thread"),
+            workers=int(os.getenv(f"{prefix}_WORKERS", "2")),
+            queue_depth=int(os.getenv(f"{prefix}_QUEUE_DEPTH", "8")),
+        )
+
+    def _ensure_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_warm_up,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="kpi-upload",
+                )
+        return self._executor
+
+    async def start(self) -> None:
+        """Start every worker now instead of on the first uploads."""
+        executor = self._ensure_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, _warm_up) for _ in range(self.workers)),
+        )
+
+    def shutdown(self) -> None:
+        """Stop the workers; the pool starts new ones if it is used again."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _admit(self) -> None:
+        """Count a call as pending, unless the wait queue is full."""
+        if self.pending >= self.workers + self.queue_depth:
+            msg = (
+                f"All {self.workers} upload workers are busy and "
+                f"{self.queue_depth} uploads are waiting"
+            )
+            raise PoolBusyError(msg)
+        self.pending += 1
+
+    async def _call(self, func: Callable[..., _T], *args: object) -> _T:
+        """Run ``func(*args)`` on a worker once a slot is free."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores are bound to the loop they first wait on
+            self._loop, self._slots = loop, asyncio.Semaphore(self.workers)
+        async with self._slots:
+            return await loop.run_in_executor(self._ensure_executor(), func, *args)
+
+    async def run(self, func: Callable[..., _T], *args: object) -> _T:
+        """Run ``func(*args)`` on a worker once a slot is free.
+
+        Raises:
+            PoolBusyError: If ``workers`` calls are running and
+                ``queue_depth`` more are already waiting
+
+        """
+        self._admit()
+        try:
+            return await self._call(func, *args)
+        finally:
+            self.pending -= 1
+
+    async def upload_kpis(self, upload: IO[bytes]) -> dict[str, Any]:
+        """Compute the KPIs of an upload on a worker (see ``upload_kpis``).
+
+        Thread workers read the spooled upload file directly; for process
+        workers it is first copied to a named temporary file.
+
+        Raises:
+            PoolBusyError: If the pool cannot take another upload
+
+        """
+        if self.kind == "thread":
+            return await self.run(upload_kpis, upload)
+        self._admit()
+        try:
+            path = await asyncio.to_thread(_copy_to_file, upload)
+            try:
+                return await self._call(upload_kpis, path)
+            finally:
+                Path(path).unlink()
+        finally:
+            self.pending -= 1
@@ -44,8 +44,8 @@ def process_csv(request):
         temp_file_path = temp_file.name
 
     try:
-        # Load CSV
-        df = load_csv(csv_file=temp_file_path)
+        # Load CSV (uploads are one-off temp files, so skip the parse cache)
+        df = load_csv(csv_file=temp_file_path, use_cache=False)
         logger.info(
             "CSV loaded successfully: %d rows, %d columns",
             len(df),
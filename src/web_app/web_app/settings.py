@@ -77,6 +77,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR.parent.parent / "run.db",
+        # Wait for concurrent writers instead of failing with
+        # "database is locked"
+        "OPTIONS": {"timeout": 30},
     },
 }
 
@@ -0,0 +1,123 @@
+"""Tests for the parallel batch report generation."""
+
+import pandas as pd
+import pytest
+from typer.testing import CliRunner
+
+from csv_report.batch import report_paths, resolve_csv_files
+from csv_report.database import DatabaseService
+from csv_report.main import app
+
+
+def _write_companies(path) -> None:
+    pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "MSFT", "XOM"],
+            "Shortname": ["Apple", "Microsoft", "Exxon"],
+            "Marketcap": [3e12, 2.5e12, 4e11],
+            "Sector": ["Technology", "Technology", "Energy"],
+        },
+    ).to_csv(path, index=False)
+
+
+def test_resolve_csv_files_from_directory_and_glob(tmp_path) -> None:
+    """Test that directories and globs both resolve to sorted CSV files."""
+    (tmp_path / "nested").mkdir()
+    for name in ["b.csv", "a.csv", "nested/c.csv", "notes.txt"]:
+        (tmp_path / name).write_text("Symbol\n")
+
+    assert resolve_csv_files(tmp_path) == [tmp_path / "a.csv", tmp_path / "b.csv"]
+    assert resolve_csv_files(f"{tmp_path}/**/*.csv") == [
+        tmp_path / "a.csv",
+        tmp_path / "b.csv",
+        tmp_path / "nested" / "c.csv",
+    ]
+
+
+def test_generate_batch_continues_after_failure(tmp_path) -> None:
+    """Test that one broken file does not abort the rest of the batch."""
+    source = tmp_path / "data"
+    source.mkdir()
+    _write_companies(source / "east.csv")
+    _write_companies(source / "west.csv")
+    (source / "broken.csv").write_text("Symbol,Name\nAAPL,Apple\n")
+    output_dir = tmp_path / "reports"
+
+    result = CliRunner().invoke(
+        app,
+        ["generate-batch", str(source), "--output-dir", str(output_dir), "-w", "2"],
+    )
+
+    assert result.exit_code == 1
+    assert sorted(p.name for p in output_dir.iterdir()) == [
+        "east.markdown",
+        "west.markdown",
+    ]
+    assert "broken.csv" in result.stdout
+    assert "files/s" in result.stdout
+
+
+def test_failed_persistence_leaves_failed_run(tmp_path, monkeypatch) -> None:
+    """Test that a run whose records cannot be saved is failed, not partial."""
+    source = tmp_path / "data"
+    source.mkdir()
+    _write_companies(source / "east.csv")
+    _write_companies(source / "west.csv")
+
+    def pack_kpi_state(_state: dict) -> bytes:
+        msg = "disk full"
+        raise OSError(msg)
+
+    monkeypatch.setattr("csv_report.database.pack_kpi_state", pack_kpi_state)
+    result = CliRunner().invoke(
+        app,
+        ["generate-batch", str(source), "--output-dir", str(tmp_path / "out")],
+    )
+
+    assert result.exit_code == 1
+    runs = [
+        run
+        for run in DatabaseService().get_recent_runs(10)
+        if run.csv_file.startswith(str(source))
+    ]
+    assert len(runs) == 2
+    for run in runs:
+        assert run.status == "failed"
+        assert "disk full" in run.error_message
+        assert DatabaseService().get_kpis_for_run(run.id) == []
+
+
+def test_reports_of_same_named_files_do_not_collide(tmp_path) -> None:
+    """Test that reports keep the subdirectories of their CSV files."""
+    for year in ["2024", "2025"]:
+        (tmp_path / "data" / year).mkdir(parents=True)
+        _write_companies(tmp_path / "data" / year / "prices.csv")
+    output_dir = tmp_path / "reports"
+
+    result = CliRunner().invoke(
+        app,
+        [
+            "generate-batch",
+            f"{tmp_path}/data/**/*.csv",
+            "--output-dir",
+            str(output_dir),
+            "-w",
+            "1",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert sorted(
+        p.relative_to(output_dir).as_posix() for p in output_dir.rglob("*.*")
+    ) == [
+        "2024/prices.markdown",
+        "2025/prices.markdown",
+    ]
+
+
+def test_report_paths_refuse_shared_reports(tmp_path) -> None:
+    """Test that files which would overwrite each other's report are refused."""
+    csv_files = [tmp_path / "prices.csv", tmp_path / "prices.CSV"]
+
+    with pytest.raises(ValueError, match="would both be reported"):
+        report_paths(csv_files, tmp_path / "reports", "html", tmp_path)
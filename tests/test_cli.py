@@ -144,3 +144,111 @@ def test_database_service_add_kpi() -> None:
     assert kpi.value == 42.0
     assert kpi.unit == "test"
     assert kpi.description == "Test KPI"
+
+
+def test_update_without_saved_state(runner) -> None:
+    """Test that update fails cleanly when the base run has no KPI state."""
+    result = runner.invoke(app, ["update", "--base-run", "999999"])
+    assert result.exit_code == 1
+    assert "No saved KPI state" in result.stdout
+
+
+def test_database_service_add_kpis_in_bulk() -> None:
+    """Test storing every KPI of compute_all_kpis in one call."""
+    import pandas as pd
+
+    from csv_report.database import DatabaseService, kpi_records
+    from kpi_service.kpi import compute_all_kpis
+
+    all_kpis = compute_all_kpis(
+        pd.DataFrame(
+            {
+                "Symbol": ["AAPL", "XOM"],
+                "Shortname": ["Apple", "Exxon"],
+                "Marketcap": [3e12, 4e11],
+                "Sector": ["Technology", "Energy"],
+            },
+        ),
+    )
+    db_service = DatabaseService()
+    run = db_service.create_run(csv_file="test.csv", output_format="markdown")
+
+    count = db_service.add_kpis(run.id, kpi_records(all_kpis))
+
+    kpis = {kpi.name: kpi for kpi in db_service.get_kpis_for_run(run.id)}
+    assert count == len(kpis)
+    assert kpis["total_companies"].value == 2.0
+    assert kpis["market_cap_p50"].unit == "USD"
+    assert kpis["sector_total_market_cap:Energy"].value == 4e11
+
+
+def test_database_services_share_pooled_engine() -> None:
+    """Test that services reuse one engine until the engines are disposed."""
+    from csv_report.database import DatabaseService
+    from csv_report.db_init import dispose_engines
+
+    first, second = DatabaseService(), DatabaseService()
+    assert first.engine is second.engine
+
+    dispose_engines()
+    third = DatabaseService()
+    assert third.engine is not first.engine
+    assert third.get_recent_runs(1) is not None
+
+
+def test_async_database_service_mirrors_sync_service() -> None:
+    """Test that the asyncio service reads what it writes like DatabaseService."""
+    import asyncio
+
+    from csv_report.async_database import AsyncDatabaseService
+    from csv_report.database import DatabaseService
+    from csv_report.models import Kpi, Run
+
+    async def roundtrip() -> tuple[Run, list[Kpi]]:
+        db_service = AsyncDatabaseService()
+        run = await db_service.create_run(csv_file="async.csv", output_format="html")
+        await db_service.add_kpis(run.id, [{"name": "total_companies", "value": 3.0}])
+        return run, await db_service.get_kpis_for_run(run.id)
+
+    run, kpis = asyncio.run(roundtrip())
+
+    assert [kpi.name for kpi in kpis] == ["total_companies"]
+    assert DatabaseService().get_run_by_id(run.id).csv_file == "async.csv"
+
+
+def test_list_runs_pages_with_keyset_cursor() -> None:
+    """Test that pages follow each other without gaps and honour filters."""
+    import uuid
+
+    from csv_report.database import DatabaseService
+
+    db_service = DatabaseService()
+    status = f"test-{uuid.uuid4().hex}"
+    created = [
+        db_service.create_run(csv_file=f"p{i}.csv", output_format="html", status=status)
+        for i in range(7)
+    ]
+    db_service.add_kpis(created[0].id, [{"name": "total_companies", "value": 7.0}])
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        runs, cursor = db_service.list_runs(3, cursor=cursor, status=status)
+        seen.extend(run.id for run in runs)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == [run.id for run in reversed(created)]
+    assert db_service.list_runs(3, status=status, output_format="md") == ([], None)
+    kpis = db_service.get_kpis_for_runs(seen)
+    assert [kpi.name for kpi in kpis[created[0].id]] == ["total_companies"]
+    assert kpis[created[1].id] == []
+
+
+def test_show_runs_rejects_invalid_cursor(runner) -> None:
+    """Test that a malformed cursor is reported instead of crashing."""
+    result = runner.invoke(app, ["show-runs", "--cursor", "not-a-cursor"])
+
+    assert result.exit_code == 1
+    assert "Invalid cursor" in result.stdout
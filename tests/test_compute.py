@@ -1,8 +1,15 @@
 """Tests for the KPI computation module."""
 
 import pandas as pd
+import pytest
 
-from kpi_service.kpi import calculate_base_kpis, calculate_sector_kpis
+from kpi_service.kpi import (
+    build_kpi_aggregates,
+    calculate_base_kpis,
+    calculate_sector_kpis,
+    compute_all_kpis,
+    frame_to_records,
+)
 
 
 def test_calculate_base_kpis() -> None:
@@ -47,3 +54,107 @@ def test_calculate_sector_kpis() -> None:
     assert sector_data["avg_market_cap"] == 1766666666666.6667
     assert sector_data["median_market_cap"] == 1800000000000
     assert sector_data["company_count"] == 3
+
+
+def test_compute_all_kpis_reuses_aggregates() -> None:
+    """Test that precomputed aggregates give the same KPIs as a fresh run."""
+    data = {
+        "Symbol": ["AAPL", "MSFT", "XOM", "JPM"],
+        "Shortname": ["Apple", "Microsoft", "Exxon", "JPMorgan"],
+        "Marketcap": [3e12, 2.5e12, 4e11, 5e11],
+        "Sector": ["Technology", "Technology", "Energy", "Financial Services"],
+    }
+    df = pd.DataFrame(data)
+
+    aggregates = build_kpi_aggregates(df)
+
+    assert compute_all_kpis(aggregates=aggregates) == compute_all_kpis(df)
+
+
+def test_rows_without_sector_count_as_traditional() -> None:
+    """Test that rows with a missing sector are kept out of the sector list."""
+    data = {
+        "Symbol": ["AAPL", "XOM", "UNK"],
+        "Shortname": ["Apple", "Exxon", "Unknown"],
+        "Marketcap": [3e12, 4e11, 1e9],
+        "Sector": ["Technology", "Energy", None],
+    }
+    df = pd.DataFrame(data)
+
+    kpis = compute_all_kpis(df)
+
+    sectors = [s["sector"] for s in kpis["sector_kpis"]["sectors"]]
+    assert sectors == ["Energy", "Technology"]
+    tech_vs_trad = kpis["enhanced_kpis"]["tech_vs_traditional"]
+    assert tech_vs_trad["tech_companies"] == 1
+    assert tech_vs_trad["traditional_companies"] == 2
+    assert tech_vs_trad["traditional_market_cap"] == 4.01e11
+
+
+def test_frame_to_records_types_and_order() -> None:
+    """Test that records hold plain Python values in the requested key order."""
+    frame = pd.DataFrame(
+        {
+            "Sector": pd.Categorical(["Energy", "Technology"]),
+            "count": [3, 5],
+            "mean": [1.5, 2.0],
+        },
+    )
+
+    records = frame_to_records(
+        frame,
+        {"mean": ("mean", float), "sector": ("Sector", str), "n": ("count", int)},
+    )
+
+    assert records == [
+        {"mean": 1.5, "sector": "Energy", "n": 3},
+        {"mean": 2.0, "sector": "Technology", "n": 5},
+    ]
+    assert list(records[0]) == ["mean", "sector", "n"]
+    assert type(records[0]["sector"]) is str
+    assert type(records[0]["n"]) is int
+
+
+def test_market_cap_distribution_with_custom_bands() -> None:
+    """Test configurable market cap bands, including nano and micro caps."""
+    data = {
+        "Symbol": ["A", "B", "C", "D", "E"],
+        "Shortname": ["A", "B", "C", "D", "E"],
+        "Marketcap": [10e6, 100e6, 1e9, 50e9, None],
+        "Sector": ["Energy"] * 5,
+    }
+    df = pd.DataFrame(data)
+    bands = {
+        "nano": (None, 50e6),
+        "micro": (50e6, 300e6),
+        "small": (300e6, 2e9),
+        "large": (10e9, None),
+    }
+
+    distribution = compute_all_kpis(df, market_cap_bands=bands)["enhanced_kpis"][
+        "market_cap_distribution"
+    ]
+
+    assert distribution == {
+        "nano_cap_count": 1,
+        "micro_cap_count": 1,
+        "small_cap_count": 1,
+        "large_cap_count": 1,
+        "nano_cap_pct": 20.0,
+        "micro_cap_pct": 20.0,
+        "small_cap_pct": 20.0,
+        "large_cap_pct": 20.0,
+    }
+
+
+def test_market_cap_band_bounds_are_validated() -> None:
+    """Test that a band with inverted bounds is rejected."""
+    data = {
+        "Symbol": ["A"],
+        "Shortname": ["A"],
+        "Marketcap": [1e9],
+        "Sector": ["Energy"],
+    }
+
+    with pytest.raises(ValueError, match="lower bound"):
+        build_kpi_aggregates(pd.DataFrame(data), {"odd": (2e9, 1e9)})
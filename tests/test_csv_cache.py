@@ -0,0 +1,83 @@
+"""Tests for the columnar CSV parse cache."""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from csv_report.csv_cache import INDEX_FILE, CsvCache
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Small companies CSV including a missing sector."""
+    path = tmp_path / "companies.csv"
+    pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "MSFT", "UNK"],
+            "Shortname": ["Apple", "Microsoft", "?"],
+            "Marketcap": [3e12, 2.5e12, 1e9],
+            "Sector": ["Technology", "Technology", None],
+        },
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_cache_hit_skips_parsing(tmp_path, csv_file) -> None:
+    """Test that a warm load returns the same frame without parsing."""
+    cache = CsvCache(tmp_path / "cache")
+    parsed = cache.load(csv_file, pd.read_csv)
+
+    def fail(_) -> pd.DataFrame:
+        raise AssertionError
+
+    cached = cache.load(csv_file, fail)
+
+    pd.testing.assert_frame_equal(cached, parsed)
+    assert len(cache.entries()) == 1
+
+
+def test_changed_file_is_parsed_again(tmp_path, csv_file) -> None:
+    """Test that modifying the CSV invalidates its cache entry."""
+    cache = CsvCache(tmp_path / "cache")
+    cache.load(csv_file, pd.read_csv)
+
+    with csv_file.open("a") as file:
+        file.write("XOM,Exxon,4e11,Energy\n")
+
+    assert cache.get(csv_file) is None
+    assert len(cache.load(csv_file, pd.read_csv)) == 4
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, csv_file) -> None:
+    """Test that the cache stays within max_bytes, dropping the oldest entry."""
+    cache = CsvCache(tmp_path / "cache")
+    cache.load(csv_file, pd.read_csv, variant="first")
+    (first,) = cache.entries()
+    os.utime(first, ns=(0, 0))
+    cache.max_bytes = first.stat().st_size + 1
+
+    cache.load(csv_file, pd.read_csv, variant="second")
+
+    assert cache.get(csv_file, variant="first") is None
+    assert cache.get(csv_file, variant="second") is not None
+
+
+def test_concurrent_index_updates_keep_every_file(tmp_path) -> None:
+    """Test that files hashed at the same time all end up in the index."""
+    cache = CsvCache(tmp_path / "cache")
+    files = []
+    for i in range(16):
+        path = tmp_path / f"{i}.csv"
+        path.write_text(f"Symbol,Marketcap\nS{i},{i}\n")
+        files.append(path)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(cache.content_digest, files))
+
+    index = json.loads((tmp_path / "cache" / INDEX_FILE).read_text())
+    assert sorted(index) == sorted(str(path.resolve()) for path in files)
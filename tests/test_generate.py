@@ -1,11 +1,19 @@
 """Tests for the generate module."""
 
+import json
 import tempfile
+from datetime import datetime, timezone
 from pathlib import Path
 
 import pandas as pd
 
-from csv_report.report.generate import generate_report, save_report
+from csv_report.report.generate import (
+    generate_report,
+    render_report,
+    report_payload,
+    save_report,
+)
+from kpi_service.kpi import build_kpi_aggregates
 
 
 def test_generate_report() -> None:
@@ -59,3 +67,54 @@ def test_generate_report_empty_data() -> None:
 
     # Check report content
     assert report == "No data available for analysis."
+
+
+def test_generate_report_empty_aggregates() -> None:
+    """Test report generation from the aggregates of no rows."""
+    df = pd.DataFrame(
+        {
+            "Symbol": pd.Series([], dtype="string"),
+            "Shortname": pd.Series([], dtype="string"),
+            "Sector": pd.Series([], dtype="string"),
+            "Marketcap": pd.Series([], dtype="float64"),
+        },
+    )
+
+    report = generate_report(None, aggregates=build_kpi_aggregates(df))
+
+    assert report == "No data available for analysis."
+
+
+def test_generate_report_from_aggregates() -> None:
+    """Test report generation from precomputed aggregates without a DataFrame."""
+    data = {
+        "Symbol": ["AAPL", "MSFT", "GOOGL"],
+        "Shortname": ["Apple", "Microsoft", "Alphabet"],
+        "Marketcap": [2000000000000, 1800000000000, 1500000000000],
+        "Sector": ["Technology", "Technology", "Technology"],
+    }
+    df = pd.DataFrame(data)
+
+    report = generate_report(None, aggregates=build_kpi_aggregates(df))
+
+    assert "Apple" in report
+    assert "Technology" in report
+
+
+def test_render_report_from_stored_payload() -> None:
+    """Test that a payload renders the same report after a JSON round trip."""
+    data = {
+        "Symbol": ["AAPL", "MSFT", "XOM"],
+        "Shortname": ["Apple", "Microsoft", "Exxon"],
+        "Marketcap": [2000000000000, 1800000000000, 400000000000],
+        "Sector": ["Technology", "Technology", "Energy"],
+    }
+    payload = report_payload(build_kpi_aggregates(pd.DataFrame(data)))
+    generated_at = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+    for output_format in ["markdown", "html"]:
+        stored = json.loads(json.dumps(payload))
+        report = render_report(stored, output_format, generated_at=generated_at)
+        assert report == render_report(payload, output_format, generated_at)
+        assert "Exxon" in report
+        assert "January 02, 2024" in report
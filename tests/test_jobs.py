@@ -0,0 +1,152 @@
+"""Tests for the background KPI jobs of POST /jobs."""
+
+import asyncio
+import io
+import os
+import threading
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from csv_report.models import Job
+from kpi_service.jobs import JobManager, JobQueueFullError, is_expired, job_result
+from kpi_service.workers import KpiWorkerPool, upload_kpis
+
+
+def _upload() -> io.BytesIO:
+    csv = pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "MSFT", "XOM"],
+            "Shortname": ["Apple", "Microsoft", "Exxon"],
+            "Sector": ["Technology", "Technology", "Energy"],
+            "Marketcap": [3e12, 2.5e12, 4e11],
+        },
+    ).to_csv(index=False)
+    return io.BytesIO(csv.encode())
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Job manager with one thread worker, one queue slot and its own run.db."""
+    manager = JobManager(
+        KpiWorkerPool("thread", workers=1, queue_depth=1),
+        database_url=f"sqlite:///{tmp_path / 'run.db'}",
+        job_dir=tmp_path / "jobs",
+    )
+    yield manager
+    manager.pool.shutdown()
+
+
+def test_job_result_matches_upload(manager) -> None:
+    """Test that a completed job stores the KPIs /upload would return."""
+
+    async def scenario() -> Job:
+        job = await manager.submit("demo.csv", _upload())
+        assert job.status == "queued"
+        await manager.join()
+        return await manager.database().get_job(job.id)
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "completed"
+    assert job.started_at <= job.finished_at < job.expires_at
+    result = job_result(job)
+    expected = upload_kpis(_upload())
+    assert result["basic_kpis"] == expected["basic_kpis"]
+    assert result["enhanced_kpis"] == expected["enhanced_kpis"]
+    assert {row["Sector"] for row in result["report_sectors"]} == {
+        "Energy",
+        "Technology",
+    }
+    assert list(manager.job_dir.iterdir()) == []
+    assert manager.active == 0
+
+
+def test_failed_job_records_error(manager) -> None:
+    """Test that a CSV that cannot be parsed fails its job."""
+
+    async def scenario() -> Job:
+        job = await manager.submit("bad.csv", io.BytesIO(b"Symbol\nAAPL\n"))
+        await manager.join()
+        return await manager.database().get_job(job.id)
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "failed"
+    assert job.error_message
+    assert job.result is None
+
+
+def test_full_queue_is_refused(manager, monkeypatch) -> None:
+    """Test that jobs beyond workers + queue_depth raise JobQueueFullError."""
+    started, release = threading.Event(), threading.Event()
+
+    def compute_job(_path: str) -> dict:
+        started.set()
+        release.wait()
+        return {}
+
+    monkeypatch.setattr("kpi_service.jobs.compute_job", compute_job)
+
+    async def scenario() -> list:
+        db = manager.database()
+        jobs = [await manager.submit("demo.csv", _upload()) for _ in range(2)]
+        await asyncio.to_thread(started.wait)
+        with pytest.raises(JobQueueFullError):
+            await manager.submit("demo.csv", _upload())
+        statuses = [(await db.get_job(job.id)).status for job in jobs]
+        release.set()
+        await manager.join()
+        return statuses
+
+    assert asyncio.run(scenario()) == ["running", "queued"]
+    assert manager.active == 0
+
+
+def test_expired_results_are_dropped(manager) -> None:
+    """Test that expire_jobs drops results past their expiry time."""
+
+    async def scenario() -> Job:
+        db = manager.database()
+        job = await manager.submit("demo.csv", _upload())
+        await manager.join()
+        job = await db.get_job(job.id)
+        assert not is_expired(job)
+        later = job.expires_at + timedelta(seconds=1)
+        assert is_expired(job, later)
+        assert await db.expire_jobs(later) == 1
+        return await db.get_job(job.id)
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "expired"
+    assert job.result is None
+    assert job_result(job) is None
+
+
+def test_recover_fails_jobs_of_stopped_processes(manager) -> None:
+    """Test that unfinished jobs of a dead process on this host are failed."""
+
+    async def scenario() -> dict[str, str]:
+        db = manager.database()
+        host = manager.owner.rpartition(":")[0]
+        await db.create_job("dead", "a.csv", f"{host}:999999999")
+        await db.create_job("alive", "b.csv", f"{host}:{os.getppid()}")
+        await db.create_job("remote", "c.csv", "elsewhere:1")
+        assert await manager.recover() == 1
+        return {job.id: job.status for job in await db.get_unfinished_jobs()}
+
+    assert asyncio.run(scenario()) == {"alive": "queued", "remote": "queued"}
+
+
+def test_recover_fails_jobs_recorded_under_own_owner(manager) -> None:
+    """Test that jobs of a previous process with the same PID are failed."""
+
+    async def scenario() -> dict[str, str]:
+        db = manager.database()
+        await db.create_job("restarted", "a.csv", manager.owner)
+        assert await manager.recover() == 1
+        return {job.id: job.status for job in await db.get_unfinished_jobs()}
+
+    assert asyncio.run(scenario()) == {}
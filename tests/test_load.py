@@ -3,7 +3,7 @@
 import pandas as pd
 import pytest
 
-from csv_report.load import load_csv
+from csv_report.load import CsvSchemaError, iter_csv_chunks, load_csv, read_csv
 
 
 def test_load_default_csv() -> None:
@@ -56,3 +56,53 @@ def test_load_invalid_file() -> None:
     """Test loading invalid file."""
     with pytest.raises(FileNotFoundError):
         load_csv("nonexistent.csv")
+
+
+def test_iter_csv_chunks(tmp_path) -> None:
+    """Test reading a CSV file in chunks."""
+    csv_path = tmp_path / "companies.csv"
+    pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "MSFT", "GOOGL"],
+            "Shortname": ["Apple", "Microsoft", "Alphabet"],
+            "Marketcap": [2000000000000, 1800000000000, 1500000000000],
+            "Sector": ["Technology", "Technology", "Technology"],
+        },
+    ).to_csv(csv_path, index=False)
+
+    chunks = list(iter_csv_chunks(csv_path, chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[1]["Shortname"].tolist() == ["Alphabet"]
+
+
+def test_read_csv_projects_and_types_schema_columns(tmp_path) -> None:
+    """Test that only the schema columns are loaded, with declared dtypes."""
+    csv_path = tmp_path / "wide.csv"
+    csv_path.write_text(
+        "Exchange,Symbol,Shortname,Sector,Marketcap,City\n"
+        "NMS,AAPL,Apple,Technology,3000000000000,Cupertino\n"
+        "NYQ,XOM,Exxon,Energy,,Irving\n",
+    )
+
+    for engine in [None, "c"]:
+        df = read_csv(csv_path, engine=engine)
+
+        assert df.columns.tolist() == ["Symbol", "Shortname", "Marketcap", "Sector"]
+        assert df["Marketcap"].dtype == "float64"
+        assert isinstance(df["Sector"].dtype, pd.CategoricalDtype)
+
+
+def test_read_csv_rejects_bad_input(tmp_path) -> None:
+    """Test that missing columns and malformed values fail with clear errors."""
+    missing = tmp_path / "missing.csv"
+    missing.write_text("Symbol,Shortname\nAAPL,Apple\n")
+    malformed = tmp_path / "malformed.csv"
+    malformed.write_text(
+        "Symbol,Shortname,Marketcap,Sector\nAAPL,Apple,n/a?,Technology\n",
+    )
+
+    with pytest.raises(CsvSchemaError, match="missing required columns: Marketcap"):
+        read_csv(missing)
+    with pytest.raises(CsvSchemaError, match="Malformed CSV"):
+        read_csv(malformed)
@@ -94,3 +94,54 @@ def test_run_kpi_relationship(session) -> None:
     assert kpi1.run_id == run.id
     assert kpi2.run_id == run.id
     assert kpi1.id != kpi2.id
+
+
+def test_configure_engine_applies_sqlite_profile(tmp_path) -> None:
+    """Test WAL journaling and the pragmas of the tuned connection profile."""
+    from sqlalchemy import text
+
+    from csv_report.db_init import configure_engine
+
+    engine = configure_engine(create_engine(f"sqlite:///{tmp_path / 'run.db'}"))
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() > 0
+    engine.dispose()
+
+
+def test_configure_engine_adds_indexes_to_existing_database(tmp_path) -> None:
+    """Test that the index migration upgrades old databases idempotently."""
+    from sqlalchemy import inspect, text
+
+    from csv_report.db_init import configure_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'run.db'}")
+    with engine.begin() as connection:
+        # Tables as created before the indexes were declared
+        connection.execute(
+            text(
+                "CREATE TABLE run (id INTEGER PRIMARY KEY, timestamp DATETIME, "
+                "csv_file VARCHAR, output_format VARCHAR, status VARCHAR, "
+                "rows_processed INTEGER, error_message VARCHAR, duration FLOAT)",
+            ),
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE kpi (id INTEGER PRIMARY KEY, run_id INTEGER, "
+                "name VARCHAR, value FLOAT, unit VARCHAR, description VARCHAR, "
+                "calculated_at DATETIME)",
+            ),
+        )
+
+    configure_engine(engine)
+    configure_engine(engine)
+
+    inspector = inspect(engine)
+    run_indexes = {index["name"] for index in inspector.get_indexes("run")}
+    kpi_indexes = {
+        index["name"]: index["column_names"] for index in inspector.get_indexes("kpi")
+    }
+    assert "ix_run_timestamp" in run_indexes
+    assert kpi_indexes["ix_kpi_run_id_name"] == ["run_id", "name"]
+    engine.dispose()
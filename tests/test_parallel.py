@@ -0,0 +1,74 @@
+"""Tests for parallel parsing of a single CSV file."""
+
+import pandas as pd
+import pytest
+
+from csv_report import parallel
+from csv_report.load import read_csv
+from csv_report.parallel import (
+    parallel_aggregate_csv,
+    parallel_read_csv,
+    partition_csv,
+)
+from kpi_service.kpi import compute_all_kpis
+
+
+@pytest.fixture
+def quoted_csv(tmp_path, monkeypatch):
+    """CSV with quoted commas, escaped quotes and multiline fields."""
+    # Tiny scan blocks so quoted fields straddle block boundaries
+    monkeypatch.setattr(parallel, "SCAN_BLOCK_SIZE", 61)
+    names = ['Multi\nline "quoted"\nname', "Comma, Inc", 'He said "hi"', "Plain"]
+    path = tmp_path / "quoted.csv"
+    pd.DataFrame(
+        {
+            "Exchange": ["NMS"] * 200,
+            "Symbol": [f"S{i}" for i in range(200)],
+            "Shortname": [f"{names[i % 4]} {i}" for i in range(200)],
+            "Marketcap": [float(i * 7919 % 1000) * 1e9 for i in range(200)],
+            "Sector": [["Technology", "Energy", None][i % 3] for i in range(200)],
+            "Summary": ["Line one\nline two" if i % 2 else "" for i in range(200)],
+        },
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_partitions_end_on_record_boundaries(quoted_csv) -> None:
+    """Test that no split point falls inside a quoted field."""
+    header, ranges = partition_csv(quoted_csv, 50)
+    data = quoted_csv.read_bytes()
+
+    assert header == data[: len(header)]
+    assert len(ranges) > 10
+    for start, end in ranges:
+        assert data[start:end].count(b'"') % 2 == 0
+        assert data[end - 1 : end] == b"\n"
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_read_matches_serial(quoted_csv, workers) -> None:
+    """Test that the concatenated partitions equal a serial parse."""
+    df = parallel_read_csv(quoted_csv, workers, partition_bytes=256)
+
+    pd.testing.assert_frame_equal(df, read_csv(quoted_csv))
+
+
+@pytest.mark.parametrize("chunksize", [100_000, 3])
+def test_parallel_aggregate_matches_serial(quoted_csv, chunksize) -> None:
+    """Test that merged partition accumulators give the serial KPIs."""
+    accumulator = parallel_aggregate_csv(
+        quoted_csv,
+        2,
+        partition_bytes=256,
+        chunksize=chunksize,
+    )
+
+    kpis = compute_all_kpis(aggregates=accumulator.to_aggregates())
+    expected = compute_all_kpis(read_csv(quoted_csv))
+    assert kpis["base_kpis"] == pytest.approx(expected["base_kpis"])
+    assert kpis["enhanced_kpis"]["top_companies"] == (
+        expected["enhanced_kpis"]["top_companies"]
+    )
+    assert kpis["enhanced_kpis"]["percentiles"] == (
+        expected["enhanced_kpis"]["percentiles"]
+    )
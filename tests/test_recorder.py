@@ -0,0 +1,161 @@
+"""Tests for the write-behind run recorder."""
+
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError, StatementError
+
+from csv_report.database import DatabaseService
+from csv_report.recorder import RunRecorder
+
+KPIS = [
+    {"name": "total_companies", "value": 3.0},
+    {"name": "avg_market_cap", "value": 2.0},
+]
+
+
+@pytest.fixture
+def db_service(tmp_path):
+    """Database service on a fresh SQLite file."""
+    return DatabaseService(f"sqlite:///{tmp_path / 'run.db'}")
+
+
+def test_queued_writes_are_coalesced_in_order(db_service) -> None:
+    """Test that many queued events are committed in few transactions."""
+    commits = []
+    event.listen(db_service.engine, "commit", lambda _conn: commits.append(1))
+
+    with RunRecorder(db_service) as recorder:
+        runs = []
+        for i in range(50):
+            run = recorder.create_run(csv_file=f"{i}.csv", output_format="html")
+            recorder.add_kpis(run, KPIS)
+            recorder.complete_run(run, duration=float(i))
+            runs.append(run)
+        recorder.flush()
+
+    assert len(commits) < 50
+    for i, run in enumerate(runs):
+        stored = db_service.get_run_by_id(run.id)
+        assert (stored.csv_file, stored.status, stored.duration) == (
+            f"{i}.csv",
+            "completed",
+            float(i),
+        )
+        assert len(db_service.get_kpis_for_run(run.id)) == 2
+
+
+def test_completed_runs_always_have_their_kpis(db_service) -> None:
+    """Test that no reader ever sees a completed run without KPIs."""
+    violations = []
+    done = threading.Event()
+
+    def check() -> None:
+        query = text(
+            "SELECT count(*) FROM run WHERE status = 'completed' AND NOT EXISTS "
+            "(SELECT 1 FROM kpi WHERE kpi.run_id = run.id)",
+        )
+        while not done.is_set():
+            with db_service.engine.connect() as connection:
+                violations.append(connection.execute(query).scalar())
+
+    checker = threading.Thread(target=check)
+    checker.start()
+    with RunRecorder(db_service) as recorder:
+        for i in range(100):
+            run = recorder.create_run(
+                csv_file=f"{i}.csv",
+                output_format="html",
+                status="processing",
+            )
+            recorder.add_kpis(run, KPIS)
+            recorder.complete_run(run, duration=1.0)
+    done.set()
+    checker.join()
+
+    assert violations
+    assert set(violations) == {0}
+
+
+def test_pending_writes_are_flushed_on_failure(db_service) -> None:
+    """Test that leaving the block through an exception still commits."""
+    recorder = RunRecorder(db_service)
+    run = recorder.create_run(csv_file="failing.csv", output_format="html")
+    recorder.fail_run(run, RuntimeError("boom"))
+    with pytest.raises(RuntimeError), recorder:
+        raise RuntimeError
+
+    stored = db_service.get_run_by_id(run.id)
+    assert (stored.status, stored.error_message) == ("failed", "boom")
+
+
+def test_write_errors_surface_on_flush(db_service) -> None:
+    """Test that a failed batch is reported instead of silently dropped."""
+    with RunRecorder(db_service) as recorder:
+        run = recorder.create_run(csv_file="bad.csv", output_format="html")
+        recorder.add_kpis(run, [{"name": "no_value"}])
+
+        with pytest.raises(KeyError):
+            recorder.flush()
+        with pytest.raises(KeyError):
+            run.id  # noqa: B018
+
+
+def test_failed_batch_skips_later_writes_of_the_run(db_service) -> None:
+    """Test that a run whose KPIs failed is never marked completed."""
+    with RunRecorder(db_service) as recorder:
+        run = recorder.create_run(
+            csv_file="bad.csv",
+            output_format="html",
+            status="processing",
+        )
+        recorder.flush()
+        recorder.add_kpis(run, [{"name": "avg_market_cap", "value": "n/a"}])
+        recorder.evict_result_cache(timedelta(days=1), 10)
+        recorder.complete_run(run, duration=1.0)
+        with pytest.raises(StatementError):
+            recorder.flush()
+        other = recorder.create_run(csv_file="good.csv", output_format="html")
+        recorder.add_kpis(other, KPIS)
+        recorder.fail_run(run, RuntimeError("boom"))
+
+    stored = db_service.get_run_by_id(run.id)
+    assert (stored.status, stored.error_message) == ("failed", "boom")
+    assert db_service.get_kpis_for_run(run.id) == []
+    assert len(db_service.get_kpis_for_run(other.id)) == 2
+
+
+def test_run_id_is_published_after_commit(db_service) -> None:
+    """Test that writes of a run whose insert failed fail instead of guessing."""
+    with RunRecorder(db_service) as recorder:
+        run = recorder.create_run(csv_file="bad.csv", output_format=None)
+        recorder.add_kpis(run, KPIS)
+
+        with pytest.raises(IntegrityError):
+            recorder.flush()
+        with pytest.raises(IntegrityError):
+            run.id  # noqa: B018
+        with pytest.raises(RuntimeError, match="not committed"):
+            run.database_id()
+
+
+def test_kpi_payload_round_trip(db_service) -> None:
+    """Test that a recorded payload is read back, also through cached runs."""
+    payload = {"base_kpis": {"total_companies": 3}, "report_sectors": []}
+
+    with RunRecorder(db_service) as recorder:
+        run = recorder.create_run(csv_file="a.csv", output_format="html")
+        recorder.save_kpi_payload(run, payload)
+    cached = db_service.create_run(csv_file="a.csv", output_format="html")
+    db_service.record_cached_run(cached.id, run.id)
+
+    assert db_service.get_kpi_payload(run.id) == payload
+    assert db_service.get_kpi_payload(cached.id) == payload
+    assert db_service.get_kpi_payload(cached.id + 1) is None
+
+    with db_service.engine.begin() as connection:
+        connection.execute(text("UPDATE kpi_payload SET version = version + 1"))
+    with pytest.raises(ValueError, match="layout version"):
+        db_service.get_kpi_payload(run.id)
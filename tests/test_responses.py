@@ -0,0 +1,37 @@
+"""Tests for the JSON responses of the KPI service."""
+
+import json
+import math
+
+import pytest
+
+from kpi_service import responses
+from kpi_service.responses import KpiJSONResponse, dumps, loads
+
+PAYLOAD = {
+    "basic_kpis": {"rows": 2, "cols": 3, "means": {"Marketcap": 1.5e12}},
+    "sectors": [{"sector": "Energie & Öl", "company_count": 1, "share": 0.25}],
+    "missing": None,
+}
+
+
+def test_dumps_round_trips_kpi_payloads() -> None:
+    """Test that orjson and the fallback write the same compact JSON."""
+    data = dumps(PAYLOAD)
+    assert loads(data) == json.loads(data) == PAYLOAD
+    assert KpiJSONResponse(PAYLOAD).body == data
+
+
+def test_fallback_without_orjson(monkeypatch) -> None:
+    """Test the standard library fallback, which refuses NaN like Starlette."""
+    expected = dumps(PAYLOAD)
+    monkeypatch.setattr(responses, "ORJSON_AVAILABLE", False)
+    assert dumps(PAYLOAD) == expected
+    with pytest.raises(ValueError):
+        dumps({"mean": math.nan})
+
+
+def test_orjson_writes_nan_as_null() -> None:
+    """Test that means of empty columns are served as null with orjson."""
+    pytest.importorskip("orjson")
+    assert loads(dumps({"mean": math.nan})) == {"mean": None}
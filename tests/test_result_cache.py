@@ -0,0 +1,121 @@
+"""Tests for the content-addressed run result cache."""
+
+from datetime import timedelta
+
+import pandas as pd
+from typer.testing import CliRunner
+
+from csv_report.database import DatabaseService
+from csv_report.main import app
+from csv_report.result_cache import result_cache_key
+
+
+def _write_companies(path, marketcap: float = 3e12) -> None:
+    pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "XOM"],
+            "Shortname": ["Apple", "Exxon"],
+            "Marketcap": [marketcap, 4e11],
+            "Sector": ["Technology", "Energy"],
+        },
+    ).to_csv(path, index=False)
+
+
+def test_key_depends_on_content_and_format(tmp_path) -> None:
+    """Test that the key changes with the input bytes and the output format."""
+    csv_file = tmp_path / "companies.csv"
+    _write_companies(csv_file)
+    key = result_cache_key(csv_file, "markdown", stream=False)
+
+    assert result_cache_key(csv_file, "markdown", stream=False) == key
+    assert result_cache_key(csv_file, "html", stream=False) != key
+    assert result_cache_key(csv_file, "markdown", stream=True) != key
+    _write_companies(csv_file, marketcap=3.1e12)
+    assert result_cache_key(csv_file, "markdown", stream=False) != key
+
+
+def test_key_depends_on_kpi_code_and_stream_options(tmp_path, monkeypatch) -> None:
+    """Test that the key changes with the KPI code and the stream chunking."""
+    csv_file = tmp_path / "companies.csv"
+    _write_companies(csv_file)
+    key = result_cache_key(csv_file, "markdown", stream=True, chunksize=100)
+
+    assert result_cache_key(csv_file, "markdown", stream=True, chunksize=50) != key
+    assert (
+        result_cache_key(csv_file, "markdown", stream=True, chunksize=100, workers=2)
+        != key
+    )
+    assert result_cache_key(
+        csv_file,
+        "markdown",
+        stream=False,
+        chunksize=100,
+    ) == result_cache_key(csv_file, "markdown", stream=False, chunksize=50)
+    monkeypatch.setattr("csv_report.result_cache.kpi_code_version", lambda: "changed")
+    assert result_cache_key(csv_file, "markdown", stream=True, chunksize=100) != key
+
+
+def test_unchanged_input_is_served_from_cache(tmp_path) -> None:
+    """Test that a repeated run is recorded as cached unless forced."""
+    csv_file = tmp_path / "companies.csv"
+    _write_companies(csv_file)
+    runner = CliRunner()
+    args = ["generate", "-f", str(csv_file), "--output", str(tmp_path / "r.md")]
+
+    # Forced, as an earlier test session may have cached the same input
+    first = runner.invoke(app, [*args, "--force"])
+    second = runner.invoke(app, [*args[:-1], str(tmp_path / "copy.md")])
+    copied = (tmp_path / "copy.md").read_text() == (tmp_path / "r.md").read_text()
+    forced = runner.invoke(app, [*args, "--force"])
+
+    assert first.exit_code == second.exit_code == forced.exit_code == 0
+    assert "reused its results" not in first.stdout
+    assert "reused its results" in second.stdout
+    assert "reused its results" not in forced.stdout
+    assert copied
+
+    db_service = DatabaseService()
+    cached_run = db_service.get_recent_runs(2)[1]
+    assert cached_run.status == "cached"
+    assert {kpi.name for kpi in db_service.get_kpis_for_run(cached_run.id)} >= {
+        "total_companies",
+    }
+
+
+def test_evict_result_cache_keeps_most_recent() -> None:
+    """Test size-based eviction of the least recently used entries."""
+    db_service = DatabaseService()
+    run = db_service.create_run(csv_file="test.csv", output_format="markdown")
+    db_service.evict_result_cache(timedelta(days=1), max_entries=0)
+    for key in ["a", "b", "c"]:
+        db_service.save_cached_result(key, run.id, "markdown", "r.md", "digest")
+    db_service.get_cached_result("a", timedelta(days=1))
+
+    removed = db_service.evict_result_cache(timedelta(days=1), max_entries=2)
+
+    assert removed == 1
+    assert db_service.get_cached_result("a", timedelta(days=1)) is not None
+    assert db_service.get_cached_result("b", timedelta(days=1)) is None
+
+
+def test_cached_run_is_rendered_from_source_payload(tmp_path) -> None:
+    """Test that ``render`` re-renders a past run without its source CSV."""
+    csv_file = tmp_path / "companies.csv"
+    _write_companies(csv_file)
+    runner = CliRunner()
+    args = ["generate", "-f", str(csv_file), "--output", str(tmp_path / "r.md")]
+    assert runner.invoke(app, [*args, "--force"]).exit_code == 0
+    assert runner.invoke(app, args).exit_code == 0
+    csv_file.unlink()
+
+    cached_run = DatabaseService().get_recent_runs(1)[0]
+    output = tmp_path / "past.html"
+    result = runner.invoke(
+        app,
+        ["render", str(cached_run.id), "-o", "html", "--output", str(output)],
+    )
+
+    assert result.exit_code == 0
+    assert "<html" in output.read_text()
+    assert "Exxon" in output.read_text()
+    assert runner.invoke(app, ["render", "999999999"]).exit_code == 1
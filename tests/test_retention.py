@@ -0,0 +1,211 @@
+"""Tests for the retention of old runs in Parquet archives."""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text, update
+from typer.testing import CliRunner
+
+pytest.importorskip("pyarrow")
+
+from csv_report.database import DatabaseService
+from csv_report.main import app
+from csv_report.models import Run
+from csv_report.retention import parse_age, read_history, vacuum
+
+# run.db stores naive UTC timestamps
+OLD = datetime(2024, 1, 15, 12)  # noqa: DTZ001
+
+
+@pytest.fixture
+def db_service(tmp_path):
+    """Database with five runs from January 2024 and five recent ones."""
+    db_service = DatabaseService(f"sqlite:///{tmp_path / 'run.db'}")
+    for i in range(10):
+        run = db_service.create_run(csv_file=f"{i}.csv", output_format="html")
+        db_service.add_kpis(run.id, [{"name": "avg_market_cap", "value": float(i)}])
+    with db_service.engine.begin() as connection:
+        for run_id in range(1, 6):
+            timestamp = OLD + timedelta(days=run_id % 2)
+            connection.execute(
+                update(Run).where(Run.id == run_id).values(timestamp=timestamp),
+            )
+            connection.execute(
+                text("UPDATE kpi SET calculated_at = :at WHERE run_id = :id"),
+                {"at": timestamp, "id": run_id},
+            )
+    return db_service
+
+
+def test_parse_age() -> None:
+    """Test the accepted age units and the error for anything else."""
+    assert parse_age("90d") == timedelta(days=90)
+    assert parse_age("12w") == timedelta(weeks=12)
+    assert parse_age("36h") == timedelta(hours=36)
+    with pytest.raises(ValueError, match="Invalid age"):
+        parse_age("3 months")
+
+
+def test_old_runs_move_to_date_partitions(tmp_path, db_service) -> None:
+    """Test that old runs and KPIs leave run.db for monthly Parquet files."""
+    history = db_service.get_kpi_history("avg_market_cap", "week")
+
+    summary = db_service.archive_runs(timedelta(days=90), tmp_path / "archive", 2)
+
+    assert (summary["runs"], summary["kpis"]) == (5, 5)
+    assert [run.id for run in db_service.get_all_runs()] == [10, 9, 8, 7, 6]
+    assert sorted(
+        re.sub(
+            r"-[0-9a-f]{8}\.parquet$",
+            "",
+            path.relative_to(tmp_path / "archive").as_posix(),
+        )
+        for path in (tmp_path / "archive").glob("*/*/*")
+    ) == [
+        "kpi/month=2024-01/part-000000000001-000000000002",
+        "kpi/month=2024-01/part-000000000003-000000000004",
+        "kpi/month=2024-01/part-000000000005-000000000005",
+        "run/month=2024-01/part-000000000001-000000000002",
+        "run/month=2024-01/part-000000000003-000000000004",
+        "run/month=2024-01/part-000000000005-000000000005",
+    ]
+    # The rollups still cover the archived values
+    assert db_service.get_kpi_history("avg_market_cap", "week") == history
+
+
+def test_history_unions_archive_and_live_rows(tmp_path, db_service) -> None:
+    """Test that history reads see archived and live rows alike."""
+    archive_dir = tmp_path / "archive"
+    db_service.archive_runs(timedelta(days=90), archive_dir)
+
+    runs = db_service.get_run_history(archive_dir=archive_dir)
+    values = db_service.get_kpi_values("avg_market_cap", archive_dir=archive_dir)
+    january = db_service.get_kpi_values(
+        "avg_market_cap",
+        since=OLD,
+        until=datetime(2024, 1, 16),  # noqa: DTZ001
+        archive_dir=archive_dir,
+    )
+
+    assert runs["id"].tolist() == [2, 4, 1, 3, 5, 6, 7, 8, 9, 10]
+    assert sorted(values["value"]) == [float(i) for i in range(10)]
+    assert january["run_id"].tolist() == [2, 4]
+
+
+def test_archived_ids_are_not_reused(tmp_path, db_service) -> None:
+    """Test that archiving the newest runs never loses them to new runs."""
+    archive_dir = tmp_path / "archive"
+    db_service.archive_runs(timedelta(days=-1), archive_dir)
+    run = db_service.create_run(csv_file="new.csv", output_format="html")
+    db_service.add_kpis(run.id, [{"name": "avg_market_cap", "value": 10.0}])
+    db_service.archive_runs(timedelta(days=-1), archive_dir)
+
+    runs = db_service.get_run_history(archive_dir=archive_dir)
+    values = db_service.get_kpi_values("avg_market_cap", archive_dir=archive_dir)
+
+    assert run.id == 11
+    assert sorted(runs["id"]) == list(range(1, 12))
+    assert sorted(values["value"]) == [float(i) for i in range(11)]
+
+
+def test_payloads_and_state_are_archived(tmp_path, db_service) -> None:
+    """Test that archival keeps the KPI payloads and state of old runs."""
+    archive_dir = tmp_path / "archive"
+    db_service.save_kpi_payload(1, {"base_kpis": {"total_companies": 3}})
+    db_service.save_kpi_state(2, {"count": 1})
+
+    summary = db_service.archive_runs(timedelta(days=90), archive_dir)
+
+    assert summary["payloads"] == 1
+    assert db_service.get_kpi_payload(1) is None
+    payloads = read_history(db_service.engine, "kpi_payload", directory=archive_dir)
+    states = read_history(db_service.engine, "kpi_state", directory=archive_dir)
+    assert payloads["run_id"].tolist() == [1]
+    assert states["run_id"].tolist() == [2]
+
+
+def test_runs_reused_by_newer_cached_runs_are_kept(tmp_path, db_service) -> None:
+    """Test that archival never removes the KPIs a live cached run points to."""
+    hit = db_service.create_run(
+        csv_file="0.csv",
+        output_format="html",
+        status="cached",
+    )
+    db_service.record_cached_run(hit.id, 1)
+    db_service.save_kpi_state(2, {"count": 1})
+
+    db_service.archive_runs(timedelta(days=90), tmp_path / "archive")
+
+    assert db_service.get_run_by_id(1) is not None
+    assert len(db_service.get_kpis_for_run(hit.id)) == 1
+    assert db_service.get_kpi_state(2) is None
+
+
+def test_lookups_fall_back_to_the_archive(tmp_path, db_service) -> None:
+    """Test that run lookups and pages still find archived runs."""
+    archive_dir = tmp_path / "archive"
+    db_service.save_kpi_payload(1, {"base_kpis": {"total_companies": 3}})
+    db_service.archive_runs(timedelta(days=90), archive_dir)
+
+    run = db_service.get_run_by_id(1, archive_dir)
+    kpis = db_service.get_kpis_for_run(3, archive_dir)
+    payload = db_service.get_kpi_payload(1, archive_dir)
+    first, cursor = db_service.list_runs(7, archive_dir=archive_dir)
+    rest, last = db_service.list_runs(7, cursor, archive_dir=archive_dir)
+    by_run = db_service.get_kpis_for_runs([9, 3], archive_dir)
+
+    assert (run.id, run.csv_file, run.timestamp) == (1, "0.csv", OLD + timedelta(1))
+    assert [kpi.value for kpi in kpis] == [2.0]
+    assert payload == {"base_kpis": {"total_companies": 3}}
+    assert [run.id for run in first + rest] == [10, 9, 8, 7, 6, 5, 3, 1, 4, 2]
+    assert last is None
+    assert {run_id: [kpi.value for kpi in kpis] for run_id, kpis in by_run.items()} == {
+        9: [8.0],
+        3: [2.0],
+    }
+
+
+def test_cached_run_links_are_archived(tmp_path, db_service) -> None:
+    """Test that archived cached runs still report their source's KPIs."""
+    archive_dir = tmp_path / "archive"
+    hit = db_service.create_run(
+        csv_file="0.csv",
+        output_format="html",
+        status="cached",
+    )
+    db_service.record_cached_run(hit.id, 1)
+    with db_service.engine.begin() as connection:
+        connection.execute(
+            update(Run).where(Run.id == hit.id).values(timestamp=OLD),
+        )
+
+    db_service.archive_runs(timedelta(days=90), archive_dir)
+
+    assert db_service.get_run_by_id(hit.id) is None
+    assert [kpi.value for kpi in db_service.get_kpis_for_run(hit.id, archive_dir)] == [
+        0.0,
+    ]
+    assert [
+        kpi.value for kpi in db_service.get_kpis_for_runs([hit.id], archive_dir)[hit.id]
+    ] == [0.0]
+
+
+def test_vacuum_releases_archived_pages(tmp_path, db_service) -> None:
+    """Test that freed pages are returned to the file system."""
+    filler = [{"name": f"kpi_{i}", "value": float(i)} for i in range(2000)]
+    db_service.add_kpis(1, filler)
+    with db_service.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+
+    db_service.archive_runs(timedelta(days=90), tmp_path / "archive")
+
+    assert vacuum(db_service.engine) > 0
+
+
+def test_archive_command_rejects_invalid_age() -> None:
+    """Test the CLI error for an age it cannot parse."""
+    result = CliRunner().invoke(app, ["archive", "--older-than", "soon"])
+
+    assert result.exit_code == 1
+    assert "Invalid age" in result.stdout
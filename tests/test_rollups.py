@@ -0,0 +1,111 @@
+"""Tests for the incrementally maintained KPI rollups."""
+
+# run.db stores naive UTC timestamps
+# ruff: noqa: DTZ001
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from typer.testing import CliRunner
+
+from csv_report.database import DatabaseService
+from csv_report.db_init import configure_engine
+from csv_report.main import app
+from csv_report.rollups import bucket_start, rollup_rows, rollup_upsert_statement
+
+
+def _kpi(value: float, calculated_at: datetime) -> dict:
+    return {"name": "avg_market_cap", "value": value, "calculated_at": calculated_at}
+
+
+def test_bucket_start_per_granularity() -> None:
+    """Test hour, day and Monday-based week buckets."""
+    timestamp = datetime(2025, 3, 13, 14, 35, 12)  # a Thursday
+
+    assert bucket_start(timestamp, "hour") == datetime(2025, 3, 13, 14)
+    assert bucket_start(timestamp, "day") == datetime(2025, 3, 13)
+    assert bucket_start(timestamp, "week") == datetime(2025, 3, 10)
+    with pytest.raises(ValueError, match="Unknown granularity"):
+        bucket_start(timestamp, "month")
+
+
+def test_rollup_rows_fold_a_batch() -> None:
+    """Test count, sum, min, max and last value of one bucket."""
+    rows = rollup_rows(
+        [
+            _kpi(3.0, datetime(2025, 3, 13, 14, 5)),
+            _kpi(1.0, datetime(2025, 3, 13, 14, 50)),
+            _kpi(2.0, datetime(2025, 3, 13, 14, 20)),
+            _kpi(float("nan"), datetime(2025, 3, 13, 14, 55)),
+        ],
+    )
+    hour = next(row for row in rows if row["granularity"] == "hour")
+
+    assert len(rows) == 3
+    assert (hour["count"], hour["total"]) == (3, 6.0)
+    assert (hour["min_value"], hour["max_value"], hour["last_value"]) == (1.0, 3.0, 1.0)
+
+
+def test_upserts_merge_into_existing_buckets(tmp_path) -> None:
+    """Test that later inserts update the rollups instead of replacing them."""
+    db_service = DatabaseService(f"sqlite:///{tmp_path / 'run.db'}")
+    statement = rollup_upsert_statement("sqlite")
+    with db_service.engine.begin() as connection:
+        connection.execute(statement, rollup_rows([_kpi(5.0, datetime(2025, 3, 10))]))
+        later = [_kpi(1.0, datetime(2025, 3, 11)), _kpi(9.0, datetime(2025, 3, 9))]
+        connection.execute(statement, rollup_rows(later))
+
+    weeks = db_service.get_kpi_history("avg_market_cap", "week")
+    days = db_service.get_kpi_history("avg_market_cap", "day", datetime(2025, 3, 10))
+
+    assert [point["bucket"] for point in weeks] == [
+        "2025-03-03T00:00:00",
+        "2025-03-10T00:00:00",
+    ]
+    assert weeks[1] == {
+        "bucket": "2025-03-10T00:00:00",
+        "count": 2,
+        "min": 1.0,
+        "max": 5.0,
+        "avg": 3.0,
+        "last": 1.0,
+    }
+    assert [point["last"] for point in days] == [5.0, 1.0]
+
+
+def test_add_kpis_maintains_rollups(tmp_path) -> None:
+    """Test that KPI inserts and the rollups stay consistent."""
+    db_service = DatabaseService(f"sqlite:///{tmp_path / 'run.db'}")
+    for value in (10.0, 30.0, 20.0):
+        run = db_service.create_run(csv_file="test.csv", output_format="html")
+        db_service.add_kpis(run.id, [{"name": "avg_market_cap", "value": value}])
+    db_service.add_kpi(run.id, "tech_market_cap", 7.0)
+
+    (week,) = db_service.get_kpi_history("avg_market_cap", "week")
+
+    assert (week["count"], week["min"], week["max"]) == (3, 10.0, 30.0)
+    assert (week["avg"], week["last"]) == (20.0, 20.0)
+    assert db_service.get_kpi_history("tech_market_cap", "hour")[0]["last"] == 7.0
+
+
+def test_existing_kpis_are_backfilled(tmp_path) -> None:
+    """Test that databases from before the rollups get them on first use."""
+    database_url = f"sqlite:///{tmp_path / 'run.db'}"
+    db_service = DatabaseService(database_url)
+    run = db_service.create_run(csv_file="test.csv", output_format="html")
+    db_service.add_kpis(run.id, [{"name": "avg_market_cap", "value": 4.0}])
+    with db_service.engine.begin() as connection:
+        connection.execute(text("DROP TABLE kpi_rollup"))
+
+    configure_engine(db_service.engine)
+
+    assert db_service.get_kpi_history("avg_market_cap", "day")[0]["count"] == 1
+
+
+def test_kpi_history_command_rejects_unknown_granularity() -> None:
+    """Test the CLI error for a granularity that has no rollups."""
+    result = CliRunner().invoke(app, ["kpi-history", "avg_market_cap", "-g", "month"])
+
+    assert result.exit_code == 1
+    assert "Unknown granularity" in result.stdout
@@ -0,0 +1,119 @@
+"""Tests for the SQL-side run statistics."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+from typer.testing import CliRunner
+
+from csv_report.database import DatabaseService
+from csv_report.main import app
+from csv_report.models import Run
+from csv_report.run_stats import stats_statement
+
+# run.db stores naive UTC timestamps
+NOW = datetime(2025, 3, 10, 12, 0)  # noqa: DTZ001
+
+
+@pytest.fixture
+def db_service(tmp_path):
+    """Database service with runs of two formats and files in the last day."""
+    db_service = DatabaseService(f"sqlite:///{tmp_path / 'run.db'}")
+    runs = [
+        Run(
+            timestamp=NOW - timedelta(minutes=i),
+            csv_file="a.csv" if i % 2 else "b.csv",
+            output_format="html",
+            duration=float(i),
+            rows_processed=100,
+        )
+        for i in range(1, 11)
+    ]
+    runs += [
+        Run(
+            timestamp=NOW - timedelta(hours=1),
+            csv_file="a.csv",
+            output_format="markdown",
+            status="failed",
+            duration=0.5,
+        ),
+        Run(
+            timestamp=NOW - timedelta(hours=2),
+            csv_file="a.csv",
+            output_format="markdown",
+            duration=4.0,
+        ),
+        # Outside the window
+        Run(
+            timestamp=NOW - timedelta(days=30),
+            csv_file="a.csv",
+            output_format="html",
+            duration=1000.0,
+        ),
+    ]
+    with Session(db_service.engine) as session:
+        session.add_all(runs)
+        session.commit()
+    return db_service
+
+
+def test_stats_per_output_format(db_service) -> None:
+    """Test percentiles, throughput and failure rate of each format."""
+    html, markdown = db_service.get_run_stats(
+        "output_format",
+        NOW - timedelta(days=1),
+        NOW + timedelta(seconds=1),
+    )
+
+    assert html["key"] == "html"
+    assert (html["runs"], html["failed"], html["completed"]) == (10, 0, 10)
+    assert (html["p50_duration"], html["p90_duration"]) == (5.0, 9.0)
+    assert html["p99_duration"] == 10.0
+    assert html["avg_duration"] == 5.5
+    assert html["rows_per_second"] == 1000 / 55
+    assert markdown["key"] == "markdown"
+    assert (markdown["runs"], markdown["failure_rate"]) == (2, 0.5)
+    # The failed run's duration is not part of the percentiles
+    assert markdown["p50_duration"] == markdown["p99_duration"] == 4.0
+    assert markdown["rows_per_second"] is None
+
+
+def test_stats_per_csv_file(db_service) -> None:
+    """Test grouping by input file and the default window ending now."""
+    groups = db_service.get_run_stats(
+        "csv_file",
+        NOW - timedelta(days=1),
+        NOW + timedelta(seconds=1),
+    )
+
+    assert [(group["key"], group["runs"]) for group in groups] == [
+        ("a.csv", 7),
+        ("b.csv", 5),
+    ]
+    assert db_service.get_run_stats("csv_file") == []
+    with pytest.raises(ValueError, match="Unknown grouping"):
+        db_service.get_run_stats("status")
+
+
+def test_stats_search_the_timestamp_index(db_service) -> None:
+    """Test that the window is located through an index, not a table scan."""
+    statement = stats_statement("csv_file", NOW - timedelta(days=1), NOW)
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+    with db_service.engine.connect() as connection:
+        plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+
+    assert any("USING INDEX ix_run_timestamp" in row[-1] for row in plan)
+
+
+def test_recent_average_duration(db_service) -> None:
+    """Test the average over the latest runs that have a duration."""
+    assert db_service.get_recent_average_duration(5) == 3.0
+
+
+def test_stats_command_rejects_unknown_grouping() -> None:
+    """Test that an unknown --by value fails with exit code 1."""
+    result = CliRunner().invoke(app, ["stats", "--by", "status"])
+
+    assert result.exit_code == 1
+    assert "Unknown grouping" in result.stdout
@@ -0,0 +1,231 @@
+"""Tests for the streaming KPI aggregation and the quantile sketch."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpi_service.kpi import build_kpi_aggregates, compute_all_kpis, compute_kpis
+from kpi_service.sketch import DEFAULT_CAPACITY, QuantileSketch
+from kpi_service.streaming import (
+    IncompleteStateError,
+    KpiAccumulator,
+    aggregate_chunks,
+    summarize_chunks,
+)
+
+
+@pytest.fixture
+def companies() -> pd.DataFrame:
+    """Sample data including a company without a sector."""
+    data = {
+        "Symbol": ["AAPL", "MSFT", "GOOGL", "XOM", "JPM", "UNK", "CVX"],
+        "Shortname": ["Apple", "Microsoft", "Alphabet", "Exxon", "JPM", "?", "Chevron"],
+        "Marketcap": [3e12, 2.5e12, 2e12, 4e11, 5e11, 1e9, 3e11],
+        "Sector": [
+            "Technology",
+            "Technology",
+            "Communication Services",
+            "Energy",
+            "Financial Services",
+            None,
+            "Energy",
+        ],
+    }
+    return pd.DataFrame(data)
+
+
+def test_chunked_kpis_match_in_memory(companies) -> None:
+    """Test that streaming in small chunks gives the in-memory KPIs."""
+    chunks = (companies[i : i + 2] for i in range(0, len(companies), 2))
+
+    streamed = compute_all_kpis(aggregates=aggregate_chunks(chunks))
+
+    assert streamed == compute_all_kpis(companies)
+
+
+def test_summarized_chunks_match_in_memory(companies) -> None:
+    """Test the one-pass basic KPIs and aggregates of chunked rows."""
+    companies["Employees"] = [164000, 221000, 182000, 62000, 309000, None, 45000]
+    companies["Note"] = [1.5, 2.5, 3.5, "n/a", 4.5, 5.5, 6.5]
+    chunks = [companies[i : i + 3].infer_objects() for i in range(0, 7, 3)]
+
+    basic_kpis, aggregates = summarize_chunks(chunks)
+
+    expected = compute_kpis(companies)
+    assert basic_kpis["rows"] == expected["rows"] == 7
+    assert basic_kpis["cols"] == expected["cols"]
+    # "Note" is numeric in the first and last chunk only
+    assert basic_kpis["means"] == pytest.approx(expected["means"])
+    assert "Note" not in basic_kpis["means"]
+    assert compute_all_kpis(aggregates=aggregates) == compute_all_kpis(
+        companies.drop(columns=["Employees", "Note"]),
+    )
+
+
+def test_basic_kpis_from_shared_aggregates(companies) -> None:
+    """Test that the legacy KPIs can be derived from the enhanced aggregates."""
+    companies["Employees"] = [164000, 221000, 182000, 62000, 309000, None, 45000]
+
+    assert compute_kpis(aggregates=build_kpi_aggregates(companies)) == compute_kpis(
+        companies,
+    )
+
+
+def test_merged_partitions_match_in_memory(companies) -> None:
+    """Test that accumulators of separate partitions merge correctly."""
+    first, second = KpiAccumulator(), KpiAccumulator()
+    first.update(companies[:4])
+    second.update(companies[4:])
+
+    first.merge(second)
+
+    assert compute_all_kpis(aggregates=first.to_aggregates()) == compute_all_kpis(
+        companies,
+    )
+
+
+def test_frame_accumulator_is_exact_beyond_sketch_capacity() -> None:
+    """Test that a whole-frame accumulator gives the in-memory quantiles."""
+    rng = np.random.default_rng(3)
+    rows = DEFAULT_CAPACITY * 2
+    companies = pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(rows)],
+            "Shortname": [f"Company {i}" for i in range(rows)],
+            "Marketcap": rng.lognormal(23, 1.5, size=rows),
+            "Sector": rng.choice(["Technology", "Energy", None], size=rows),
+        },
+    )
+
+    accumulator = KpiAccumulator.from_frame(companies)
+    aggregates = accumulator.to_aggregates()
+    expected = build_kpi_aggregates(companies)
+
+    assert accumulator.market_cap.is_exact
+    for name in ["median_market_cap", "percentiles"]:
+        assert aggregates["overall"][name] == expected["overall"][name]
+    assert aggregates["sectors"]["median_market_cap"].equals(
+        expected["sectors"]["median_market_cap"],
+    )
+
+
+def test_sketch_is_exact_below_capacity() -> None:
+    """Test that quantiles are exact while every value is retained."""
+    values = np.random.default_rng(1).lognormal(20, 2, size=500)
+    sketch = QuantileSketch(capacity=1000)
+    sketch.update(values)
+
+    assert sketch.is_exact
+    assert sketch.median() == pd.Series(values).median()
+    assert sketch.quantile(0.9) == pd.Series(values).quantile(0.9)
+
+
+def test_sketch_memory_is_bounded_and_accurate() -> None:
+    """Test the rank error and retained size of a compacted sketch."""
+    values = np.random.default_rng(2).permutation(200_000).astype(float)
+    sketch = QuantileSketch(capacity=512)
+    for chunk in np.array_split(values, 40):
+        sketch.update(chunk)
+
+    retained = sum(level.size for level in sketch.levels)
+    assert not sketch.is_exact
+    assert retained < 512 * len(sketch.levels)
+    for q in [0.25, 0.5, 0.99]:
+        assert abs(sketch.quantile(q) / len(values) - q) < 0.02
+
+
+def test_sketch_round_trips_through_dict() -> None:
+    """Test sketch serialization."""
+    sketch = QuantileSketch(capacity=64)
+    sketch.update(np.arange(1000, dtype=float))
+
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+
+    assert restored.quantiles([0.1, 0.5]) == sketch.quantiles([0.1, 0.5])
+
+
+def test_sketch_reads_states_with_float_lists() -> None:
+    """Test that sketches saved with levels as lists of floats still load."""
+    data = {"capacity": 64, "count": 3, "compactions": 0, "levels": [[3.0, 1.0, 2.0]]}
+
+    assert QuantileSketch.from_dict(data).median() == 2.0
+
+
+def test_exact_sketch_removal_is_applied_on_read() -> None:
+    """Test that queued removals are applied and checked when next read."""
+    sketch = QuantileSketch(capacity=64)
+    sketch.update([1.0, 2.0, 3.0, 4.0])
+    sketch.remove([4.0])
+
+    assert sketch.median() == 2.0
+    sketch.remove([9.0])
+    with pytest.raises(ValueError, match="never added"):
+        sketch.median()
+
+
+def test_saved_state_is_bounded() -> None:
+    """Test that a whole-frame state saves compacted sketches."""
+    rng = np.random.default_rng(4)
+    rows = DEFAULT_CAPACITY * 8
+    companies = pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(rows)],
+            "Shortname": [f"Company {i}" for i in range(rows)],
+            "Marketcap": rng.permutation(rows).astype(float),
+            "Sector": ["Energy"] * rows,
+        },
+    )
+
+    restored = KpiAccumulator.from_state(
+        KpiAccumulator.from_frame(companies).to_state(),
+    )
+    restored.remove(companies[:10])
+
+    retained = sum(level.size for level in restored.market_cap.levels)
+    assert restored.sketch_capacity == DEFAULT_CAPACITY
+    assert retained <= DEFAULT_CAPACITY
+    assert abs(restored.market_cap.median() / rows - 0.5) < 0.01
+
+
+def test_delta_update_matches_full_recompute(companies) -> None:
+    """Test that removing and adding rows on a restored state is exact."""
+    accumulator = KpiAccumulator()
+    accumulator.update(companies[:5])
+    restored = KpiAccumulator.from_state(accumulator.to_state())
+
+    restored.remove(companies[1:2])
+    restored.update(companies[5:])
+
+    expected = pd.concat([companies[:1], companies[2:]])
+    assert compute_all_kpis(aggregates=restored.to_aggregates()) == compute_all_kpis(
+        expected,
+    )
+
+
+def test_removing_top_candidates_is_incomplete() -> None:
+    """Test that removing a leader without a retained successor is reported."""
+    companies = pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(12)],
+            "Shortname": [f"Company {i}" for i in range(12)],
+            "Marketcap": [float(i + 1) * 1e9 for i in range(12)],
+            "Sector": ["Energy"] * 12,
+        },
+    )
+    accumulator = KpiAccumulator(top_candidates=10)
+    accumulator.update(companies)
+
+    with pytest.raises(IncompleteStateError):
+        accumulator.remove(companies[-1:])
+
+
+def test_sketch_removal_after_compaction() -> None:
+    """Test that removed values are subtracted from compacted ranks."""
+    values = np.arange(20_000, dtype=float)
+    sketch = QuantileSketch(capacity=256)
+    sketch.update(values)
+
+    sketch.remove(values[:10_000])
+
+    assert sketch.count == 10_000
+    assert abs(sketch.median() - 15_000) < 500
@@ -0,0 +1,84 @@
+"""Tests for the /upload response cache."""
+
+import io
+
+from kpi_service import upload_cache
+from kpi_service.upload_cache import UploadCache, upload_cache_key
+
+
+def _kpis(size: int) -> dict:
+    return {"basic_kpis": {"rows": size}, "enhanced_kpis": {"pad": "x" * size}}
+
+
+def test_key_depends_on_content_and_kpi_code(monkeypatch) -> None:
+    """Test that the key changes with the upload bytes and the KPI code."""
+    upload = io.BytesIO(b"Symbol\nAAPL\n")
+    key = upload_cache_key(upload)
+    assert upload.tell() == 0
+    assert upload_cache_key(io.BytesIO(b"Symbol\nAAPL\n")) == key
+    assert upload_cache_key(io.BytesIO(b"Symbol\nMSFT\n")) != key
+    monkeypatch.setattr(upload_cache, "kpi_code_version", lambda: "changed")
+    assert upload_cache_key(io.BytesIO(b"Symbol\nAAPL\n")) != key
+
+
+def test_least_recently_used_entries_are_evicted_by_size() -> None:
+    """Test that the memory tier stays within max_bytes, dropping LRU entries."""
+    cache = UploadCache(max_bytes=350, directory=None)
+    cache.put("a", _kpis(100))
+    cache.put("b", _kpis(100))
+    assert cache.get("a") == _kpis(100)
+    cache.put("c", _kpis(100))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == _kpis(100)
+    assert cache.get("c") == _kpis(100)
+    stats = cache.stats()
+    assert stats["bytes"] <= 350
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (3, 1, 1)
+
+    # An entry larger than the whole cache is not kept
+    cache.put("huge", _kpis(400))
+    assert cache.get("huge") is None
+
+
+def test_entries_expire_after_ttl(monkeypatch, tmp_path) -> None:
+    """Test that neither tier returns entries past their TTL."""
+    now = [1000.0]
+    monkeypatch.setattr(upload_cache.time, "time", lambda: now[0])
+    cache = UploadCache(ttl=60, directory=tmp_path)
+    cache.put("a", _kpis(1))
+    now[0] += 59
+    assert cache.get("a") == _kpis(1)
+    now[0] += 1
+
+    assert cache.get("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_tier_is_shared_between_workers(tmp_path) -> None:
+    """Test that another process's entries are read from disk and promoted."""
+    UploadCache(directory=tmp_path).put("a", _kpis(10))
+    other = UploadCache(directory=tmp_path)
+
+    assert other.get("a") == _kpis(10)
+    assert other.get("a") == _kpis(10)
+    assert (other.disk_hits, other.hits) == (1, 1)
+
+
+def test_disk_tier_is_bounded(tmp_path) -> None:
+    """Test that the oldest files are removed beyond disk_max_bytes."""
+    cache = UploadCache(max_bytes=0, directory=tmp_path, disk_max_bytes=500)
+    for key in "abcde":
+        cache.put(key, _kpis(100))
+
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 500
+    assert cache.get("e") == _kpis(100)
+    assert cache.get("a") is None
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    """Test that a cache without memory or disk tier never hits."""
+    cache = UploadCache(max_bytes=0, directory=None)
+    assert not cache.enabled
+    cache.put("a", _kpis(1))
+    assert cache.get("a") is None
@@ -0,0 +1,100 @@
+"""Tests for the upload KPI worker pool."""
+
+import asyncio
+import io
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpi_service.kpi import compute_all_kpis
+from kpi_service.sketch import DEFAULT_CAPACITY
+from kpi_service.workers import KpiWorkerPool, PoolBusyError, upload_kpis
+
+
+def _upload() -> io.BytesIO:
+    csv = pd.DataFrame(
+        {
+            "Symbol": ["AAPL", "MSFT", "XOM"],
+            "Shortname": ["Apple", "Microsoft", "Exxon"],
+            "Sector": ["Technology", "Technology", "Energy"],
+            "Marketcap": [3e12, 2.5e12, 4e11],
+        },
+    ).to_csv(index=False)
+    return io.BytesIO(csv.encode())
+
+
+def test_full_queue_is_refused() -> None:
+    """Test that calls beyond workers + queue_depth raise PoolBusyError."""
+    pool = KpiWorkerPool("thread", workers=1, queue_depth=1)
+    release = threading.Event()
+
+    async def scenario() -> list:
+        running = asyncio.create_task(pool.run(release.wait))
+        waiting = asyncio.create_task(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolBusyError):
+            await pool.run(lambda: "refused")
+        release.set()
+        return await asyncio.gather(running, waiting)
+
+    try:
+        assert asyncio.run(scenario()) == [True, "queued"]
+        assert pool.pending == 0
+    finally:
+        pool.shutdown()
+
+
+def test_process_workers_match_thread_workers() -> None:
+    """Test that process workers compute the KPIs of the spooled upload."""
+    expected = upload_kpis(_upload())
+    pool = KpiWorkerPool("process", workers=1)
+    temp_files = set(Path(tempfile.gettempdir()).glob("*.csv"))
+
+    async def scenario() -> dict:
+        await pool.start()
+        return await pool.upload_kpis(_upload())
+
+    try:
+        assert asyncio.run(scenario()) == expected
+    finally:
+        pool.shutdown()
+    assert expected["basic_kpis"]["rows"] == 3
+    assert set(Path(tempfile.gettempdir()).glob("*.csv")) == temp_files
+
+
+def test_unknown_executor_kind() -> None:
+    """Test that only thread and process pools can be configured."""
+    with pytest.raises(ValueError, match="Unknown executor"):
+        KpiWorkerPool("fiber")
+
+
+def test_upload_quantiles_are_exact_beyond_sketch_capacity() -> None:
+    """Test that chunked uploads give the medians of the whole file."""
+    rng = np.random.default_rng(5)
+    rows = DEFAULT_CAPACITY * 2
+    companies = pd.DataFrame(
+        {
+            "Symbol": [f"S{i}" for i in range(rows)],
+            "Shortname": [f"Company {i}" for i in range(rows)],
+            "Sector": rng.choice(["Technology", "Energy"], size=rows),
+            "Marketcap": rng.lognormal(23, 1.5, size=rows),
+        },
+    )
+    upload = io.BytesIO(companies.to_csv(index=False).encode())
+
+    kpis = upload_kpis(upload, chunksize=1000)["enhanced_kpis"]
+
+    expected = compute_all_kpis(pd.read_csv(io.BytesIO(upload.getvalue())))
+    assert kpis["enhanced_kpis"]["percentiles"] == (
+        expected["enhanced_kpis"]["percentiles"]
+    )
+    assert kpis["base_kpis"]["median_market_cap"] == (
+        expected["base_kpis"]["median_market_cap"]
+    )
+    assert [s["median_market_cap"] for s in kpis["sector_kpis"]["sectors"]] == [
+        s["median_market_cap"] for s in expected["sector_kpis"]["sectors"]
+    ]